@@ -1 +1,5 @@
-from ai.ai import load_json_schema, get_function_definition, call_openai_function, JsonSchema
+from ai.ai import (load_json_schema, get_function_definition, build_request, build_response_format,
+                   call_openai_function, call_openai_function_async, complete_async, configure_client,
+                   create_async_client, get_client, is_retryable, JsonSchema, MODEL, SYSTEM_PROMPT)
+from ai.schema_validator import SchemaValidationError, compile_schema
+from ai.extraction import ExtractionSpec, ExtractionStats
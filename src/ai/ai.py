@@ -1,19 +1,81 @@
+import asyncio
+import copy
+import functools
 import json
+import logging
 import os
-from typing import NewType
+import random
+import threading
+from typing import Callable, NewType
 
-import openai
-from openai import OpenAI
-from openai.types.chat.completion_create_params import ResponseFormat
+from ai.schema_validator import SchemaValidationError
 
 # openai.api_key = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+"""
+The server, the model it is asked for and the instructions sent with every request
+"""
+BASE_URL = "http://localhost:1234/v1"
+API_KEY = "lm-studio"
+MODEL = "LM-Studio"
+SYSTEM_PROMPT = """
+                    You are a helpful Star Wars Wikipedia who is filling in the schema based on the provided user content.
+                """
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The OpenAI client, created on first use so that importing this module does not import openai
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(base_url=BASE_URL, api_key=API_KEY)
+        return _client
+
+
+def configure_client(base_url: str, api_key: str = API_KEY):
+    """
+    Point the clients at another OpenAI-compatible server
+    """
+    global _client, BASE_URL, API_KEY
+    with _client_lock:
+        BASE_URL = base_url
+        API_KEY = api_key
+        _client = None
+
+
+def create_async_client():
+    """
+    A new AsyncOpenAI client, to be used within a single event loop. Retries are left to 'call_openai_function_async'.
+    """
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY, max_retries=0)
+
+
+def __getattr__(name: str):
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 JsonSchema = NewType("JsonSchema", dict[str, any])
 
 
 def load_json_schema(schema_name: str) -> JsonSchema | None:
+    """
+    Load a schema from 'json_schemas', reading each file only once per process
+    """
+    schema = _read_json_schema(schema_name)
+    return copy.deepcopy(schema) if schema is not None else None
+
+
+@functools.lru_cache(maxsize=None)
+def _read_json_schema(schema_name: str) -> JsonSchema | None:
     schema_file = os.path.join(os.path.dirname(__file__), "json_schemas", f"{schema_name}.json")
 
     if not os.path.exists(schema_file):
@@ -41,34 +103,101 @@ def get_function_definition(
     }
 
 
-def call_openai_function(content: any, function_definition: dict[str, any]):
-    """
-    Call the OpenAI API to fill in the schema based on the provided text
-    """
+def build_response_format(function_definition: dict[str, any]) -> dict[str, any]:
+    from openai.types.chat.completion_create_params import ResponseFormat
+
     format = ResponseFormat(type="json_schema")
     format["json_schema"] = {
         "name": function_definition["function"]["name"],
         "strict": "true",
         "schema": function_definition["function"]["parameters"]
     }
+    return format
+
 
-    response = client.chat.completions.create(
-        model="LM-Studio",
-        messages=[
+def build_request(content: any, function_definition: dict[str, any]) -> dict[str, any]:
+    """
+    The arguments of the chat completion that fills in the schema of the function definition from the content
+    """
+    return {
+        "model": MODEL,
+        "messages": [
             {
                 "role": "system",
-                "content": """
-                    You are a helpful Star Wars Wikipedia who is filling in the schema based on the provided user content.
-                """
+                "content": SYSTEM_PROMPT
             },
             {
                 "role": "user",
                 "content": json.dumps(obj=content, indent=None)
             }
         ],
-        response_format=format,
-    )
+        "response_format": build_response_format(function_definition)
+    }
+
+
+def call_openai_function(content: any, function_definition: dict[str, any]):
+    """
+    Call the OpenAI API to fill in the schema based on the provided text
+    """
+    response = get_client().chat.completions.create(**build_request(content, function_definition))
 
     # response = response.choices[0].message.tool_calls[0].function.arguments
     response = response.choices[0].message.content
     return json.loads(response)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a failed call is worth retrying: a timeout, a lost connection, a 5xx,
+    or an answer that is not valid JSON or does not match the schema
+    """
+    import openai
+
+    if isinstance(error, (json.JSONDecodeError, SchemaValidationError, asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+async def complete_async(client,
+                         request: dict[str, any],
+                         parse: Callable[[str], any] = json.loads,
+                         timeout: float = 120.0,
+                         max_retries: int = 3,
+                         backoff_base: float = 0.5,
+                         backoff_max: float = 30.0,
+                         on_response: Callable[[any], None] | None = None):
+    """
+    Send a chat completion and parse its answer, retrying with jittered exponential backoff
+    when the call times out, fails with a 5xx or the answer cannot be parsed.
+    'on_response' is given every response received, before its answer is parsed.
+    """
+    attempt = 0
+
+    while True:
+        try:
+            response = await client.chat.completions.create(**request, timeout=timeout)
+            if on_response is not None:
+                on_response(response)
+            return parse(response.choices[0].message.content)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            logging.warning(f"Call to {request['model']} failed ({type(e).__name__}: {e}), retrying")
+
+        await asyncio.sleep(random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt)))
+        attempt += 1
+
+
+async def call_openai_function_async(client,
+                                     content: any,
+                                     function_definition: dict[str, any],
+                                     timeout: float = 120.0,
+                                     max_retries: int = 3):
+    """
+    Call the OpenAI API asynchronously to fill in the schema based on the provided text
+    """
+    return await complete_async(
+        client,
+        build_request(content, function_definition),
+        timeout=timeout,
+        max_retries=max_retries)
@@ -0,0 +1,208 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from ai import ai
+from instrumentation import Counters, metrics
+from ai.schema_validator import SchemaValidationError, compile_schema
+
+
+class ExtractionStats(Counters):
+    """
+    Counters for the extractions made with a spec
+    """
+
+    calls: int = 0
+    cache_hits: int = 0
+    deduplicated: int = 0
+    responses: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+
+    derived = ("tokens_per_second",)
+
+    def add_response(self, response):
+        """
+        Count a response and the tokens its server reports, if it reports them
+        """
+        usage = getattr(response, "usage", None)
+        self.add(
+            responses=1,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+
+    @property
+    def tokens_per_second(self) -> float:
+        """
+        Prompt and completion tokens processed per second spent in calls, retries included
+        """
+        return (self.prompt_tokens + self.completion_tokens) / self.seconds if self.seconds else 0.0
+
+
+class ExtractionSpec:
+    """
+    A JSON schema compiled once into everything needed to fill it in from page content.
+
+    The function definition, response format and system message are built once and every request reuses them,
+    so the prompt prefix sent to the server is byte-identical and its prompt cache can be reused. Answers are
+    checked by a validator compiled from the schema, and the answers for the most recent inputs are kept in an
+    LRU cache, so a page with the same content never goes back to the model.
+    """
+
+    def __init__(self,
+                 json_schema: ai.JsonSchema,
+                 description: str = "Fill in the schema based on the provided text",
+                 cache_size: int = 1024,
+                 stats: ExtractionStats | None = None):
+        """
+        :param json_schema: Schema the model fills in
+        :param description: Description of the function whose parameters are the schema
+        :param cache_size: Answers kept for identical inputs, 0 to disable the cache
+        :param stats: Counters to add to, shared with other specs, new ones by default
+        """
+        self.json_schema = json_schema
+        self.description = description
+        self.cache_size = cache_size
+        self.function_definition = ai.get_function_definition(
+            name=json_schema["title"],
+            description=description,
+            json_schema=json_schema)
+        self.validate = compile_schema(json_schema)
+        self.system_message = {"role": "system", "content": ai.SYSTEM_PROMPT}
+        self.request_template = {
+            "model": ai.MODEL,
+            "response_format": ai.build_response_format(self.function_definition)
+        }
+        self.stats = stats if stats is not None else ExtractionStats()
+        self._cache: collections.OrderedDict[str, any] = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    def fingerprint(self) -> dict:
+        """
+        Everything besides the content that changes the answers
+        """
+        return {
+            "schema": self.json_schema,
+            "description": self.description,
+            "model": self.request_template["model"],
+            "system_prompt": self.system_message["content"]
+        }
+
+    @staticmethod
+    def user_content(content: any) -> str:
+        return json.dumps(obj=content, indent=None)
+
+    def request(self, user_content: str) -> dict[str, any]:
+        return {
+            **self.request_template,
+            "messages": [self.system_message, {"role": "user", "content": user_content}]
+        }
+
+    def parse(self, answer: str) -> any:
+        """
+        Decode an answer and check it against the schema, raising a SchemaValidationError if it does not match
+        """
+        data = json.loads(answer)
+        self.validate(data)
+        return data
+
+    def extract(self, content: any, max_retries: int = 3) -> any:
+        """
+        Fill in the schema from the content with a synchronous call, unless the same content was answered before.
+
+        An answer that is not JSON or does not match the schema is asked for again, up to 'max_retries' times,
+        like 'extract_async' does; the client retries failed connections and 5xx responses itself.
+        """
+        user_content = self.user_content(content)
+        key = self.cache_key(user_content)
+        found, data = self.cached(key)
+        if found:
+            return data
+
+        self.stats.add(calls=1)
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                response = ai.get_client().chat.completions.create(**self.request(user_content))
+                self.stats.add_response(response)
+                try:
+                    data = self.parse(response.choices[0].message.content)
+                    break
+                except (json.JSONDecodeError, SchemaValidationError) as e:
+                    if attempt >= max_retries:
+                        raise
+                    logging.warning(f"Answer of {self.request_template['model']} rejected ({type(e).__name__}: {e}), retrying")
+                    attempt += 1
+        finally:
+            self.stats.add(seconds=time.perf_counter() - start)
+            metrics.call_seconds("llm").observe(time.perf_counter() - start)
+        self.store(key, data)
+        return data
+
+    async def extract_async(self, client, content: any, timeout: float = 120.0, max_retries: int = 3) -> any:
+        """
+        Fill in the schema from the content with an asynchronous call, retrying answers that do not match the schema.
+
+        Identical content that is already being extracted waits for that answer instead of making another call.
+        """
+        user_content = self.user_content(content)
+        key = self.cache_key(user_content)
+        found, data = self.cached(key)
+        if found:
+            return data
+
+        if key in self._in_flight:
+            self.stats.add(deduplicated=1)
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        start = time.perf_counter()
+        try:
+            self.stats.add(calls=1)
+            data = await ai.complete_async(
+                client,
+                self.request(user_content),
+                parse=self.parse,
+                timeout=timeout,
+                max_retries=max_retries,
+                on_response=self.stats.add_response)
+            self.store(key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            # The waiters, if any, retrieve the exception; mark it retrieved for when there are none
+            future.exception()
+            raise
+        finally:
+            self.stats.add(seconds=time.perf_counter() - start)
+            metrics.call_seconds("llm").observe(time.perf_counter() - start)
+            del self._in_flight[key]
+
+    def cache_key(self, user_content: str) -> str:
+        return hashlib.sha256(user_content.encode("utf-8")).hexdigest()
+
+    def cached(self, key: str) -> tuple[bool, any]:
+        with self._cache_lock:
+            if key not in self._cache:
+                return False, None
+            self._cache.move_to_end(key)
+            self.stats.add(cache_hits=1)
+            return True, self._cache[key]
+
+    def store(self, key: str, data: any):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = data
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
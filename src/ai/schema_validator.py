@@ -0,0 +1,121 @@
+import re
+from typing import Callable
+
+from wookiepedia.types import JSON
+
+"""
+Keywords that describe a schema without constraining the values it accepts
+"""
+ANNOTATIONS = frozenset(["$schema", "$comment", "$id", "title", "description", "format", "default", "examples"])
+
+_types: dict[str, Callable[[JSON], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None
+}
+
+Validator = Callable[[JSON, str], None]
+
+
+class SchemaValidationError(ValueError):
+    """
+    A value that does not match its JSON schema
+    """
+
+    def __init__(self, path: str, message: str):
+        super().__init__(f"{path}: {message}")
+        self.path = path
+
+
+def compile_schema(schema: JSON) -> Callable[[JSON], None]:
+    """
+    Compile a JSON schema into a function that raises a SchemaValidationError for a value that does not match it.
+
+    Only the keywords used by the schemas in 'json_schemas' are supported: type, properties, required,
+    additionalProperties, items, enum, pattern, minimum and maximum. Any other validation keyword is
+    rejected when compiling, rather than silently ignored when validating.
+    """
+    validate = _compile(schema, "$")
+    return lambda value: validate(value, "$")
+
+
+def _compile(schema: JSON, location: str) -> Validator:
+    unsupported = set(schema) - ANNOTATIONS - {
+        "type", "properties", "required", "additionalProperties", "items", "enum", "pattern", "minimum", "maximum"
+    }
+    if unsupported:
+        raise ValueError(f"{location}: unsupported schema keywords {sorted(unsupported)}")
+
+    checks: list[Validator] = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        type_checks = [_types[name] for name in names]
+
+        def check_type(value, path):
+            if not any(check(value) for check in type_checks):
+                raise SchemaValidationError(path, f"expected {' or '.join(names)}, got {type(value).__name__}")
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+
+        def check_enum(value, path):
+            if value not in allowed:
+                raise SchemaValidationError(path, f"{value!r} is not one of {allowed}")
+        checks.append(check_enum)
+
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+
+        def check_pattern(value, path):
+            if isinstance(value, str) and pattern.search(value) is None:
+                raise SchemaValidationError(path, f"{value!r} does not match {pattern.pattern!r}")
+        checks.append(check_pattern)
+
+    for keyword, fails in (("minimum", lambda value, bound: value < bound), ("maximum", lambda value, bound: value > bound)):
+        if keyword in schema:
+            def check_bound(value, path, bound=schema[keyword], fails=fails, keyword=keyword):
+                if _types["number"](value) and fails(value, bound):
+                    raise SchemaValidationError(path, f"{value} is outside the {keyword} {bound}")
+            checks.append(check_bound)
+
+    if "properties" in schema or "required" in schema or "additionalProperties" in schema:
+        properties = {name: _compile(subschema, f"{location}.{name}") for name, subschema in schema.get("properties", {}).items()}
+        required = schema.get("required", [])
+        additional = schema.get("additionalProperties", True)
+        additional_validator = _compile(additional, f"{location}.*") if isinstance(additional, dict) else None
+
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    raise SchemaValidationError(path, f"missing required property {name!r}")
+            for name, item in value.items():
+                if name in properties:
+                    properties[name](item, f"{path}.{name}")
+                elif additional is False:
+                    raise SchemaValidationError(path, f"unexpected property {name!r}")
+                elif additional_validator is not None:
+                    additional_validator(item, f"{path}.{name}")
+        checks.append(check_object)
+
+    if "items" in schema:
+        items = _compile(schema["items"], f"{location}[]")
+
+        def check_items(value, path):
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    items(item, f"{path}[{index}]")
+        checks.append(check_items)
+
+    def validate(value, path):
+        for check in checks:
+            check(value, path)
+
+    return validate
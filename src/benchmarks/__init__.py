@@ -0,0 +1,2 @@
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
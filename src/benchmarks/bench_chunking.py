@@ -0,0 +1,73 @@
+"""
+Compare the chunking of long sections before and after TextSummariser tokenized content once into
+sentence windows: how many of each section's tokens reach the model, how many windows are produced,
+and how long tokenization takes. The original truncated every section to its first 'max_length'
+tokens, decoded that chunk back to text and had the pipeline tokenize it again.
+
+By default a tiny, randomly initialised BART is built locally so the benchmark runs offline;
+pass --model to use a real checkpoint such as sshleifer/distilbart-cnn-12-6.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_chunking --sections 32 --min-length 2000 --max-length 40000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_summarise import load_sections
+from benchmarks.tiny_models import save_tiny_bart
+from summarisation import TextSummariser
+
+
+def tokenize_truncated(tokenizer, content: str, max_length: int = 1024) -> list[list[int]]:
+    """
+    The original chunking, followed by the tokenization the pipeline did on each decoded chunk
+    """
+    input_ids = tokenizer(content, return_tensors="pt", truncation=True, padding='longest', max_length=max_length).input_ids[0]
+    chunks = []
+    for i in range(0, len(input_ids), max_length):
+        chunks.append(tokenizer.decode(input_ids[i:i + max_length], skip_special_tokens=True))
+    return [tokenizer(chunk, truncation=True, max_length=max_length)['input_ids'] for chunk in chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=32, help="Sections to chunk")
+    parser.add_argument("--min-length", type=int, default=2000, help="Shortest section in characters")
+    parser.add_argument("--max-length", type=int, default=40000, help="Longest section in characters")
+    parser.add_argument("--model", default=None, help="Summarisation model, a tiny local BART by default")
+    args = parser.parse_args()
+
+    sections = load_sections(args.sections, min_length=args.min_length, max_length=args.max_length)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model = args.model or save_tiny_bart(os.path.join(directory, "tiny-bart"))
+        summariser = TextSummariser(paraphraser_model=model)
+        summariser.load_model(model)
+        tokenizer = summariser.tokenizer
+
+        total_tokens = sum(len(ids) for ids in tokenizer(sections, add_special_tokens=False)['input_ids'])
+
+        start = time.perf_counter()
+        truncated = [tokenize_truncated(tokenizer, section) for section in sections]
+        truncated_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        windows = summariser.tokenize_windows_many(sections)
+        windows_time = time.perf_counter() - start
+
+    special = tokenizer.num_special_tokens_to_add()
+    truncated_tokens = sum(len(ids) - special for chunks in truncated for ids in chunks)
+    window_tokens = sum(len(ids) - special for text_windows in windows for ids in text_windows)
+
+    print(f"Sections: {len(sections)}, {total_tokens} tokens")
+    print(f"Truncated: {truncated_time * 1000:7.1f}ms, {sum(map(len, truncated)):4d} chunks, "
+          f"{truncated_tokens / total_tokens:6.1%} of the tokens reach the model")
+    print(f"Windows:   {windows_time * 1000:7.1f}ms, {sum(map(len, windows)):4d} windows, "
+          f"{window_tokens / total_tokens:6.1%} of the tokens reach the model (overlap included)")
+
+
+if __name__ == "__main__":
+    main()
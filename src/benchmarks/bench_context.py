@@ -0,0 +1,75 @@
+"""
+Compare what is sent to the model for a page: its title only, the whole raw page, or the context selected
+by a ContextBuilder under a few token budgets. For each, SchemaProcessor fills in the character schema from
+a local OpenAI-compatible stub whose latency grows with the prompt, and the prompt size, the time spent
+building contexts and the tokens per second of the calls are reported.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_context --copies 10 --budgets 128 512 --prompt-token-latency 0.0005
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import ai
+from benchmarks.bench_output_formats import crawl
+from benchmarks.bench_schemas import count_outputs
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
+from schemas import SchemaProcessor
+
+
+class RawPageProcessor(SchemaProcessor):
+    """
+    Sends the whole raw page to the model
+    """
+
+    def content(self, data) -> any:
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="How many times to repeat the fixture pages")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the stub takes per request")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005, help="Seconds the stub takes per prompt token")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[128, 512], help="Context token budgets to compare")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as api, tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, "raw")
+        crawl(api, raw_dir)
+        input_dir = os.path.join(raw_dir, "Character")
+        files = count_outputs(input_dir)
+        print(f"{files} character files, stub latency {args.latency}s + {args.prompt_token_latency}s per prompt token")
+
+        runs = [("title", SchemaProcessor, 0), ("raw page", RawPageProcessor, 0)]
+        runs += [(f"context {budget}", SchemaProcessor, budget) for budget in args.budgets]
+
+        for name, processor_class, budget in runs:
+            with MockLlmServer(latency=args.latency, slots=args.concurrency, prompt_token_latency=args.prompt_token_latency) as llm:
+                ai.configure_client(llm.url)
+                processor = processor_class(
+                    input_dir=input_dir,
+                    output_dir=os.path.join(directory, name.replace(" ", "-")),
+                    json_schema=ai.load_json_schema("character"),
+                    concurrency=args.concurrency,
+                    context_tokens=budget)
+
+                start = time.perf_counter()
+                processor.process_raw_files()
+                elapsed = time.perf_counter() - start
+
+                stats = processor.spec.stats
+                contexts = processor.context_builder.stats
+                print(f"{name:12s}: {elapsed:6.2f}s, {files / elapsed * 60:7.1f} files/min, "
+                      f"{stats.prompt_tokens / max(1, stats.responses):7.1f} prompt tokens per call, "
+                      f"{stats.tokens_per_second:7.1f} tokens/s per call, "
+                      f"{contexts.seconds / max(1, contexts.pages) * 1e3:5.2f} ms building each context")
+
+
+if __name__ == "__main__":
+    main()
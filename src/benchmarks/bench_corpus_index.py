@@ -0,0 +1,82 @@
+"""
+Measure selecting the pages of a category by opening every raw file against a CorpusIndex, for both the
+per-page JSON files and the shards: the time to build and open the index, its size, the time of a category
+lookup and of listing the processing tasks of the selected pages.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_corpus_index --copies 1000 --category "Category:Jedi Masters"
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import timeit
+
+from benchmarks.bench_output_formats import crawl
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from processing import list_tasks
+from wookiepedia import CorpusIndex, ShardWriter, category_name
+
+
+def scan(input_dir: str, category: str) -> list[int]:
+    """
+    The ids of the pages in a category, found by reading every raw file
+    """
+    page_ids = []
+    for root, dirs, files in os.walk(input_dir):
+        for file in files:
+            if file.endswith(".json"):
+                with open(os.path.join(root, file), "r") as input:
+                    data = json.load(input)
+                if category in data["categories"]:
+                    page_ids.append(data["id"])
+    return sorted(page_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=1000, help="How many times to repeat the fixture pages")
+    parser.add_argument("--category", default="Category:Jedi Masters", help="Category whose pages are selected")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as api, tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, "raw")
+        shards_dir = os.path.join(directory, "shards")
+        crawl(api, raw_dir)
+        crawl(api, shards_dir, sink=ShardWriter(shards_dir))
+
+        start = time.perf_counter()
+        expected = scan(raw_dir, category_name(args.category))
+        print(f"scan of the raw files: {time.perf_counter() - start:8.3f}s, {len(expected)} pages")
+
+        for name, input_dir in (("raw files", raw_dir), ("shards", shards_dir)):
+            start = time.perf_counter()
+            path = CorpusIndex.build(input_dir)
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = CorpusIndex.open(input_dir)
+            open_seconds = time.perf_counter() - start
+
+            page_ids = index.pages(category=args.category)
+            assert page_ids == expected
+            assert index.read(page_ids[0])["id"] == page_ids[0]
+            assert index.find(index.title(page_ids[0])) == page_ids[0]
+
+            number = 100
+            lookup_seconds = timeit.timeit(lambda: index.pages(category=args.category), number=number) / number
+            start = time.perf_counter()
+            tasks = list_tasks(input_dir, os.path.join(directory, "out", name.replace(" ", "-")), page_ids=page_ids)
+            tasks_seconds = time.perf_counter() - start
+            assert len(tasks) == len(page_ids)
+
+            print(f"{name:9s}: build {build_seconds:6.3f}s, {os.path.getsize(path) / 2 ** 10:6.1f} KiB, "
+                  f"open {open_seconds * 1e3:6.3f}ms, lookup {lookup_seconds * 1e3:6.3f}ms, "
+                  f"{len(tasks)} tasks listed in {tasks_seconds:6.3f}s")
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measure crawl throughput in pages/sec against the local api.php mock, comparing the
+thread-pool-per-batch crawl with the queue-based AsyncCrawler. With --processes the
+HTML cleanup and infobox parsing of the AsyncCrawler run on a process pool.
+The infobox of --malformed pages is broken, and only those pages may fail.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_crawl --copies 100 --batch-size 50 --workers 16 --processes 4
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from wookiepedia import AsyncCrawler, HttpTransport, PageDownloader
+from wookiepedia.types import JSON
+
+
+def create_downloader(server: MockApiServer, output_dir: str, workers: int, processes: int = 0) -> PageDownloader:
+    page_downloader = PageDownloader(
+        output_dir=output_dir,
+        batch_requests=True,
+        workers=workers,
+        transport=HttpTransport(pool_size=workers, rate_limit=None),
+        processes=processes)
+    page_downloader.url = server.url
+    return page_downloader
+
+
+def break_infoboxes(pages: list[JSON], count: int):
+    """
+    Replace the infobox of 'count' pages spread over the crawl by one that fails to parse
+    """
+    for page in pages[::max(1, len(pages) // count)][:count] if count else []:
+        page["infobox"] = [{"data": "malformed"}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=100, help="How many times to repeat the fixture pages")
+    parser.add_argument("--batch-size", type=int, default=50, help="Pages per 'pageswithprop' batch")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds of latency per request")
+    parser.add_argument("--workers", type=int, default=16, help="Pages processed concurrently")
+    parser.add_argument("--processes", type=int, default=0, help="Worker processes that build the outputs")
+    parser.add_argument("--malformed", type=int, default=1, help="Pages whose infobox fails to parse")
+    args = parser.parse_args()
+
+    pages = load_fixture_pages(copies=args.copies)
+    break_infoboxes(pages, args.malformed)
+
+    with MockApiServer(pages=pages, batch_size=args.batch_size, latency=args.latency) as server:
+        with tempfile.TemporaryDirectory() as output_dir:
+            page_downloader = create_downloader(server, output_dir, args.workers)
+            start = time.perf_counter()
+            downloaded = page_downloader.download_pages_with_infoboxes()
+            threaded = downloaded / (time.perf_counter() - start)
+            page_downloader.close()
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            page_downloader = create_downloader(server, output_dir, args.workers, args.processes)
+            stats = AsyncCrawler(page_downloader).run()
+            page_downloader.close()
+
+    print(f"{'threaded':>9}: {threaded:.1f} pages/s ({len(pages) - downloaded} failures)")
+    print(f"{'async':>9}: {stats.pages_per_second:.1f} pages/s ({stats.failures} failures)")
+    assert downloaded == stats.pages == len(pages) - args.malformed, "pages failed along with a malformed page"
+
+
+if __name__ == "__main__":
+    main()
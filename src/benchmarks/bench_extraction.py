@@ -0,0 +1,78 @@
+"""
+Measure what compiling a schema once into an ExtractionSpec saves: the cost of building every request
+from the schema against reusing the spec's prebuilt request, and the calls to a local OpenAI-compatible
+stub when the same page content comes back several times, with and without the spec's answer cache.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_extraction --pages 200 --repeats 3 --latency 0.05 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+import ai
+from benchmarks.mock_llm import MockLlmServer
+
+
+def time_per_call(function, number: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+async def extract_all(spec: ai.ExtractionSpec, contents: list[str], concurrency: int, timeout: float):
+    client = ai.create_async_client()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def extract(content):
+        async with slots:
+            return await spec.extract_async(client, content, timeout=timeout)
+
+    try:
+        return await asyncio.gather(*(extract(content) for content in contents))
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schema", default="character", help="Schema from 'ai/json_schemas' to fill in")
+    parser.add_argument("--pages", type=int, default=200, help="Distinct page contents")
+    parser.add_argument("--repeats", type=int, default=3, help="Times every page content is sent")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub takes per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--number", type=int, default=2000, help="Calls per timing of the request builders")
+    args = parser.parse_args()
+
+    schema = ai.load_json_schema(args.schema)
+    spec = ai.ExtractionSpec(schema)
+    description = "Fill in the schema based on the provided text"
+    content = "Luke Skywalker"
+
+    def per_call():
+        function_definition = ai.get_function_definition(name=schema["title"], description=description, json_schema=schema)
+        return ai.build_request(content, function_definition)
+
+    print(f"request per call: {time_per_call(per_call, args.number) * 1e6:8.1f} us")
+    print(f"request from spec: {time_per_call(lambda: spec.request(spec.user_content(content)), args.number) * 1e6:7.1f} us")
+
+    answer = '{"name": "Luke Skywalker", "birth": "19 BBY", "aliases": ["Red Five"], "height": 1.72}'
+    print(f"parse and validate: {time_per_call(lambda: spec.parse(answer), args.number) * 1e6:6.1f} us")
+
+    contents = [f"Page {page}" for page in range(args.pages)] * args.repeats
+    for cache_size in (0, 1024):
+        with MockLlmServer(latency=args.latency, slots=args.concurrency) as llm:
+            ai.configure_client(llm.url)
+            spec = ai.ExtractionSpec(schema, cache_size=cache_size)
+
+            start = time.perf_counter()
+            answers = asyncio.run(extract_all(spec, contents, args.concurrency, timeout=30.0))
+            elapsed = time.perf_counter() - start
+
+            assert all(answer["name"] == content for answer, content in zip(answers, contents))
+            print(f"cache size {cache_size:5d}: {elapsed:6.2f}s for {len(contents)} pages, "
+                  f"{llm.request_count} requests, {spec.stats.to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
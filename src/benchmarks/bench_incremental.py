@@ -0,0 +1,95 @@
+"""
+Measure reruns of the output processors over raw files crawled from the local api.php mock: a first run,
+an unchanged rerun, a rerun after a few pages changed, and a rerun after the schema changed.
+The language model is replaced by a local stub server that takes --llm-latency seconds per call, and the
+summariser uses a tiny, randomly initialised BART built locally.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_incremental --copies 20 --changed 3
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import ai
+from benchmarks.bench_output_formats import crawl
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
+from benchmarks.tiny_models import save_tiny_bart
+from schemas import SchemaProcessor
+from summarisation import RawFileProcessor, TextSummariser
+
+
+class CountingSummariser(TextSummariser):
+    calls = 0
+
+    def summarize_many(self, contents: list[str], max_length=1024) -> list[str]:
+        CountingSummariser.calls += len(contents)
+        return super().summarize_many(contents, max_length=max_length)
+
+
+def change_pages(raw_dir: str, count: int):
+    """
+    Rename the title of the first 'count' character pages, as a crawl refresh would
+    """
+    character_dir = os.path.join(raw_dir, "Character")
+    for file_name in sorted(os.listdir(character_dir))[:count]:
+        path = os.path.join(character_dir, file_name)
+        with open(path, "r") as file:
+            data = json.load(file)
+        data["infobox"]["infobox"]["title"] += " (revised)"
+        data["sections"] = {name: text + " Revised." for name, text in data["sections"].items()}
+        with open(path, "w") as file:
+            json.dump(data, file, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="How many times to repeat the fixture pages")
+    parser.add_argument("--changed", type=int, default=3, help="Pages changed between the runs")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stub language model takes per call")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as server, \
+            MockLlmServer(latency=args.llm_latency) as llm, \
+            tempfile.TemporaryDirectory() as directory:
+        ai.configure_client(llm.url)
+        raw_dir = os.path.join(directory, "raw")
+        crawl(server, raw_dir)
+        model = save_tiny_bart(os.path.join(directory, "tiny-bart"))
+        schema = ai.load_json_schema("character")
+
+        def run_schemas(json_schema):
+            requests = llm.request_count
+            start = time.perf_counter()
+            SchemaProcessor(
+                input_dir=os.path.join(raw_dir, "Character"),
+                output_dir=os.path.join(directory, "schemas"),
+                json_schema=json_schema).process_raw_files()
+            return time.perf_counter() - start, llm.request_count - requests
+
+        def run_summaries():
+            CountingSummariser.calls = 0
+            summarizer = CountingSummariser(paraphraser_model=model)
+            summarizer.load_model(model)
+            start = time.perf_counter()
+            RawFileProcessor(input_dir=raw_dir, output_dir=os.path.join(directory, "summarised"), summarizer=summarizer).process_raw_files()
+            return time.perf_counter() - start, CountingSummariser.calls
+
+        def report(name: str, schemas: tuple[float, int], summaries: tuple[float, int]):
+            print(f"{name:<16} schemas {schemas[0]:6.2f}s, {schemas[1]:4d} LLM calls | "
+                  f"summaries {summaries[0]:6.2f}s, {summaries[1]:4d} sections summarised")
+
+        report("First run", run_schemas(schema), run_summaries())
+        report("Unchanged", run_schemas(schema), run_summaries())
+        change_pages(raw_dir, args.changed)
+        report(f"{args.changed} changed", run_schemas(schema), run_summaries())
+        changed_schema = {**schema, "description": schema.get("description", "") + " Revised."}
+        report("Schema changed", run_schemas(changed_schema), (0.0, 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measure the model calls the infobox fast path avoids. SchemaProcessor fills in the character and planet
+schemas from a local OpenAI-compatible stub three ways: the model fills every property, the model fills only
+the properties the infobox did not, and the model is only called when a required property is missing.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_infobox --copies 10 --latency 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import ai
+from benchmarks.bench_output_formats import crawl
+from benchmarks.bench_schemas import count_outputs
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
+from schemas import SchemaProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="How many times to repeat the fixture pages")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub takes per request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as api, tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, "raw")
+        crawl(api, raw_dir)
+
+        for template, schema in (("Character", "character"), ("Planet", "planet")):
+            input_dir = os.path.join(raw_dir, template)
+            files = count_outputs(input_dir)
+            print(f"{files} {schema} files")
+
+            for name, map_infobox, model_fills in (("model only", False, "missing"),
+                                                   ("mapped + missing", True, "missing"),
+                                                   ("mapped + required", True, "required")):
+                with MockLlmServer(latency=args.latency, slots=args.concurrency) as llm:
+                    ai.configure_client(llm.url)
+                    processor = SchemaProcessor(
+                        input_dir=input_dir,
+                        output_dir=os.path.join(directory, schema, name.replace(" ", "-")),
+                        json_schema=ai.load_json_schema(schema),
+                        concurrency=args.concurrency,
+                        map_infobox=map_infobox,
+                        model_fills=model_fills)
+
+                    start = time.perf_counter()
+                    processor.process_raw_files()
+                    elapsed = time.perf_counter() - start
+
+                    mapped = processor.mapper.stats.to_dict() if processor.mapper is not None else {}
+                    print(f"  {name:18s}: {elapsed:5.2f}s, {llm.request_count:3d} model calls, "
+                          f"{mapped.get('calls_avoided', 0):3d} avoided, {mapped.get('complete_pages', 0):3d} complete, "
+                          f"{mapped.get('properties_per_page', 0.0):5.1f} properties mapped per page, "
+                          f"{llm.max_in_flight} in flight at most")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measure answering "which characters link to Tatooine" by loading every raw JSON file against a LinkGraph:
+the time to build, save and load the index, its size on disk and the time of neighbour and two-hop queries.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_link_graph --copies 1000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import timeit
+
+from benchmarks.bench_output_formats import crawl, directory_size
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from wookiepedia import LinkGraph, infobox_links
+
+
+def scan(input_dir: str, title: str, template: str) -> list[str]:
+    """
+    The pages of a template linking to a title, found by reading every raw file
+    """
+    linking = []
+    for root, dirs, files in os.walk(input_dir):
+        for file in files:
+            if file.endswith(".json"):
+                with open(os.path.join(root, file), "r") as input:
+                    data = json.load(input)
+                if data["infobox"]["template"] == template and title in set(infobox_links(data)):
+                    linking.append(data["title"])
+    return linking
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=1000, help="How many times to repeat the fixture pages")
+    parser.add_argument("--title", default="Tatooine", help="Title whose linking pages are looked up")
+    parser.add_argument("--template", default="Character", help="Template of the linking pages")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as api, tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, "raw")
+        crawl(api, raw_dir)
+        files, size = directory_size(raw_dir)
+        print(f"{files} raw files, {size / 2 ** 20:.1f} MiB")
+
+        start = time.perf_counter()
+        expected = scan(raw_dir, args.title, args.template)
+        print(f"scan of the raw files: {time.perf_counter() - start:8.3f}s, {len(expected)} pages")
+
+        start = time.perf_counter()
+        graph = LinkGraph.from_directory(raw_dir)
+        print(f"build:                 {time.perf_counter() - start:8.3f}s, {len(graph)} titles, {graph.edge_count} links")
+
+        path = os.path.join(directory, "links.graph")
+        graph.save(path)
+        start = time.perf_counter()
+        graph = LinkGraph.load(path)
+        print(f"load:                  {time.perf_counter() - start:8.3f}s, {os.path.getsize(path) / 2 ** 10:.1f} KiB")
+
+        found = graph.linked_from(args.title, template=args.template)
+        assert sorted(found) == sorted(expected)
+
+        number = 100
+        seconds = timeit.timeit(lambda: graph.linked_from(args.title, template=args.template), number=number) / number
+        print(f"linked_from:           {seconds * 1e3:8.3f}ms, {len(found)} pages")
+        seconds = timeit.timeit(lambda: graph.neighbours(expected[0]), number=number) / number
+        print(f"neighbours:            {seconds * 1e3:8.3f}ms")
+        seconds = timeit.timeit(lambda: graph.expand(expected[0], hops=2), number=10) / 10
+        print(f"two-hop expansion:     {seconds * 1e3:8.3f}ms, {len(graph.expand(expected[0], hops=2))} titles")
+
+
+if __name__ == "__main__":
+    main()
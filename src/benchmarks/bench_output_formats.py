@@ -0,0 +1,76 @@
+"""
+Compare the per-page indented JSON files with the compressed JSON Lines shards:
+bytes on disk, files created, and the time to stream every record back.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_output_formats --copies 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from wookiepedia import HttpTransport, PageDownloader, ShardReader, ShardWriter
+
+
+def directory_size(directory: str) -> tuple[int, int]:
+    files = 0
+    size = 0
+    for root, dirs, file_names in os.walk(directory):
+        for file_name in file_names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, file_name))
+    return files, size
+
+
+def crawl(server: MockApiServer, output_dir: str, sink: ShardWriter | None = None):
+    page_downloader = PageDownloader(
+        output_dir=output_dir,
+        batch_requests=True,
+        transport=HttpTransport(rate_limit=None),
+        sink=sink)
+    page_downloader.url = server.url
+    page_downloader.download_pages_with_infoboxes()
+    page_downloader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200, help="How many times to repeat the fixture pages")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as server, \
+            tempfile.TemporaryDirectory() as files_dir, \
+            tempfile.TemporaryDirectory() as shards_dir:
+        crawl(server, files_dir)
+        crawl(server, shards_dir, sink=ShardWriter(shards_dir))
+
+        start = time.perf_counter()
+        file_records = 0
+        for root, dirs, file_names in os.walk(files_dir):
+            for file_name in file_names:
+                with open(os.path.join(root, file_name), "r") as file:
+                    json.load(file)
+                file_records += 1
+        files_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reader = ShardReader(shards_dir)
+        shard_records = sum(1 for _ in reader.iter_records())
+        reader.close()
+        shards_seconds = time.perf_counter() - start
+
+        results = {
+            "files": (*directory_size(files_dir), file_records / files_seconds),
+            "shards": (*directory_size(shards_dir), shard_records / shards_seconds)
+        }
+
+    for name, (files, size, records_per_second) in results.items():
+        print(f"{name:>7}: {files} files, {size / 1024:.0f} KiB, {records_per_second:.0f} records/s streamed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measure paraphrasing throughput in sections/sec for sections short enough to be paraphrased,
+comparing one 'generate' call per section (the implementation 'paraphrase_many' replaced) with
+length-sorted batches, with and without dynamic int8 quantization.
+
+By default a tiny, randomly initialised BART is built locally so the benchmark runs offline;
+pass --model to use a real checkpoint such as eugenesiow/bart-paraphrase.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_paraphrase --sections 256 --batch-size 16
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from benchmarks.bench_summarise import load_sections
+from benchmarks.tiny_models import save_tiny_bart
+from summarisation.text_paraphraser import TextParaphraser
+
+
+def paraphrase_one_by_one(paraphraser: TextParaphraser, texts: list[str]) -> list[str]:
+    """
+    The original implementation, which tokenizes, generates and decodes every text on its own
+    """
+    paraphrases = []
+    for text in texts:
+        batch = paraphraser.tokenizer(text=text, return_tensors="pt").to(paraphraser.device)
+        generated_ids = paraphraser.model.generate(batch['input_ids'])
+        paraphrases.append(paraphraser.tokenizer.decode(generated_ids[0], skip_special_tokens=True))
+    return paraphrases
+
+
+def measure(name: str, texts: list[str], paraphrase) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    paraphrases = paraphrase(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {elapsed:6.2f}s, {len(texts) / elapsed:7.2f} sections/s")
+    return elapsed, paraphrases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=256, help="Sections to paraphrase")
+    parser.add_argument("--batch-size", type=int, default=16, help="Sections per batch for 'paraphrase_many'")
+    parser.add_argument("--model", default=None, help="Paraphrasing model, a tiny local BART by default")
+    parser.add_argument("--d-model", type=int, default=256, help="Hidden size of the tiny local BART")
+    args = parser.parse_args()
+
+    texts = load_sections(args.sections, min_length=20, max_length=250)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model = args.model or save_tiny_bart(os.path.join(directory, "tiny-bart"), d_model=args.d_model)
+        paraphraser = TextParaphraser(model_name=model, batch_size=args.batch_size)
+        quantized = TextParaphraser(model_name=model, batch_size=args.batch_size, quantize=True)
+
+        print(f"Threads: {torch.get_num_threads()}, device: {paraphraser.device}")
+        sequential_time, sequential = measure("One by one", texts, lambda batch: paraphrase_one_by_one(paraphraser, batch))
+        batched_time, batched = measure("Batched", texts, paraphraser.paraphrase_many)
+        quantized_time, quantized_paraphrases = measure("Batched, int8", texts, quantized.paraphrase_many)
+
+        print(f"Speedup: {sequential_time / batched_time:.2f}x batched, {sequential_time / quantized_time:.2f}x batched int8")
+        print(f"Identical paraphrases: {sum(a == b for a, b in zip(sequential, batched))}/{len(texts)} batched, "
+              f"{sum(a == b for a, b in zip(sequential, quantized_paraphrases))}/{len(texts)} batched int8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compare PageDownloader.parse_infobox with the BeautifulSoup-per-field implementation it replaced,
+checking that both produce byte-identical JSON for every fixture infobox.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_parse_infobox --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from benchmarks.mock_api import FIXTURES_DIR, load_fixture_pages
+from wookiepedia import PageDownloader
+from wookiepedia.types import JSON
+
+
+def load_infobox_fixtures() -> list[str]:
+    infoboxes = [page["infobox"] for page in load_fixture_pages()]
+    with open(os.path.join(FIXTURES_DIR, "infoboxes.json"), "r") as file:
+        infoboxes.extend(json.load(file))
+    return [json.dumps(infobox) for infobox in infoboxes]
+
+
+def parse_infobox_soup(json_string: str) -> JSON:
+    """
+    The original implementation, which builds a BeautifulSoup tree for every header, label and value
+    """
+    trim = PageDownloader.trim
+    value_elems = ["sup", "br", "li"]
+    infobox_data = json.loads(json_string)
+
+    parsed_data = {
+        "template": None,
+        "infobox": {}
+    }
+
+    for item in infobox_data[0]['data']:
+        if item['type'] == 'image':
+            parsed_data['infobox']['image'] = item['data'][0]['url']
+
+        elif item['type'] == 'navigation':
+            navigation = BeautifulSoup(item['data']['value'], "html.parser")
+            anchor = navigation.find("a")
+            parsed_data['template'] = anchor['href'].split(":")[-1]
+
+        elif item['type'] == 'title':
+            parsed_data['infobox']['title'] = item['data']['value']
+
+        elif item['type'] == 'group':
+            group_name_html = BeautifulSoup(item['data']['value'][0]['data']['value'], "html.parser")
+            group_name = group_name_html.get_text(strip=True, separator=", ").strip(trim)
+            parsed_data['infobox'][group_name] = {}
+
+            for group_item in item['data']['value']:
+                if group_item['type'] == 'data':
+                    soup_label = BeautifulSoup(group_item['data']['label'], "html.parser")
+                    for tag in soup_label.find_all("sup"):
+                        tag.decompose()
+
+                    soup_value = BeautifulSoup(group_item['data']['value'], "html.parser")
+                    for tag in soup_value.find_all(value_elems):
+                        if tag.name == "li":
+                            tag.insert_before("\n")
+                        if tag.name == "br":
+                            tag.insert_before("\n")
+                        if tag.name == "sup":
+                            tag.decompose()
+
+                    links = []
+                    for link in soup_value.find_all("a", href=True):
+                        links.append({
+                            "href": link['href'],
+                            "text": link.get_text(strip=True).strip(trim)
+                        })
+
+                    label = (soup_label
+                             .get_text(strip=True, separator=", ")
+                             .replace("  ", " ")
+                             .replace("\\", "")
+                             .strip(trim))
+
+                    value = (soup_value
+                             .get_text(strip=True, separator=", ")
+                             .replace("  ", " ")
+                             .replace("\\", "")
+                             .strip(trim))
+
+                    parsed_data['infobox'][group_name][label] = {
+                        "value": value,
+                        "links": links
+                    }
+    return parsed_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="How many times to parse every fixture")
+    args = parser.parse_args()
+
+    infoboxes = load_infobox_fixtures()
+    page_downloader = PageDownloader()
+
+    mismatches = 0
+    for infobox in infoboxes:
+        expected = json.dumps(parse_infobox_soup(infobox), indent=4)
+        actual = json.dumps(page_downloader.parse_infobox(infobox), indent=4)
+        if expected != actual:
+            mismatches += 1
+            print(f"Mismatch:\n--- BeautifulSoup\n{expected}\n--- parse_infobox\n{actual}", file=sys.stderr)
+
+    soup_seconds = timeit.timeit(lambda: [parse_infobox_soup(infobox) for infobox in infoboxes], number=args.repeat)
+    fast_seconds = timeit.timeit(lambda: [page_downloader.parse_infobox(infobox) for infobox in infoboxes], number=args.repeat)
+    parsed = len(infoboxes) * args.repeat
+
+    print(f"BeautifulSoup: {parsed / soup_seconds:.0f} infoboxes/s")
+    print(f"parse_infobox: {parsed / fast_seconds:.0f} infoboxes/s ({soup_seconds / fast_seconds:.1f}x)")
+    print(f"identical output: {mismatches == 0} ({len(infoboxes)} fixtures)")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measure RawFileProcessor throughput in files/sec over raw files crawled from the local api.php mock,
+summarising in this process and with a pool of worker processes.
+
+By default a tiny, randomly initialised BART is built locally so the benchmark runs offline;
+pass --model to use a real checkpoint such as sshleifer/distilbart-cnn-12-6 (for both models).
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_raw_files --copies 10 --processes 0 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_output_formats import crawl, directory_size
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.tiny_models import save_tiny_bart
+from summarisation import RawFileProcessor, TextSummariser
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="How many times to repeat the fixture pages")
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 2], help="Worker processes to compare, 0 for none")
+    parser.add_argument("--batch-files", type=int, default=8, help="Files summarised together")
+    parser.add_argument("--model", default=None, help="Summarisation and paraphrasing model, a tiny local BART by default")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, "raw")
+        crawl(server, raw_dir)
+        files, size = directory_size(raw_dir)
+        model = args.model or save_tiny_bart(os.path.join(directory, "tiny-bart"))
+        print(f"{files} raw files, {size / 1024:.0f} KiB, {os.cpu_count()} CPUs")
+
+        for processes in args.processes:
+            summarizer = TextSummariser(paraphraser_model=model)
+            summarizer.load_model(model)
+            processor = RawFileProcessor(
+                input_dir=raw_dir,
+                output_dir=os.path.join(directory, f"summarised-{processes}"),
+                batch_files=args.batch_files,
+                processes=processes,
+                summarizer=summarizer)
+
+            start = time.perf_counter()
+            processor.process_raw_files()
+            elapsed = time.perf_counter() - start
+            print(f"{processes} processes: {elapsed:6.2f}s, {files / elapsed:6.2f} files/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure recrawls of the local api.php mock with a crawl state and a response cache, as the pipeline runs them:
+a first crawl, a recrawl after a few pages were edited, and an unchanged recrawl, into per-page files and into
+shards compacted after every crawl. An edited page must be downloaded again rather than answered from the cache,
+and an unchanged recrawl must not download any page.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_recrawl --copies 20 --changed 3
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from wookiepedia import CrawlState, HttpTransport, PageDownloader, ResponseCache, ShardWriter
+
+
+def edit_pages(server: MockApiServer, count: int):
+    """
+    Give the first 'count' pages a new revision, as an edit on the wiki would
+    """
+    # MediaWiki timestamps are whole seconds, so the edit is dated after any response cached this second
+    touched = datetime.fromtimestamp(time.time() + 1, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    for page in server.pages[:count]:
+        page["revid"] += 1
+        page["touched"] = touched
+        page["sections"][0]["html"] += "<p>Revised.</p>"
+
+
+def crawl(server: MockApiServer, directory: str, shards: bool) -> tuple[float, int, int]:
+    """
+    Crawl the mock into 'directory' and return the seconds taken, the pages downloaded and the bytes
+    reclaimed by compacting the shards, which moves every live record of a shard holding a replaced one
+    """
+    crawl_state = CrawlState(os.path.join(directory, "crawl_state.sqlite"))
+    raw_dir = os.path.join(directory, "raw")
+    sink = ShardWriter(raw_dir) if shards else None
+    page_downloader = PageDownloader(
+        output_dir=raw_dir,
+        batch_requests=True,
+        transport=HttpTransport(rate_limit=None),
+        crawl_state=crawl_state,
+        cache=ResponseCache(os.path.join(directory, "cache")),
+        sink=sink)
+    page_downloader.url = server.url
+    server.reset_counters()
+
+    start = time.perf_counter()
+    reclaimed = 0
+    try:
+        page_downloader.download_pages_with_infoboxes()
+        if sink is not None:
+            reclaimed = sink.compact(min_garbage=0)
+    finally:
+        page_downloader.close()
+        page_downloader.transport.cache.close()
+        crawl_state.close()
+
+    return time.perf_counter() - start, server.requests_by_action["parse"], reclaimed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="How many times to repeat the fixture pages")
+    parser.add_argument("--changed", type=int, default=3, help="Pages edited between the crawls")
+    args = parser.parse_args()
+
+    for shards in (False, True):
+        with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            name = "shards" if shards else "files"
+
+            seconds, downloaded, reclaimed = crawl(server, directory, shards)
+            print(f"{name:>6} {'first crawl':<12} {seconds:6.2f}s, {downloaded:4d} pages downloaded, {reclaimed:6d} bytes compacted")
+
+            edit_pages(server, args.changed)
+            seconds, downloaded, reclaimed = crawl(server, directory, shards)
+            print(f"{name:>6} {f'{args.changed} edited':<12} {seconds:6.2f}s, {downloaded:4d} pages downloaded, {reclaimed:6d} bytes compacted")
+            assert downloaded == args.changed, f"{downloaded} pages downloaded after {args.changed} were edited"
+
+            seconds, downloaded, reclaimed = crawl(server, directory, shards)
+            print(f"{name:>6} {'unchanged':<12} {seconds:6.2f}s, {downloaded:4d} pages downloaded, {reclaimed:6d} bytes compacted")
+            assert downloaded == 0, f"{downloaded} unchanged pages downloaded again"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Count the api.php requests a crawl makes per page, with and without batched parse requests.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_requests_per_page --copies 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from wookiepedia import HttpTransport, PageDownloader
+
+
+def read_outputs(output_dir: str) -> dict[str, dict]:
+    outputs = {}
+    for root, dirs, files in os.walk(output_dir):
+        for file_name in files:
+            with open(os.path.join(root, file_name), "r") as file:
+                outputs[file_name] = json.load(file)
+    return outputs
+
+
+def run(server: MockApiServer, batch_requests: bool, output_dir: str) -> dict[str, float]:
+    server.reset_counters()
+    page_downloader = PageDownloader(
+        output_dir=output_dir,
+        batch_requests=batch_requests,
+        transport=HttpTransport(rate_limit=None))
+    page_downloader.url = server.url
+
+    start = time.perf_counter()
+    page_downloader.download_pages_with_infoboxes()
+    elapsed = time.perf_counter() - start
+
+    pages = len(server.pages)
+    return {
+        "pages": pages,
+        "requests": server.request_count,
+        "bytes_received": page_downloader.transport.stats.bytes_received,
+        "parse_requests_per_page": server.requests_by_action["parse"] / pages,
+        "seconds": elapsed,
+        "pages_per_second": pages / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="How many times to repeat the fixture pages")
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated seconds of latency per request")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies), latency=args.latency) as server:
+        with tempfile.TemporaryDirectory() as per_section_dir, tempfile.TemporaryDirectory() as batched_dir:
+            results = {
+                "per_section": run(server, batch_requests=False, output_dir=per_section_dir),
+                "batched": run(server, batch_requests=True, output_dir=batched_dir)
+            }
+            identical = read_outputs(per_section_dir) == read_outputs(batched_dir)
+
+    for mode, result in results.items():
+        print(f"{mode:>12}: {result['parse_requests_per_page']:.2f} parse requests/page, "
+              f"{result['requests']} requests total, {result['pages_per_second']:.1f} pages/s")
+
+    print(f"outputs identical: {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measure SchemaProcessor throughput in files/min against a local OpenAI-compatible stub that serves
+a few requests at once, comparing synchronous calls with bounded concurrent calls. With --error-rate
+and --malformed-rate a fraction of the answers to concurrent calls fail or are not valid JSON, and are
+retried. The synchronous calls do not retry, so they always run without errors.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_schemas --copies 20 --latency 0.2 --slots 8 --concurrency 1 4 8 16
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import ai
+from benchmarks.bench_output_formats import crawl
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
+from schemas import SchemaProcessor
+
+
+def count_outputs(directory: str) -> int:
+    return sum(1 for root, dirs, files in os.walk(directory) for file in files if file.endswith(".json"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="How many times to repeat the fixture pages")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stub takes per request")
+    parser.add_argument("--slots", type=int, default=8, help="Requests the stub serves at once")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16], help="Concurrency limits to compare")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of answers that are not valid JSON")
+    args = parser.parse_args()
+
+    with MockApiServer(pages=load_fixture_pages(copies=args.copies)) as api, tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, "raw")
+        crawl(api, raw_dir)
+        input_dir = os.path.join(raw_dir, "Character")
+        files = count_outputs(input_dir)
+        print(f"{files} character files, stub latency {args.latency}s, {args.slots} slots")
+
+        for concurrency in args.concurrency:
+            errors = concurrency > 1
+            with MockLlmServer(latency=args.latency,
+                               slots=args.slots,
+                               error_rate=args.error_rate if errors else 0.0,
+                               malformed_rate=args.malformed_rate if errors else 0.0) as llm:
+                ai.configure_client(llm.url)
+                output_dir = os.path.join(directory, f"schemas-{concurrency}")
+                processor = SchemaProcessor(
+                    input_dir=input_dir,
+                    output_dir=output_dir,
+                    json_schema=ai.load_json_schema("character"),
+                    concurrency=concurrency,
+                    max_retries=5)
+
+                start = time.perf_counter()
+                processor.process_raw_files()
+                elapsed = time.perf_counter() - start
+
+                print(f"concurrency {concurrency:3d}: {elapsed:6.2f}s, {files / elapsed * 60:7.1f} files/min, "
+                      f"{count_outputs(output_dir)} written, {llm.request_count} requests "
+                      f"({llm.error_count} errors, {llm.malformed_count} malformed), {llm.max_in_flight} in flight at most")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the startup time and peak RSS of each stage's entry point in a fresh interpreter:
+importing the packages, constructing the processors and, for summarisation, loading the models on first use.
+
+By default a tiny, randomly initialised BART is built locally so the benchmark runs offline;
+pass --model to use a real checkpoint such as sshleifer/distilbart-cnn-12-6.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.tiny_models import save_tiny_bart
+
+SCRIPTS = {
+    "import main": "import main",
+    "import wookiepedia": "import wookiepedia",
+    "import schemas": "import schemas",
+    "import summarisation": "import summarisation",
+    "construct RawFileProcessor": "from summarisation import RawFileProcessor\n"
+                                  "RawFileProcessor(input_dir={directory!r}, output_dir={directory!r})",
+    "first summary": "from summarisation import TextSummariser\n"
+                     "summariser = TextSummariser(paraphraser_model={model!r})\n"
+                     "summariser.load_model({model!r})\n"
+                     "summariser.summarize_many(['Luke Skywalker was a Jedi Master.', 'Tatooine ' * 60])",
+}
+
+PREAMBLE = """
+import json, sys, time
+from instrumentation import peak_rss_bytes
+start = time.perf_counter()
+"""
+
+EPILOGUE = """
+print(json.dumps({"seconds": time.perf_counter() - start, "peak_rss_bytes": peak_rss_bytes(),
+                  "torch": "torch" in sys.modules}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=None, help="Summarisation and paraphrasing model, a tiny local BART by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model = args.model or save_tiny_bart(os.path.join(directory, "tiny-bart"))
+
+        for name, script in SCRIPTS.items():
+            code = PREAMBLE + script.format(directory=directory, model=model) + EPILOGUE
+            result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.getcwd())
+            if result.returncode != 0:
+                print(f"{name:<28} failed: {result.stderr.strip().splitlines()[-1]}")
+                continue
+
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            rss = report["peak_rss_bytes"] / 1024 ** 2 if report["peak_rss_bytes"] is not None else float("nan")
+            print(f"{name:<28} {report['seconds']:6.2f}s, peak RSS {rss:6.0f} MiB, torch imported: {report['torch']}")
+
+
+if __name__ == "__main__":
+    main()
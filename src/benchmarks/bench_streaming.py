@@ -0,0 +1,81 @@
+"""
+Compare running the download, summarise and schemas stages one after the other with streaming the downloaded pages
+to the later stages while the crawl runs, against a stub api.php and OpenAI-compatible server with latency and a
+tiny summarisation model. Both runs must write the same files.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_streaming --copies 10 --api-latency 0.05 --llm-latency 0.2
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
+from benchmarks.tiny_models import save_tiny_bart
+from pipeline import build_pipeline, parse_args
+
+
+def output_files(directory: str) -> set[str]:
+    return {
+        os.path.relpath(os.path.join(root, file), directory)
+        for root, dirs, files in os.walk(directory)
+        for file in files
+        if file.endswith(".json")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="How many times to repeat the fixture pages")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Seconds the stub api.php takes per request")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds the stub model server takes per request")
+    parser.add_argument("--workers", type=int, default=4, help="Pages downloaded at once")
+    parser.add_argument("--concurrency", type=int, default=4, help="Model requests in flight at once")
+    parser.add_argument("--queue-size", type=int, default=16, help="Pages waiting for a streaming stage")
+    args = parser.parse_args()
+
+    import torch
+    torch.set_num_threads(1)
+
+    pages = load_fixture_pages(copies=args.copies)
+    with tempfile.TemporaryDirectory() as directory, \
+            MockApiServer(pages=pages, latency=args.api_latency) as api, \
+            MockLlmServer(latency=args.llm_latency, slots=args.concurrency) as llm:
+        model = save_tiny_bart(os.path.join(directory, "tiny-bart"))
+        written = {}
+
+        for mode in ("sequential", "streaming"):
+            run_dir = os.path.join(directory, mode)
+            argv = [
+                "--api-url", api.url,
+                "--llm-url", llm.url,
+                "--raw-dir", os.path.join(run_dir, "raw"),
+                "--summarised-dir", os.path.join(run_dir, "summarised"),
+                "--schemas-dir", os.path.join(run_dir, "schemas"),
+                "--links-file", os.path.join(run_dir, "links.graph"),
+                "--summariser-model", model,
+                "--paraphraser-model", model,
+                "--workers", str(args.workers),
+                "--concurrency", str(args.concurrency),
+                "--queue-size", str(args.queue_size)]
+            if mode == "streaming":
+                argv.append("--stream")
+
+            pipeline = build_pipeline(parse_args(argv))
+            start = time.perf_counter()
+            results = pipeline.run(concurrently=mode == "streaming")
+            seconds = time.perf_counter() - start
+
+            stages = ", ".join(f"{result.name} {result.items} in {result.seconds:.2f}s" for result in results)
+            print(f"{mode:10s}: {seconds:7.2f}s ({stages})")
+            written[mode] = output_files(run_dir)
+
+        assert written["sequential"] == written["streaming"], "the runs wrote different files"
+        print(f"Both runs wrote the same {len(written['streaming'])} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure summarisation throughput in sections/sec, comparing one pipeline call per section
+('TextSummariser.summarize') with length-sorted batches across many sections ('summarize_many').
+
+Sections are built from the fixture pages' text, repeated to a spread of lengths. By default a tiny,
+randomly initialised BART is built locally so the benchmark runs offline; pass --model to use a real
+checkpoint such as sshleifer/distilbart-cnn-12-6.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_summarise --sections 48 --batch-size 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import torch
+
+from benchmarks.mock_api import load_fixture_pages
+from benchmarks.tiny_models import save_tiny_bart
+from summarisation import TextSummariser
+from wookiepedia import PageDownloader
+
+
+def load_sections(count: int, min_length: int = 300, max_length: int = 3000, seed: int = 0) -> list[str]:
+    """
+    'count' texts between 'min_length' and 'max_length' characters, all long enough to be summarised
+    """
+    text = []
+    for page in load_fixture_pages():
+        text.append(PageDownloader.cleanup_section_html(page["lead"]))
+        text.extend(PageDownloader.cleanup_section_html(section["html"]) for section in page["sections"])
+    text = " ".join(part for part in text if part)
+
+    generator = random.Random(seed)
+    sections = []
+    for _ in range(count):
+        length = generator.randint(min_length, max_length)
+        start = generator.randrange(len(text))
+        sections.append((text[start:] + " " + text * (length // len(text) + 1))[:length])
+    return sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=48, help="Sections to summarise")
+    parser.add_argument("--batch-size", type=int, default=8, help="Chunks per batch for 'summarize_many'")
+    parser.add_argument("--model", default=None, help="Summarisation and paraphrasing model, a tiny local BART by default")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    sections = load_sections(args.sections)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model = args.model or save_tiny_bart(os.path.join(directory, "tiny-bart"))
+        summariser = TextSummariser(paraphraser_model=model, batch_size=args.batch_size)
+        summariser.load_model(model)
+
+        start = time.perf_counter()
+        sequential = [summariser.summarize(section) for section in sections]
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = summariser.summarize_many(sections)
+        batched_time = time.perf_counter() - start
+
+    identical = sum(1 for a, b in zip(sequential, batched) if a == b)
+    print(f"Threads:    {torch.get_num_threads()}")
+    print(f"Sequential: {sequential_time:.2f}s, {len(sections) / sequential_time:.2f} sections/s")
+    print(f"Batched:    {batched_time:.2f}s, {len(sections) / batched_time:.2f} sections/s (batch size {args.batch_size})")
+    print(f"Speedup:    {sequential_time / batched_time:.2f}x")
+    print(f"Identical summaries: {identical}/{len(sections)}")
+
+
+if __name__ == "__main__":
+    main()
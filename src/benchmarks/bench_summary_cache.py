@@ -0,0 +1,83 @@
+"""
+Measure the summary cache on a corpus with repeated sections: 'unique' distinct sections, each repeated on
+'repeats' pages, every repeat after the first with one word changed, like a stub notice naming its page.
+Reports the time and hit rate of a run without the cache, a cold and a warm run with it, and a cold run
+reusing the summaries of near duplicates.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_summary_cache --unique 12 --repeats 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.bench_summarise import load_sections
+from benchmarks.tiny_models import save_tiny_bart
+from summarisation import SummaryCache, TextSummariser
+
+
+def corpus(unique: int, repeats: int, seed: int = 0) -> list[str]:
+    generator = random.Random(seed)
+    texts = []
+    for section in load_sections(unique, seed=seed):
+        texts.append(section)
+        for repeat in range(1, repeats):
+            words = section.split(" ")
+            words[generator.randrange(len(words))] = f"Page{repeat}"
+            texts.append(" ".join(words))
+    generator.shuffle(texts)
+    return texts
+
+
+def run(summariser: TextSummariser, texts: list[str], batch: int) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    summaries = []
+    for position in range(0, len(texts), batch):
+        summaries.extend(summariser.summarize_many(texts[position:position + batch]))
+    return time.perf_counter() - start, summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--unique", type=int, default=12, help="Distinct sections")
+    parser.add_argument("--repeats", type=int, default=4, help="Pages each section appears on")
+    parser.add_argument("--batch", type=int, default=8, help="Sections summarised together, like a batch of files")
+    parser.add_argument("--distance", type=int, default=3, help="Bits a near duplicate's SimHash may differ in")
+    args = parser.parse_args()
+
+    import torch
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+
+    texts = corpus(args.unique, args.repeats)
+    with tempfile.TemporaryDirectory() as directory:
+        model = save_tiny_bart(os.path.join(directory, "tiny-bart"))
+
+        def summariser(cache: SummaryCache | None) -> TextSummariser:
+            text_summariser = TextSummariser(paraphraser_model=model, cache=cache)
+            text_summariser.load_model(model)
+            return text_summariser
+
+        summariser(None).summarize(texts[0])
+        seconds, expected = run(summariser(None), texts, args.batch)
+        print(f"no cache        : {seconds:7.2f}s for {len(texts)} sections")
+
+        exact = SummaryCache(os.path.join(directory, "exact"))
+        for name in ("exact, cold", "exact, warm"):
+            exact.stats.take()
+            seconds, summaries = run(summariser(exact), texts, args.batch)
+            assert summaries == expected, "the cache changed a summary"
+            print(f"{name:16s}: {seconds:7.2f}s, {exact.stats.to_dict()}")
+        exact.close()
+
+        near = SummaryCache(os.path.join(directory, "near"), near_duplicate_distance=args.distance)
+        seconds, summaries = run(summariser(near), texts, args.batch)
+        print(f"{'near, cold':16s}: {seconds:7.2f}s, {near.stats.to_dict()}")
+        near.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare the text normalisation of wookiepedia.text_normalisation with the implementations it replaced:
+BeautifulSoup text extraction followed by two regular expressions for the section HTML, and patterns compiled
+on every call for the file names. Every fixture section, whole rendered page and edge case must give the same
+text before anything is timed.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_text_normalisation --repeat 20
+"""
+import argparse
+import json
+import re
+import timeit
+
+from bs4 import BeautifulSoup
+
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from wookiepedia import PageDownloader
+
+"""
+Markup the fixtures have little or none of, each of which the tree-less scanner must handle like html.parser
+"""
+EDGE_CASES = [
+    "",
+    "   ",
+    "<p>plain</p>",
+    "<p>A&amp;B &lt;tag&gt; &quot;quoted&quot; &#39;apostrophe&#39; &#x2014; &copy; &amp</p>",
+    "<p>non&nbsp;breaking spaces and\ttabs\n\nand lines</p>",
+    "<p>escaped [\\] backslash [\\]and [ \\] not</p>",
+    "<div><!-- a comment --><p>after</p><![CDATA[cdata text]]><!DOCTYPE html></div>",
+    "<p>before<script>var x = '<p>no</p>';</script><style>p { color: red; }</style>after</p>",
+    "<ul><li>one<li>two<li>three</ul><p>unclosed <b>bold <i>italic</p> tail",
+    "<p>a < b and c > d</p>",
+    "<p>line<br>break<br/>and<br />more<img src='x.png' alt='no'>done</p>",
+    "<table><tr><td>cell 1</td><td> cell 2 </td></tr></table>",
+    "<h2><span class=\"mw-headline\" id=\"Biography\">Biography</span></h2><p>Text.</p>",
+    "<p title='a > b'>attribute with a bracket</p>",
+    "<p>stray end tags</span></div> remain</p>",
+]
+
+
+def cleanup_section_html_soup(html: str) -> str:
+    """
+    The original implementation, which builds a BeautifulSoup tree of the section
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    text = soup.get_text(strip=True, separator=" ")
+    text = re.sub(r'\[\\]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def get_safe_file_name_re(template: str, page_id: int, title: str) -> str:
+    """
+    The original implementation, which looks the patterns up in the regular expression cache on every call
+    """
+    safe_template = re.sub(r'[^\w\s-]', '_', template)
+    safe_title = re.sub(r'[^\w\s-]', '_', title).replace(' ', '_')
+    return f"{page_id}_{safe_template}_{safe_title}.json"
+
+
+def load_section_html(copies: int) -> list[str]:
+    pages = load_fixture_pages(copies=copies)
+    api = MockApiServer(pages=pages)
+    sections = [page["lead"] for page in pages]
+    sections.extend(section["html"] for page in pages for section in page["sections"])
+    sections.extend(api.render_section(page, index) for page in pages for index in range(1, len(page["sections"]) + 1))
+    return sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=1, help="How many times to repeat the fixture pages")
+    parser.add_argument("--repeat", type=int, default=20, help="Times every benchmark is run")
+    args = parser.parse_args()
+
+    sections = load_section_html(args.copies)
+    for html in sections + EDGE_CASES:
+        expected = cleanup_section_html_soup(html)
+        actual = PageDownloader.cleanup_section_html(html)
+        assert actual == expected, f"{html[:200]!r}:\n  soup: {expected[:200]!r}\n  fast: {actual[:200]!r}"
+
+    titles = [(PageDownloader.parse_infobox(json.dumps(page["infobox"]))["template"], page["pageid"], page["title"])
+              for page in load_fixture_pages(copies=max(args.copies, 10))]
+    titles.extend([("Infobox/Planet", 1, "Tatooine (Legends)"), ("Character", 2, "Darth Vader's \"mask\": a/b? é")])
+    for template, page_id, title in titles:
+        assert PageDownloader.get_safe_file_name(template, page_id, title) == get_safe_file_name_re(template, page_id, title)
+
+    print(f"{len(sections)} sections, {len(EDGE_CASES)} edge cases and {len(titles)} file names give the same output")
+    size = sum(len(html) for html in sections) / 2 ** 10
+
+    for name, function in (("BeautifulSoup", cleanup_section_html_soup), ("text_normalisation", PageDownloader.cleanup_section_html)):
+        seconds = min(timeit.repeat(lambda: [function(html) for html in sections], number=1, repeat=args.repeat))
+        print(f"cleanup_section_html, {name:18s}: {seconds * 1e3:8.2f}ms, {len(sections) / seconds:9.0f} sections/s, {size / seconds:8.0f} KiB/s")
+
+    number = 1000
+    for name, function in (("re.sub", get_safe_file_name_re), ("compiled", PageDownloader.get_safe_file_name)):
+        seconds = min(timeit.repeat(lambda: [function(*title) for title in titles], number=number, repeat=args.repeat))
+        print(f"get_safe_file_name, {name:20s}: {seconds / number / len(titles) * 1e6:8.3f}us per name")
+
+
+if __name__ == "__main__":
+    main()
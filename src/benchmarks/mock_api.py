@@ -0,0 +1,221 @@
+import collections
+import copy
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from wookiepedia.types import JSON
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture_pages(copies: int = 1) -> list[JSON]:
+    """
+    Load the recorded pages from fixtures/pages.json, repeated 'copies' times under new ids and titles
+    """
+    with open(os.path.join(FIXTURES_DIR, "pages.json"), "r") as file:
+        fixtures = json.load(file)
+
+    pages = []
+    for number in range(copies):
+        for fixture in fixtures:
+            page = copy.deepcopy(fixture)
+            if number > 0:
+                page["title"] = f"{fixture['title']} ({number})"
+                page["pageid"] = fixture["pageid"] + number * 1000
+                page["infobox"][0]["data"][0]["data"]["value"] = page["title"]
+            pages.append(page)
+
+    return pages
+
+
+class MockApiServer:
+    """
+    A local stand-in for the Wookiepedia api.php that serves fixture pages and counts the requests it receives
+    """
+
+    def __init__(self,
+                 pages: list[JSON] | None = None,
+                 batch_size: int = 500,
+                 latency: float = 0.0):
+        self.pages = pages if pages is not None else load_fixture_pages()
+        self.pages_by_title = {page["title"]: page for page in self.pages}
+        self.batch_size = batch_size
+        self.latency = latency
+        self.request_count = 0
+        self.requests_by_action: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api.php"
+
+    def start(self) -> "MockApiServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _MockApiHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_counters(self):
+        with self._lock:
+            self.request_count = 0
+            self.requests_by_action.clear()
+
+    def __enter__(self) -> "MockApiServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def handle(self, params: dict[str, str]) -> JSON:
+        action = params.get("action", "")
+
+        with self._lock:
+            self.request_count += 1
+            self.requests_by_action[action] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if action == "parse":
+            return self.parse(params)
+
+        if action == "query" and params.get("list") == "pageswithprop":
+            return self.pages_with_prop(params)
+
+        if action == "query" and params.get("prop") == "info":
+            page_ids = {int(page_id) for page_id in params["pageids"].split("|")}
+            return {"query": {"pages": {str(page["pageid"]): {
+                "pageid": page["pageid"],
+                "ns": 0,
+                "title": page["title"],
+                "touched": page["touched"],
+                "lastrevid": page["revid"]
+            } for page in self.pages if page["pageid"] in page_ids}}}
+
+        if action == "query" and params.get("list") == "allpages":
+            templates = sorted({self.template_name(page) for page in self.pages})
+            return {"query": {"allpages": [{"ns": 10, "title": f"Template:Infobox {name}"} for name in templates]}}
+
+        if action == "query" and params.get("list") == "categorymembers":
+            category = params["cmtitle"].split(":", 1)[-1].replace(" ", "_")
+            members = [{"pageid": page["pageid"], "ns": 0, "title": page["title"]}
+                       for page in self.pages if category in page["categories"]]
+            return {"query": {"categorymembers": members[:int(params.get("cmlimit", 10))]}}
+
+        return {"error": {"code": "badvalue", "info": f"Unsupported request: {params}"}}
+
+    def pages_with_prop(self, params: dict[str, str]) -> JSON:
+        start = int(params.get("pwpcontinue", 0))
+        pages = sorted((page for page in self.pages if page["pageid"] >= start), key=lambda page: page["pageid"])
+        batch = pages[:self.batch_size]
+        data = {
+            "batchcomplete": "",
+            "query": {
+                "pageswithprop": [{"pageid": page["pageid"], "ns": 0, "title": page["title"]} for page in batch]
+            }
+        }
+        if len(pages) > self.batch_size:
+            data["continue"] = {"pwpcontinue": str(pages[self.batch_size]["pageid"]), "continue": "||"}
+        return data
+
+    def parse(self, params: dict[str, str]) -> JSON:
+        page = self.pages_by_title.get(params.get("page"))
+
+        if page is None:
+            return {"error": {"code": "missingtitle", "info": "The page you specified doesn't exist."}}
+
+        props = params.get("prop", "text").split("|")
+        parsed = {"title": page["title"], "pageid": page["pageid"], "revid": page["revid"]}
+
+        if "text" in props:
+            section = params.get("section")
+            body = self.render_section(page, int(section)) if section is not None else self.render_page(page)
+            parsed["text"] = {"*": f'<div class="mw-parser-output">{body}</div>'
+                                   f'\n<!-- \nNewPP limit report\nCached time: 20240701100000\n-->\n'}
+
+        if "sections" in props:
+            parsed["sections"] = [{
+                "toclevel": section["level"] - 1,
+                "level": str(section["level"]),
+                "line": section["line"],
+                "number": str(index),
+                "index": str(index),
+                "fromtitle": page["title"].replace(" ", "_"),
+                "byteoffset": index * 100,
+                "anchor": section["anchor"],
+                "linkAnchor": section["anchor"]
+            } for index, section in enumerate(page["sections"], start=1)]
+
+        if "properties" in props:
+            parsed["properties"] = [{"name": "infoboxes", "*": json.dumps(page["infobox"])}]
+
+        if "categories" in props:
+            parsed["categories"] = [{"sortkey": "", "*": category} for category in page["categories"]]
+
+        return {"parse": parsed}
+
+    @staticmethod
+    def template_name(page: JSON) -> str:
+        navigation = page["infobox"][0]["data"][-1]["data"]["value"]
+        return re.search(r'Template:([^"]+)"', navigation).group(1)
+
+    @staticmethod
+    def render_heading(page: JSON, index: int, section: JSON) -> str:
+        level = section["level"]
+        edit_url = f"/wiki/{page['title'].replace(' ', '_')}?action=edit&amp;section={index}"
+        return (f'<h{level}><span class="mw-headline" id="{section["anchor"]}">{section["line"]}</span>'
+                f'<span class="mw-editsection"><span class="mw-editsection-bracket">[</span>'
+                f'<a href="{edit_url}" title="Edit section: {section["line"]}">edit</a>'
+                f'<span class="mw-editsection-bracket">]</span></span></h{level}>')
+
+    def render_page(self, page: JSON) -> str:
+        parts = [page["lead"]]
+        for index, section in enumerate(page["sections"], start=1):
+            parts.append(self.render_heading(page, index, section))
+            parts.append(section["html"])
+        return "\n".join(parts)
+
+    def render_section(self, page: JSON, index: int) -> str:
+        sections = page["sections"]
+        level = sections[index - 1]["level"]
+        parts = [self.render_heading(page, index, sections[index - 1]), sections[index - 1]["html"]]
+
+        for number, section in enumerate(sections[index:], start=index + 1):
+            if section["level"] <= level:
+                break
+            parts.append(self.render_heading(page, number, section))
+            parts.append(section["html"])
+
+        return "\n".join(parts)
+
+
+class _MockApiHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        params = {key: values[-1] for key, values in query.items()}
+        body = json.dumps(self.server.mock.handle(params)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
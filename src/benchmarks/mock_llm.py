@@ -0,0 +1,140 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from wookiepedia.types import JSON
+
+_tokens = re.compile(r"\w+|[^\w\s]")
+
+
+class MockLlmServer:
+    """
+    A local stand-in for an OpenAI-compatible chat completions server, such as LM Studio.
+
+    Every request takes 'latency' seconds, plus 'prompt_token_latency' seconds for every token of its prompt,
+    and at most 'slots' requests are served at once, the others wait. Tokens are counted as words and
+    punctuation marks and reported in the usage of the answer. The answer fills the requested schema's
+    required properties from the user content, or from its title when the content is a page context. A seeded fraction
+    of the requests fail with a 500 or answer with malformed JSON, to exercise the client's retries.
+    """
+
+    def __init__(self,
+                 latency: float = 0.2,
+                 slots: int = 4,
+                 error_rate: float = 0.0,
+                 malformed_rate: float = 0.0,
+                 seed: int = 0,
+                 prompt_token_latency: float = 0.0):
+        self.latency = latency
+        self.prompt_token_latency = prompt_token_latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.request_count = 0
+        self.error_count = 0
+        self.malformed_count = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._slots = threading.Semaphore(slots)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLlmServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _MockLlmHandler)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 128
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockLlmServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def handle(self, request: JSON) -> tuple[int, JSON]:
+        with self._lock:
+            self.request_count += 1
+            roll = self._random.random()
+
+        prompt_tokens = sum(len(_tokens.findall(message["content"])) for message in request["messages"])
+
+        with self._slots:
+            with self._lock:
+                self._in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            try:
+                time.sleep(self.latency + prompt_tokens * self.prompt_token_latency)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+        if roll < self.error_rate:
+            with self._lock:
+                self.error_count += 1
+            return 500, {"error": {"message": "Model crashed", "type": "server_error"}}
+
+        content = json.loads(request["messages"][-1]["content"])
+        schema = request.get("response_format", {}).get("json_schema", {}).get("schema", {})
+        properties = schema.get("properties", {})
+        value = content.get("title", str(content)) if isinstance(content, dict) else str(content)
+        answer = json.dumps({
+            name: properties.get(name, {}).get("enum", [value])[0]
+            for name in schema.get("required", ["name"])
+        })
+
+        if roll < self.error_rate + self.malformed_rate:
+            with self._lock:
+                self.malformed_count += 1
+            answer = answer[:-1]
+
+        return 200, {
+            "id": f"chatcmpl-{self.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(_tokens.findall(answer)),
+                "total_tokens": prompt_tokens + len(_tokens.findall(answer))
+            }
+        }
+
+
+class _MockLlmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        status, response = self.server.mock.handle(request)
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
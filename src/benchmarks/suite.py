@@ -0,0 +1,217 @@
+"""
+Run the offline benchmark suite and save its results under the current git commit, so a later commit can be
+compared with it. Everything runs locally: the recorded fixture pages are served by a stub api.php, schemas are
+filled in by a stub OpenAI-compatible server and sections are summarised by a tiny, randomly initialised BART.
+
+Each function benchmark reports the best throughput of '--repeat' runs:
+    parse_infobox          PageDownloader.parse_infobox on the fixture infoboxes
+    cleanup_section_html   PageDownloader.cleanup_section_html on the fixture sections
+    process_page           PageDownloader.process_page against the stub api.php
+    summarize              TextSummariser.summarize on sections of the fixture pages
+    process_file           SchemaProcessor.process_file against the stub server
+The end-to-end benchmark runs the download, summarise and schemas stages of the pipeline once.
+
+Run from the 'src' directory, then again on another commit with --compare:
+
+    python -m benchmarks.suite --copies 5
+    python -m benchmarks.suite --copies 5 --compare <sha of the first run>
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import ai
+from benchmarks.bench_summarise import load_sections
+from benchmarks.mock_api import MockApiServer, load_fixture_pages
+from benchmarks.mock_llm import MockLlmServer
+from wookiepedia import HttpTransport, PageDownloader
+
+BENCHMARKS = ["parse_infobox", "cleanup_section_html", "process_page", "summarize", "process_file", "end_to_end"]
+
+
+def git_commit() -> str:
+    """
+    The current commit, with '-dirty' when the working tree has changes, or 'unknown' outside a git repository
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if changes.strip() else commit
+
+
+def best_of(repeat: int, items: int, run: Callable[[], None]) -> dict[str, float]:
+    """
+    Run a benchmark 'repeat' times and report the items per second of the fastest run
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    best = min(seconds)
+    return {"items": items, "seconds": best, "items_per_second": items / best if best > 0 else 0.0, "runs": len(seconds)}
+
+
+def downloader(api: MockApiServer, output_dir: str) -> PageDownloader:
+    page_downloader = PageDownloader(output_dir=output_dir, batch_requests=True, transport=HttpTransport(rate_limit=None))
+    page_downloader.url = api.url
+    return page_downloader
+
+
+def run_suite(args: argparse.Namespace, directory: str) -> dict[str, dict[str, float]]:
+    from benchmarks.tiny_models import save_tiny_bart
+    from pipeline import Pipeline, build_pipeline, parse_args
+    from schemas import SchemaProcessor
+    from summarisation import TextSummariser
+
+    results = {}
+    pages = load_fixture_pages(copies=args.copies)
+    model = save_tiny_bart(os.path.join(directory, "tiny-bart"))
+
+    with MockApiServer(pages=pages) as api, MockLlmServer(latency=0.0, slots=8) as llm:
+        ai.configure_client(llm.url)
+
+        if "parse_infobox" in args.only:
+            infoboxes = [json.dumps(page["infobox"]) for page in pages]
+            results["parse_infobox"] = best_of(args.repeat, len(infoboxes), lambda: [PageDownloader.parse_infobox(infobox) for infobox in infoboxes])
+
+        if "cleanup_section_html" in args.only:
+            sections = [api.render_section(page, index) for page in pages for index in range(1, len(page["sections"]) + 1)]
+            results["cleanup_section_html"] = best_of(args.repeat, len(sections), lambda: [PageDownloader.cleanup_section_html(html) for html in sections])
+
+        raw_dir = os.path.join(directory, "raw")
+        page_downloader = downloader(api, raw_dir)
+        listed, cursor = page_downloader.get_pages_with_infoboxes()
+        if "process_page" in args.only:
+            results["process_page"] = best_of(args.repeat, len(listed), lambda: [page_downloader.process_page(page) for page in listed])
+        else:
+            for page in listed:
+                page_downloader.process_page(page)
+        page_downloader.close()
+
+        if "summarize" in args.only:
+            summariser = TextSummariser(paraphraser_model=model)
+            summariser.load_model(model)
+            texts = load_sections(args.sections)
+            summariser.summarize(texts[0])
+            results["summarize"] = best_of(args.repeat, len(texts), lambda: [summariser.summarize(text) for text in texts])
+
+        if "process_file" in args.only:
+            input_dir = os.path.join(raw_dir, "Character")
+            files = sorted(os.path.join(input_dir, file) for file in os.listdir(input_dir))
+            output_dir = os.path.join(directory, "schemas")
+            processor = SchemaProcessor(input_dir=input_dir, output_dir=output_dir, json_schema=ai.load_json_schema("character"), cache_size=0)
+            results["process_file"] = best_of(args.repeat, len(files), lambda: [
+                processor.process_file(file, os.path.join(output_dir, os.path.basename(file))) for file in files])
+
+        if "end_to_end" in args.only:
+            pipeline_dir = os.path.join(directory, "pipeline")
+            pipeline: Pipeline = build_pipeline(parse_args([
+                "--api-url", api.url,
+                "--llm-url", llm.url,
+                "--raw-dir", os.path.join(pipeline_dir, "raw"),
+                "--summarised-dir", os.path.join(pipeline_dir, "summarised"),
+                "--schemas-dir", os.path.join(pipeline_dir, "schemas"),
+                "--links-file", os.path.join(pipeline_dir, "links.graph"),
+                "--summariser-model", model,
+                "--paraphraser-model", model]))
+            start = time.perf_counter()
+            stages = pipeline.run()
+            seconds = time.perf_counter() - start
+            results["end_to_end"] = {"items": len(pages), "seconds": seconds, "items_per_second": len(pages) / seconds, "runs": 1}
+            for result in stages:
+                results[f"end_to_end.{result.name}"] = {
+                    "items": result.items,
+                    "seconds": result.seconds,
+                    "items_per_second": result.items_per_second,
+                    "runs": 1
+                }
+
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> list[str]:
+    """
+    Print the change in throughput of every benchmark against a baseline, returning the ones slower than 'threshold'
+    """
+    regressions = []
+    print(f"{'benchmark':28s} {'baseline/s':>12s} {'current/s':>12s} {'change':>8s}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:28s} {'-':>12s} {result['items_per_second']:12.2f}")
+            continue
+        before = baseline[name]["items_per_second"]
+        change = result["items_per_second"] / before - 1 if before > 0 else 0.0
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:28s} {before:12.2f} {result['items_per_second']:12.2f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=5, help="How many times to repeat the fixture pages")
+    parser.add_argument("--sections", type=int, default=8, help="Sections summarised by the summarize benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every function benchmark, the fastest is kept")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks to run")
+    parser.add_argument("--results-dir", default=os.path.join("output", "benchmarks"), help="Directory the results are saved to")
+    parser.add_argument("--compare", help="Commit, or results file, to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression, 0.1 for 10%%")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    import torch
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+
+    # Read before running, the results of this run may replace the baseline when they are of the same commit
+    baseline = None
+    if args.compare:
+        baseline_path = args.compare if os.path.exists(args.compare) else os.path.join(args.results_dir, f"{args.compare}.json")
+        with open(baseline_path, "r") as input:
+            baseline = json.load(input)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_suite(args, directory)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "arguments": {"copies": args.copies, "sections": args.sections, "repeat": args.repeat},
+        "results": results
+    }
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{commit}.json")
+    with open(path, "w") as output:
+        json.dump(report, output, indent=4)
+
+    for name, result in results.items():
+        print(f"{name:28s} {result['items']:6d} items {result['seconds']:9.4f}s {result['items_per_second']:12.2f}/s")
+    print(f"Saved to {path}")
+
+    if baseline is not None:
+        if baseline.get("arguments") != report["arguments"]:
+            print(f"Warning: {baseline_path} was run with {baseline.get('arguments')}, not {report['arguments']}")
+        print(f"Compared with {baseline['commit']}:")
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Tiny, randomly initialised BART models for benchmarking the summarisation code without downloading
+the real checkpoints. Their output is noise, but they run the same tokenizer, padding, batching and
+generation code paths, so relative timings between implementations are meaningful.
+"""
+import json
+import os
+
+import torch
+from transformers import BartConfig, BartForConditionalGeneration, BartTokenizer
+from transformers.models.bart.tokenization_bart import bytes_to_unicode
+
+SPECIAL_TOKENS = ["<s>", "<pad>", "</s>", "<unk>"]
+
+
+def save_tiny_bart(directory: str, d_model: int = 64, layers: int = 2, seed: int = 0) -> str:
+    """
+    Save a tiny BART model and a byte-level tokenizer to 'directory' and return it, for use as a model name
+    """
+    if os.path.exists(os.path.join(directory, "config.json")):
+        return directory
+
+    os.makedirs(directory, exist_ok=True)
+
+    vocab = {token: index for index, token in enumerate(SPECIAL_TOKENS)}
+    for character in bytes_to_unicode().values():
+        vocab[character] = len(vocab)
+    vocab["<mask>"] = len(vocab)
+
+    with open(os.path.join(directory, "vocab.json"), "w") as file:
+        json.dump(vocab, file)
+    with open(os.path.join(directory, "merges.txt"), "w") as file:
+        file.write("#version: 0.2\n")
+
+    tokenizer = BartTokenizer(
+        vocab_file=os.path.join(directory, "vocab.json"),
+        merges_file=os.path.join(directory, "merges.txt"),
+        model_max_length=1024)
+    tokenizer.save_pretrained(directory)
+
+    torch.manual_seed(seed)
+    config = BartConfig(
+        vocab_size=len(vocab),
+        d_model=d_model,
+        encoder_layers=layers,
+        decoder_layers=layers,
+        encoder_attention_heads=4,
+        decoder_attention_heads=4,
+        encoder_ffn_dim=d_model * 4,
+        decoder_ffn_dim=d_model * 4,
+        max_position_embeddings=1024,
+        pad_token_id=1,
+        bos_token_id=0,
+        eos_token_id=2,
+        decoder_start_token_id=2,
+        forced_eos_token_id=None)
+    BartForConditionalGeneration(config).save_pretrained(directory)
+
+    return directory
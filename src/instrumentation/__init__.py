@@ -0,0 +1,4 @@
+from instrumentation.stages import StageReport, StageTimer, peak_rss_bytes, stage, timer
+from instrumentation.progress import ProgressReporter
+from instrumentation.metrics import Counter, Gauge, Histogram, MetricsRegistry, metrics
+from instrumentation.counters import Counters
@@ -0,0 +1,55 @@
+import threading
+
+
+class Counters:
+    """
+    Counters of a run, incremented from any thread, declared as annotated class attributes: 'hits: int = 0'.
+
+    The counters are found from the annotations, so a subclass lists them once. 'to_dict' adds the value
+    of every property named in 'derived', such as a hit rate, after the counters.
+    """
+
+    """
+    Properties reported by 'to_dict' after the counters
+    """
+    derived: tuple[str, ...] = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @classmethod
+    def names(cls) -> list[str]:
+        names = []
+        for klass in reversed(cls.__mro__[:cls.__mro__.index(Counters)]):
+            names.extend(name for name in vars(klass).get("__annotations__", {}) if name not in names)
+        return names
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, **counters: int | float):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def take(self) -> dict[str, int | float]:
+        """
+        The counters since the last call, reset to zero, so a worker process can hand its counts to the parent
+        """
+        with self._lock:
+            counters = {name: getattr(self, name) for name in self.names()}
+            for name, value in counters.items():
+                setattr(self, name, type(value)())
+        return counters
+
+    def to_dict(self):
+        return {
+            **{name: getattr(self, name) for name in self.names()},
+            **{name: getattr(self, name) for name in self.derived}
+        }
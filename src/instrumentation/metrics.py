@@ -0,0 +1,236 @@
+import contextlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Iterator
+
+"""
+Labels of a metric, such as {"call": "http"}, as sorted pairs so they can be a dictionary key
+"""
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Latencies, or other values, observed by a part of a run, summarised as count, sum and quantiles.
+
+    Up to 'reservoir' values are kept, sampled uniformly once there are more, so the quantiles of a long run
+    are estimated in constant memory.
+    """
+
+    def __init__(self, reservoir: int = 10000, seed: int = 0):
+        """
+        :param reservoir: Values kept to estimate the quantiles
+        :param seed: Seed of the sampling of the values once the reservoir is full
+        """
+        self.reservoir = reservoir
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.values: list[float] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+            if len(self.values) < self.reservoir:
+                self.values.append(value)
+            else:
+                index = self._random.randrange(self.count)
+                if index < self.reservoir:
+                    self.values[index] = value
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        """
+        Observe the seconds the block takes, whether or not it raises
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            values = sorted(self.values)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max
+        }
+
+
+class Gauge:
+    """
+    A value that goes up and down, such as the depth of a queue, and the highest it has been
+    """
+
+    def __init__(self):
+        self.value = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+            self.max = max(self.max, value)
+
+    def add(self, delta: float = 1):
+        with self._lock:
+            self.value += delta
+            self.max = max(self.max, self.value)
+
+    def to_dict(self):
+        return {"value": self.value, "max": self.max}
+
+
+class Counter:
+    """
+    A count that only goes up, such as the items a stage processed
+    """
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count: float = 1):
+        with self._lock:
+            self.value += count
+
+    def to_dict(self):
+        return {"value": self.value}
+
+
+class MetricsRegistry:
+    """
+    The metrics of a run by name and labels, written as JSON or in the Prometheus text format.
+
+    A metric is created the first time it is asked for, so the code being measured only names what it measures:
+    'metrics.histogram("stage_items", stage="download").observe(items)'. The metrics recorded across the
+    packages are named, with their help, by the methods below, such as 'metrics.call_seconds("http")'.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, dict[Labels, Histogram | Gauge | Counter]] = {}
+        self._help: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str = "", **labels: str) -> Histogram:
+        return self._get(name, Histogram, help, labels)
+
+    def gauge(self, name: str, help: str = "", **labels: str) -> Gauge:
+        return self._get(name, Gauge, help, labels)
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        return self._get(name, Counter, help, labels)
+
+    def call_seconds(self, call: str) -> Histogram:
+        return self.histogram("call_seconds", "Seconds per call to a service", call=call)
+
+    def queue_depth(self, queue: str) -> Gauge:
+        return self.gauge("queue_depth", "Items waiting in a queue", queue=queue)
+
+    def queue_wait_seconds(self, queue: str, side: str) -> Histogram:
+        return self.histogram("queue_wait_seconds", "Seconds blocked on a queue", queue=queue, side=side)
+
+    def _get(self, name: str, kind: type, help: str, labels: dict[str, str]):
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            family = self._metrics.setdefault(name, {})
+            if help:
+                self._help[name] = help
+            metric = family.get(key)
+            if metric is None:
+                metric = family[key] = kind()
+            elif not isinstance(metric, kind):
+                raise TypeError(f"Metric {name} is a {type(metric).__name__}, not a {kind.__name__}")
+            return metric
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+            self._help.clear()
+
+    def to_dict(self):
+        with self._lock:
+            families = {name: dict(family) for name, family in self._metrics.items()}
+        return {
+            name: [{"labels": dict(labels), **metric.to_dict()} for labels, metric in family.items()]
+            for name, family in families.items()
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format: histograms as summaries with their 0.5 and 0.99
+        quantiles, gauges with a '_max' gauge beside them, and counters with a '_total' suffix
+        """
+        with self._lock:
+            families = {name: dict(family) for name, family in self._metrics.items()}
+
+        lines = []
+        for name, family in sorted(families.items()):
+            kind = type(next(iter(family.values())))
+            metric_name = f"{name}_total" if kind is Counter else name
+            if name in self._help:
+                lines.append(f"# HELP {metric_name} {self._help[name]}")
+            lines.append(f"# TYPE {metric_name} {'summary' if kind is Histogram else kind.__name__.lower()}")
+
+            for labels, metric in sorted(family.items()):
+                if isinstance(metric, Histogram):
+                    for q in (0.5, 0.99):
+                        lines.append(f"{name}{self._labels(labels, quantile=q)} {metric.quantile(q)}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {metric.sum}")
+                    lines.append(f"{name}_count{self._labels(labels)} {metric.count}")
+                elif isinstance(metric, Gauge):
+                    lines.append(f"{name}{self._labels(labels)} {metric.value}")
+                else:
+                    lines.append(f"{metric_name}{self._labels(labels)} {metric.value}")
+
+            if kind is Gauge:
+                lines.append(f"# TYPE {name}_max gauge")
+                for labels, metric in sorted(family.items()):
+                    lines.append(f"{name}_max{self._labels(labels)} {metric.max}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels: Labels, **extra) -> str:
+        pairs = [*labels, *((name, str(value)) for name, value in extra.items())]
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for name, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def write(self, path: str, format: str = "json", extra: dict | None = None):
+        """
+        Write the metrics to a file, as JSON with 'extra' beside them, or in the Prometheus text format
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as output:
+            if format == "prometheus":
+                output.write(self.to_prometheus())
+            elif format == "json":
+                json.dump({**(extra or {}), "metrics": self.to_dict()}, output, indent=4)
+            else:
+                raise ValueError(f"Unknown metrics format {format!r}, expected 'json' or 'prometheus'")
+
+
+"""
+The metrics shared by the whole process
+"""
+metrics = MetricsRegistry()
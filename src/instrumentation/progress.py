@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+
+
+class ProgressReporter:
+    """
+    Counts the items a long run has processed and logs its rate and the estimated time remaining
+    """
+
+    def __init__(self, total: int | None, unit: str = "files", interval: float = 10.0):
+        """
+        :param total: Items the run will process, None when it is not known, such as while streaming
+        :param unit: Name of the items in the log lines
+        :param interval: Seconds between two log lines
+        """
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self._logged = self.started
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def remaining_seconds(self) -> float | None:
+        rate = self.rate
+        if self.total is None:
+            return None
+        return (self.total - self.done) / rate if rate > 0 else None
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self.done += count
+            now = time.monotonic()
+            if now - self._logged < self.interval and (self.total is None or self.done < self.total):
+                return
+            self._logged = now
+
+        logging.info(str(self))
+
+    def skip(self, count: int = 1):
+        """
+        Take items that turned out to need no work off the total
+        """
+        with self._lock:
+            if self.total is not None:
+                self.total -= count
+
+    def __str__(self):
+        if self.total is None:
+            return f"{self.done} {self.unit}, {self.rate:.2f} {self.unit}/s"
+        remaining = self.remaining_seconds
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining)) if remaining is not None else "unknown"
+        if remaining is not None and remaining >= 24 * 60 * 60:
+            eta = f"{int(remaining // (24 * 60 * 60))}d {eta}"
+        return f"{self.done}/{self.total} {self.unit}, {self.rate:.2f} {self.unit}/s, {eta} remaining"
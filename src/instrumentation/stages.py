@@ -0,0 +1,96 @@
+import contextlib
+import logging
+import sys
+import time
+from typing import Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    The peak resident set size of this process so far, or None where it cannot be measured
+    """
+    try:
+        # Unlike ru_maxrss, the high water mark is reset by exec rather than inherited from the parent process
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageReport:
+    """
+    How long a stage of a run took and the peak RSS of the process when it finished
+    """
+
+    name: str
+    seconds: float
+    peak_rss_bytes: int | None
+    peak_rss_growth_bytes: int | None
+
+    def __init__(self, name: str, seconds: float, peak_rss: int | None, peak_rss_growth: int | None):
+        self.name = name
+        self.seconds = seconds
+        self.peak_rss_bytes = peak_rss
+        self.peak_rss_growth_bytes = peak_rss_growth
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_rss_growth_bytes": self.peak_rss_growth_bytes
+        }
+
+    def __str__(self):
+        text = f"Stage '{self.name}' took {self.seconds:.2f}s"
+        if self.peak_rss_bytes is not None:
+            text += f", peak RSS {self.peak_rss_bytes / 1024 ** 2:.0f} MiB (+{self.peak_rss_growth_bytes / 1024 ** 2:.0f} MiB)"
+        return text
+
+
+class StageTimer:
+    """
+    Times the named stages of a run, such as imports, model loading and processing, and logs a report for each
+    """
+
+    def __init__(self):
+        self.reports: list[StageReport] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        peak_before = peak_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            peak_after = peak_rss_bytes()
+            report = StageReport(
+                name=name,
+                seconds=time.perf_counter() - start,
+                peak_rss=peak_after,
+                peak_rss_growth=peak_after - peak_before if peak_after is not None else None)
+            self.reports.append(report)
+            logging.info(str(report))
+
+
+"""
+The timer shared by the whole process
+"""
+timer = StageTimer()
+
+
+def stage(name: str):
+    return timer.stage(name)
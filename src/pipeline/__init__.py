@@ -0,0 +1,2 @@
+from pipeline.runner import Pipeline, StageResult
+from pipeline.cli import main, parse_args, build_pipeline
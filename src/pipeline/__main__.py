@@ -0,0 +1,8 @@
+import logging
+
+from pipeline import main
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    main()
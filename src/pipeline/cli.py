@@ -0,0 +1,231 @@
+"""
+Run the pipeline: download the pages with infoboxes, index their links and categories, summarise their sections
+and fill in a schema from them.
+
+Run from the 'src' directory, for example only the schema stage with its metrics and a profile:
+
+    python -m pipeline --stages schemas --metrics output/metrics.json --profile schemas
+
+or a resumable crawl into compressed shards, then the schemas of one category:
+
+    python -m pipeline --stages download links --crawl-state output/crawl_state.sqlite --shards
+    python -m pipeline --stages schemas --category "Jedi Masters"
+
+With --stream, the pages are summarised and their schemas filled in while they are downloaded. The raw files
+are still written, but the later stages receive every page from the crawl through a bounded queue instead of
+walking the raw directory once the crawl has finished. The links stage waits for the crawl to finish.
+"""
+import argparse
+import logging
+import os
+from typing import Callable, Iterable, Iterator
+
+from instrumentation import stage
+from pipeline.runner import Pipeline
+
+STAGES = ["download", "links", "summarise", "schemas"]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run, in pipeline order")
+    parser.add_argument("--raw-dir", default=os.path.join("output", "raw"), help="Directory of the downloaded pages, or of their shards")
+    parser.add_argument("--links-file", default=os.path.join("output", "links.graph"), help="File the link graph is written to")
+    parser.add_argument("--summarised-dir", default=os.path.join("output", "summarised"), help="Directory of the summarised pages")
+    parser.add_argument("--schemas-dir", default=os.path.join("output", "schemas"), help="Directory of the filled in schemas")
+    parser.add_argument("--template", default="Character", help="Infobox template whose pages fill in the schema")
+    parser.add_argument("--schema", default="character", help="Schema from 'ai/json_schemas' to fill in")
+    parser.add_argument("--category", help="Only summarise and fill in the pages of this category, found in the corpus index the links stage writes")
+    parser.add_argument("--api-url", help="MediaWiki api.php to download from, Wookieepedia by default")
+    parser.add_argument("--crawl-state", help="SQLite file of the crawl progress, to resume an interrupted crawl and skip unchanged pages")
+    parser.add_argument("--response-cache", help="Directory of a cache of api.php responses")
+    parser.add_argument("--response-cache-mb", type=int, default=2048, help="Size of the response cache before the least recently used are evicted")
+    parser.add_argument("--build-processes", type=int, default=0, help="Worker processes cleaning up and parsing the downloaded pages, 0 for none")
+    parser.add_argument("--shards", action="store_true", help="Write the downloaded pages to compressed shards in the raw directory instead of one file each, compacted after the crawl")
+    parser.add_argument("--async", dest="async_crawl", action="store_true", help="Crawl on an event loop, fetching the next batch while the current one is processed")
+    parser.add_argument("--llm-url", help="OpenAI-compatible server filling in the schema, LM Studio on localhost by default")
+    parser.add_argument("--summariser-model", default="sshleifer/distilbart-cnn-12-6", help="Model summarising the sections")
+    parser.add_argument("--paraphraser-model", default="eugenesiow/bart-paraphrase", help="Model paraphrasing short sections")
+    parser.add_argument("--summary-cache", help="Directory of a cache of section summaries reused across pages and runs")
+    parser.add_argument("--summary-cache-mb", type=int, default=256, help="Size of the summary cache before the least recently used are evicted")
+    parser.add_argument("--near-duplicates", type=int, choices=range(4), help="Reuse the cached summary of a section whose SimHash differs in at most this many bits")
+    parser.add_argument("--workers", type=int, default=8, help="Pages downloaded at once")
+    parser.add_argument("--processes", type=int, default=0, help="Worker processes summarising files, 0 for none")
+    parser.add_argument("--concurrency", type=int, default=1, help="Model requests in flight at once")
+    parser.add_argument("--stream", action="store_true", help="Run the stages at once, handing every downloaded page to the others")
+    parser.add_argument("--queue-size", type=int, default=64, help="Pages waiting for a streaming stage before the download blocks")
+    parser.add_argument("--metrics", help="File the metrics are written to once the stages have run")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json", help="Format of the metrics file")
+    parser.add_argument("--profile", nargs="*", choices=STAGES, default=[], help="Stages to run under cProfile")
+    parser.add_argument("--profile-dir", default=os.path.join("output", "profiles"), help="Directory of the profiles")
+    args = parser.parse_args(argv)
+    if args.near_duplicates is not None and not args.summary_cache:
+        parser.error("--near-duplicates needs a --summary-cache")
+    if args.stream and "download" not in args.stages:
+        parser.error("--stream needs the download stage, which the other stages are streamed from")
+    return args
+
+
+def build_pipeline(args: argparse.Namespace) -> Pipeline:
+    """
+    The pipeline of the stages, each importing what it needs when it runs so unused stages load nothing
+    """
+    pipeline = Pipeline(profile=args.profile, profile_dir=args.profile_dir)
+    stream = None
+    subscriptions = {}
+
+    if args.stream:
+        from wookiepedia import OutputStream
+        stream = OutputStream(maxsize=args.queue_size)
+        # Subscribed before any stage runs, so no page is published before its consumers listen
+        subscriptions = {name: stream.subscribe(name) for name in ("links", "summarise", "schemas") if name in args.stages}
+
+    def download() -> int:
+        with stage("imports"):
+            from wookiepedia import AsyncCrawler, CrawlState, PageDownloader, ResponseCache, ShardWriter
+        crawl_state = CrawlState(args.crawl_state) if args.crawl_state else None
+        sink = ShardWriter(args.raw_dir) if args.shards else None
+        page_downloader = PageDownloader(
+            output_dir=args.raw_dir,
+            batch_requests=True,
+            workers=args.workers,
+            crawl_state=crawl_state,
+            cache=ResponseCache(args.response_cache, max_bytes=args.response_cache_mb * 1024 ** 2) if args.response_cache else None,
+            processes=args.build_processes,
+            sink=sink,
+            stream=stream)
+        if args.api_url:
+            page_downloader.url = args.api_url
+        try:
+            if args.async_crawl:
+                downloaded = AsyncCrawler(page_downloader).run().pages
+            else:
+                downloaded = page_downloader.download_pages_with_infoboxes()
+            if sink is not None:
+                # Pages that changed since an earlier crawl were appended again, leaving their old records behind
+                sink.compact()
+            return downloaded
+        finally:
+            page_downloader.close()
+            if crawl_state is not None:
+                crawl_state.close()
+            if stream is not None:
+                stream.close()
+
+    def links() -> int:
+        with stage("imports"):
+            from wookiepedia import CorpusIndex, LinkGraph
+        if "links" in subscriptions:
+            # Only the finished crawl can be indexed, so the pages streamed meanwhile are let through
+            for output in subscriptions["links"]:
+                pass
+        link_graph = LinkGraph.from_directory(args.raw_dir)
+        link_graph.save(args.links_file)
+        CorpusIndex.build(args.raw_dir)
+        return len(link_graph)
+
+    def page_ids() -> list[int] | None:
+        """
+        The pages of the selected category, looked up once the links stage has indexed the crawl
+        """
+        if not args.category:
+            return None
+        from wookiepedia import CorpusIndex
+        if not os.path.exists(CorpusIndex.default_path(args.raw_dir)):
+            raise ValueError(f"--category needs the corpus index of {args.raw_dir}, run the links stage first")
+        with CorpusIndex.open(args.raw_dir) as index:
+            selected = index.pages(category=args.category)
+        logging.info(f"Selected {len(selected)} pages of category {args.category}")
+        return selected
+
+    def in_category(outputs: Iterable) -> Iterator:
+        """
+        The streamed outputs of the selected category, which the corpus index of a running crawl does not hold yet
+        """
+        if not args.category:
+            return iter(outputs)
+        from wookiepedia import category_name
+        category = category_name(args.category)
+        return (output for output in outputs if category in output.categories)
+
+    def summarise() -> int:
+        with stage("imports"):
+            from summarisation import RawFileProcessor, SummaryCache, TextSummariser
+        cache = None
+        if args.summary_cache:
+            cache = SummaryCache(
+                directory=args.summary_cache,
+                max_bytes=args.summary_cache_mb * 1024 ** 2,
+                near_duplicate_distance=args.near_duplicates)
+        summariser = TextSummariser(paraphraser_model=args.paraphraser_model, cache=cache)
+        summariser.load_model(args.summariser_model)
+        raw_file_processor = RawFileProcessor(
+            input_dir=args.raw_dir,
+            output_dir=args.summarised_dir,
+            processes=args.processes,
+            summarizer=summariser)
+        try:
+            if "summarise" in subscriptions:
+                with stage("imports"):
+                    from processing import stream_records
+                return raw_file_processor.process_stream(stream_records(in_category(subscriptions["summarise"]), args.summarised_dir))
+            raw_file_processor.page_ids = page_ids()
+            return raw_file_processor.process_raw_files()
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def schemas() -> int:
+        with stage("imports"):
+            import ai
+            from schemas import SchemaProcessor
+            from wookiepedia import ShardReader
+        if args.llm_url:
+            ai.configure_client(args.llm_url)
+        json_schema = ai.load_json_schema(args.schema)
+        if json_schema is None:
+            raise ValueError(f"Schema {args.schema} is not valid JSON")
+        sharded = ShardReader.is_shard_directory(args.raw_dir)
+        schema_processor = SchemaProcessor(
+            input_dir=args.raw_dir if sharded else os.path.join(args.raw_dir, args.template),
+            output_dir=os.path.join(args.schemas_dir, args.template),
+            json_schema=json_schema,
+            template=args.template if sharded else None,
+            concurrency=args.concurrency)
+        if "schemas" in subscriptions:
+            with stage("imports"):
+                from processing import stream_records
+            return schema_processor.process_stream(stream_records(
+                in_category(subscriptions["schemas"]),
+                os.path.join(args.schemas_dir, args.template),
+                template=args.template))
+        schema_processor.page_ids = page_ids()
+        return schema_processor.process_raw_files()
+
+    def consume(name: str, run: Callable[[], int]) -> Callable[[], int]:
+        """
+        Stop the stage's subscription once it returns or fails, so the download never waits for a stage that stopped
+        """
+        def consuming() -> int:
+            try:
+                return run()
+            finally:
+                if name in subscriptions:
+                    subscriptions[name].cancel()
+        return consuming
+
+    pipeline.add("download", download)
+    pipeline.add("links", consume("links", links))
+    pipeline.add("summarise", consume("summarise", summarise))
+    pipeline.add("schemas", consume("schemas", schemas))
+    return pipeline
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    pipeline = build_pipeline(args)
+    try:
+        pipeline.run(args.stages, concurrently=args.stream)
+    finally:
+        if args.metrics:
+            pipeline.write_metrics(args.metrics, format=args.metrics_format)
@@ -0,0 +1,2 @@
+from processing.manifest import Manifest, hash_json
+from processing.tasks import Task, changed_records, list_tasks, read_records, stream_records
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import time
+
+from wookiepedia.sqlite_store import SqliteStore
+from wookiepedia.types import JSON
+
+
+def hash_json(data: JSON) -> str:
+    """
+    A hash of the content of a JSON value, independent of its key order and formatting
+    """
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class Manifest(SqliteStore):
+    """
+    A SQLite record of the input and configuration every output file was produced from.
+
+    An output is up to date when it exists and was produced from an input with the same content hash
+    and the same configuration hash (models, generation settings, schema), so a rerun only reprocesses
+    the inputs that changed or were produced with a different configuration. Since outputs are recorded
+    as they are written, a killed run also continues where it stopped.
+    """
+
+    """
+    Most outputs looked up by path in one query
+    """
+    lookup_limit = 500
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS outputs (
+            output_path TEXT PRIMARY KEY,
+            input_hash TEXT NOT NULL,
+            config_hash TEXT NOT NULL,
+            produced_at REAL NOT NULL
+        );
+    """
+
+    def unchanged(self, hashes: dict[str, tuple[str, str]]) -> set[str]:
+        """
+        Find the outputs, given as output path -> (input hash, config hash), that are up to date.
+
+        Paths are compared normalised, so 'schemas/Character/./page.json', as listed from a directory, and
+        'schemas/Character/page.json', as named while streaming, are the same output.
+        """
+        if not hashes:
+            return set()
+
+        paths = list({*hashes, *(os.path.normpath(output_path) for output_path in hashes)})
+        rows = []
+        with self._lock:
+            for start in range(0, len(paths), self.lookup_limit):
+                chunk = paths[start:start + self.lookup_limit]
+                rows.extend(self._connection.execute(
+                    f"SELECT output_path, input_hash, config_hash FROM outputs "
+                    f"WHERE output_path IN ({', '.join('?' * len(chunk))})",
+                    chunk).fetchall())
+
+        recorded = {os.path.normpath(output_path): (input_hash, config_hash) for output_path, input_hash, config_hash in rows}
+        return {
+            output_path
+            for output_path, current in hashes.items()
+            if recorded.get(os.path.normpath(output_path)) == current and os.path.exists(output_path)
+        }
+
+    def record(self, entries: list[tuple[str, str, str]]):
+        """
+        Record the (output path, input hash, config hash) of outputs that were just written
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO outputs (output_path, input_hash, config_hash, produced_at) VALUES (?, ?, ?, ?)",
+                [(os.path.normpath(output_path), input_hash, config_hash, now) for output_path, input_hash, config_hash in entries])
+            self._connection.commit()
@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+from typing import Callable, Collection, Iterable, Iterator
+
+from instrumentation import ProgressReporter
+from processing.manifest import Manifest, hash_json
+from wookiepedia import Output, PageDownloader, ShardEntry, ShardReader
+from wookiepedia.types import JSON
+
+"""
+An input record, either the path of a raw JSON file or the location of a record in the shards, and its output file
+"""
+Task = tuple[str | ShardEntry, str]
+
+
+def list_tasks(input_dir: str,
+               output_dir: str,
+               template: str | None = None,
+               page_ids: Collection[int] | None = None) -> list[Task]:
+    """
+    The input record and output file of every raw file or shard record, creating the output directories.
+
+    Raw files keep their path relative to 'input_dir'. Shard records are named like the raw files and
+    grouped by template, unless only the pages of 'template' are processed. With 'page_ids', such as
+    the pages of a category selected with a CorpusIndex, only the records of those pages are listed.
+    """
+    tasks = []
+    if page_ids is not None and not isinstance(page_ids, (set, frozenset)):
+        page_ids = set(page_ids)
+
+    if ShardReader.is_shard_directory(input_dir):
+        reader = ShardReader(input_dir)
+        for entry in reader.entries(template=template):
+            if page_ids is not None and entry.page_id not in page_ids:
+                continue
+            file_name = PageDownloader.get_safe_file_name(template=entry.template, page_id=entry.page_id, title=entry.title)
+            output_file_dir = output_dir if template is not None else os.path.join(output_dir, entry.template)
+            os.makedirs(output_file_dir, exist_ok=True)
+            tasks.append((entry, os.path.join(output_file_dir, file_name)))
+        reader.close()
+        return tasks
+
+    for root, dirs, files in os.walk(input_dir):
+        for input_file in files:
+            if input_file.endswith(".json"):
+                if page_ids is not None and file_page_id(input_file) not in page_ids:
+                    continue
+                relative_path = os.path.relpath(root, input_dir)
+                output_file_dir = os.path.join(output_dir, relative_path)
+                os.makedirs(output_file_dir, exist_ok=True)
+                output_file = os.path.join(output_file_dir, input_file)
+                input_file_path = os.path.join(root, input_file)
+                tasks.append((input_file_path, output_file))
+
+    return tasks
+
+
+def file_page_id(file_name: str) -> int | None:
+    """
+    The page id a raw file is named after by 'PageDownloader.get_safe_file_name'
+    """
+    prefix = file_name.split("_", 1)[0]
+    return int(prefix) if prefix.isdigit() else None
+
+
+def stream_records(outputs: Iterable[Output], output_dir: str, template: str | None = None) -> Iterator[tuple[JSON, str]]:
+    """
+    The record and output file of every output of a running crawl, named as 'list_tasks' names the raw files.
+
+    Outputs are grouped by template under 'output_dir', unless only the pages of 'template' are processed,
+    in which case the outputs of other templates are skipped. Every record has its own copy of the sections,
+    so a consumer replacing them, like the summariser does, leaves the other consumers' records unchanged.
+    """
+    directories = set()
+
+    for output in outputs:
+        page_template = output.infobox['template'] if output.infobox is not None else None
+        if page_template is None or (template is not None and page_template != template):
+            continue
+
+        output_file_dir = output_dir if template is not None else os.path.join(output_dir, page_template)
+        if output_file_dir not in directories:
+            os.makedirs(output_file_dir, exist_ok=True)
+            directories.add(output_file_dir)
+
+        file_name = PageDownloader.get_safe_file_name(template=page_template, page_id=output.page_id, title=output.title)
+        data = output.to_dict()
+        data["sections"] = dict(data["sections"])
+        yield data, os.path.join(output_file_dir, file_name)
+
+
+def read_records(input_dir: str, tasks: list[Task]) -> Iterator[tuple[JSON, str]]:
+    """
+    The input record and output file of every task, reading the shards sequentially
+    """
+    entries = {source.page_id: (source, output_file) for source, output_file in tasks if isinstance(source, ShardEntry)}
+
+    for source, output_file in tasks:
+        if not isinstance(source, ShardEntry):
+            with open(source, "r") as input:
+                yield json.load(input), output_file
+
+    if entries:
+        reader = ShardReader(input_dir)
+        try:
+            for entry, data in reader.iter_entries([source for source, output_file in entries.values()]):
+                yield data, entries[entry.page_id][1]
+        finally:
+            reader.close()
+
+
+def changed_records(records: Iterable[tuple[JSON, str]],
+                    manifest: Manifest,
+                    config_hash: str,
+                    input_hashes: dict[str, str],
+                    content: Callable[[JSON], JSON] | None = None,
+                    progress: ProgressReporter | None = None,
+                    batch_size: int = Manifest.lookup_limit) -> Iterator[tuple[JSON, str]]:
+    """
+    The records whose output is missing or was produced from a different input or configuration.
+
+    Every record is hashed as it is read, so an input is read once for both the check and the work, and its
+    hash is kept in 'input_hashes' by output file until the output is recorded. 'content' picks the part of
+    a record its output depends on, the whole record by default. The records skipped are taken off the
+    total of 'progress'.
+
+    The manifest is looked up once per 'batch_size' records. A stream passes 1, so no record waits for the
+    download of the next ones.
+    """
+    skipped = 0
+    batch: list[tuple[JSON, str, str]] = []
+
+    def check() -> Iterator[tuple[JSON, str]]:
+        nonlocal skipped
+        unchanged = manifest.unchanged({output_file: (input_hash, config_hash) for data, output_file, input_hash in batch})
+        for data, output_file, input_hash in batch:
+            if output_file in unchanged:
+                skipped += 1
+                if progress is not None:
+                    progress.skip()
+                continue
+            input_hashes[output_file] = input_hash
+            yield data, output_file
+        batch.clear()
+
+    for data, output_file in records:
+        batch.append((data, output_file, hash_json(content(data) if content is not None else data)))
+        if len(batch) >= batch_size:
+            yield from check()
+    yield from check()
+
+    if skipped:
+        logging.info(f"Skipped {skipped} files that are up to date")
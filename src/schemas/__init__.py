@@ -1 +1,3 @@
 from schemas.schema_processor import SchemaProcessor
+from schemas.context_builder import ContextBuilder, ContextStats, estimate_tokens
+from schemas.infobox_mapper import InfoboxMapper, MappingStats, normalise_label
@@ -0,0 +1,227 @@
+import math
+import re
+import time
+from typing import Callable
+
+import ai
+from instrumentation import Counters
+from wookiepedia.types import JSON
+
+"""
+Words too common in schema descriptions to tell which part of a page is relevant
+"""
+STOP_WORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or", "other",
+    "that", "the", "their", "they", "this", "to", "was", "were", "which", "with"
+])
+
+_words = re.compile(r"[a-z0-9]+")
+_camel_case = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_tokens = re.compile(r"\w+|[^\w\s]")
+_edit_markers = re.compile(r"\s*\[ edit \]")
+_citations = re.compile(r"\s*\[\d+\]")
+_spaces = re.compile(r"\s+")
+_sentence_ends = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    A tokenizer-free estimate of the tokens in a text: its words and punctuation marks
+    """
+    return len(_tokens.findall(text))
+
+
+def terms(text: str) -> list[str]:
+    """
+    The lower-case words of a text that are not stop words, splitting camelCase and snake_case names
+    and dropping a plural 's', so 'Affiliation(s)' and 'affiliations' share the term 'affiliation'
+    """
+    return [
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in _words.findall(_camel_case.sub(" ", text).lower())
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+class ContextStats(Counters):
+    """
+    Sizes of the contexts built for the pages
+    """
+
+    pages: int = 0
+    tokens: int = 0
+    characters: int = 0
+    truncated: int = 0
+    seconds: float = 0.0
+
+    derived = ("tokens_per_page",)
+
+    @property
+    def tokens_per_page(self) -> float:
+        return self.tokens / self.pages if self.pages else 0.0
+
+
+class ContextBuilder:
+    """
+    Builds the compact part of a raw page sent to the model to fill in a schema.
+
+    The page's infobox fields come first, as 'label: value' pairs, followed by the sections that share the most
+    words with the schema's property names and descriptions, scored like BM25 against the page's other sections.
+    Edit markers, citations and sections repeated inside a longer selected section are left out, and fields and
+    sections are added in order of relevance until 'token_budget' is spent, cutting the last section at a sentence.
+    """
+
+    def __init__(self,
+                 json_schema: ai.JsonSchema,
+                 token_budget: int = 512,
+                 max_sections: int = 4,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        """
+        :param json_schema: Schema the context is selected for
+        :param token_budget: Most tokens of field and section text in a context
+        :param max_sections: Most sections in a context
+        :param count_tokens: Counts the tokens of a text, a word and punctuation estimate by default
+        """
+        self.token_budget = token_budget
+        self.max_sections = max_sections
+        self.count_tokens = count_tokens
+        self.stats = ContextStats()
+
+        # The schema's title names what every page is about, so its words do not make a part more relevant
+        ignored = set(terms(json_schema.get("title", "")))
+        self.terms = frozenset(
+            term
+            for name, subschema in json_schema.get("properties", {}).items()
+            for term in terms(f"{name} {subschema.get('description', '')}")
+            if term not in ignored)
+
+    def fingerprint(self) -> dict:
+        """
+        Everything besides the page that changes the context
+        """
+        return {
+            "terms": sorted(self.terms),
+            "token_budget": self.token_budget,
+            "max_sections": self.max_sections
+        }
+
+    def build(self, data: JSON) -> dict[str, any]:
+        """
+        The context of a raw page, with its title, the selected infobox fields and the selected sections in page order
+        """
+        start = time.perf_counter()
+        infobox = data.get("infobox") or {}
+        title = infobox.get("infobox", {}).get("title") or data.get("title")
+        budget = self.token_budget
+        truncated = False
+
+        fields = {}
+        for label, value, tokens in self.rank_fields(infobox.get("infobox", {})):
+            if tokens > budget:
+                truncated = True
+                continue
+            fields[label] = value
+            budget -= tokens
+
+        selected = {}
+        for name, text, tokens in self.rank_sections(data.get("sections", {})):
+            if len(selected) >= self.max_sections or budget <= 0:
+                truncated = True
+                break
+            if any(text in other or other in text for other in selected.values()):
+                continue
+            if tokens > budget:
+                text = self.truncate(text, budget)
+                truncated = True
+                if not text:
+                    continue
+                tokens = self.count_tokens(text)
+            selected[name] = text
+            budget -= tokens
+
+        context = {"title": title}
+        if fields:
+            context["infobox"] = fields
+        if selected:
+            context["sections"] = {name: selected[name] for name in data["sections"] if name in selected}
+
+        self.stats.add(
+            pages=1,
+            tokens=self.token_budget - budget + self.count_tokens(title or ""),
+            characters=len(ai.ExtractionSpec.user_content(context)),
+            truncated=int(truncated),
+            seconds=time.perf_counter() - start)
+        return context
+
+    def rank_fields(self, infobox: JSON) -> list[tuple[str, str, int]]:
+        """
+        The infobox fields as (label, value, tokens), the ones sharing the most words with the schema first
+        """
+        fields = []
+        for group, items in infobox.items():
+            if not isinstance(items, dict):
+                continue
+            for label, item in items.items():
+                value = item.get("value", "")
+                if not value:
+                    continue
+                score = len(self.terms.intersection(terms(f"{group} {label}")))
+                fields.append((score, label, value, self.count_tokens(f"{label} {value}")))
+
+        fields.sort(key=lambda field: field[0], reverse=True)
+        return [(label, value, tokens) for score, label, value, tokens in fields]
+
+    def rank_sections(self, sections: dict[str, str]) -> list[tuple[str, str, int]]:
+        """
+        The cleaned sections as (name, text, tokens), the most relevant to the schema first
+        """
+        cleaned = [(name, self.clean(name, text)) for name, text in sections.items()]
+        cleaned = [(name, text, terms(f"{name} {text}")) for name, text in cleaned if text]
+        if not cleaned:
+            return []
+
+        average_length = sum(len(words) for name, text, words in cleaned) / len(cleaned)
+        containing = dict.fromkeys(self.terms, 0)
+        for name, text, words in cleaned:
+            for term in self.terms.intersection(words):
+                containing[term] += 1
+
+        ranked = []
+        for index, (name, text, words) in enumerate(cleaned):
+            frequencies = {}
+            for word in words:
+                if word in self.terms:
+                    frequencies[word] = frequencies.get(word, 0) + 1
+
+            norm = 1.2 * (0.25 + 0.75 * len(words) / average_length)
+            score = sum(
+                math.log(1 + (len(cleaned) - containing[term] + 0.5) / (containing[term] + 0.5)) * count / (count + norm)
+                for term, count in frequencies.items())
+            # Ties keep the page order, so the opening sections win
+            ranked.append((-score, index, name, text))
+
+        ranked.sort()
+        return [(name, text, self.count_tokens(text)) for score, index, name, text in ranked]
+
+    @staticmethod
+    def clean(name: str, text: str) -> str:
+        """
+        The text of a section without its heading, edit markers and citations
+        """
+        text = _citations.sub("", _edit_markers.sub("", text))
+        if text.startswith(name):
+            text = text[len(name):]
+        return _spaces.sub(" ", text).strip()
+
+    def truncate(self, text: str, budget: int) -> str:
+        """
+        The longest run of whole sentences from the start of the text within the budget
+        """
+        kept = []
+        for sentence in _sentence_ends.split(text):
+            tokens = self.count_tokens(sentence)
+            if tokens > budget:
+                break
+            kept.append(sentence)
+            budget -= tokens
+        return " ".join(kept)
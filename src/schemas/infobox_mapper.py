@@ -0,0 +1,294 @@
+import re
+from typing import Iterator
+
+import ai
+from instrumentation import Counters
+from wookiepedia.types import JSON
+
+"""
+Infobox labels, normalised by 'normalise_label', and the schema property each fills, dotted for a nested property.
+A property the schema does not have is skipped, so the same table serves every schema.
+"""
+LABELS: dict[str, str] = {
+    # Characters
+    "homeworld": "homeworld",
+    "born": "birth",
+    "died": "death",
+    "species": "species",
+    "gender": "gender",
+    "pronouns": "pronouns",
+    "height": "height",
+    "mass": "mass",
+    "hair color": "hair",
+    "feather color": "feathers",
+    "eye color": "eyes",
+    "skin color": "skin",
+    "genetic donor": "donors",
+    "cybernetics": "cybernetics",
+    "family": "families",
+    "parent": "parents",
+    "partner": "partners",
+    "sibling": "siblings",
+    "children": "children",
+    "affiliation": "affiliations",
+    "masters": "masters",
+    "apprentices": "apprentices",
+    "domain": "domains",
+    "caste": "castes",
+    "owner": "owners",
+    "other names": "aliases",
+    # Planets
+    "region": "region",
+    "sector": "sector",
+    "system": "system",
+    "suns": "stars",
+    "orbital position": "position",
+    "moons": "moons",
+    "grid coordinates": "grid",
+    "trade routes": "routes",
+    "class": "class",
+    "diameter": "diameter",
+    "climate": "climate",
+    "gravity": "gravity",
+    "terrain": "terrain",
+    "primary terrain": "terrain",
+    "surface water": "water",
+    "points of interest": "interest",
+    "flora": "flora",
+    "fauna": "fauna",
+    "native species": "species.native",
+    "immigrated species": "species.other",
+    "primary language": "languages",
+    "population": "population.total",
+    "demonym": "demonym",
+    "major cities": "cities",
+    "major imports": "imports",
+    "major exports": "exports",
+}
+
+"""
+Units of the numbers in infobox values, as (quantity, factor to the base unit of the quantity)
+"""
+UNITS: dict[str, tuple[str, float]] = {
+    "meter": ("length", 1.0),
+    "m": ("length", 1.0),
+    "centimeter": ("length", 0.01),
+    "cm": ("length", 0.01),
+    "kilometer": ("length", 1000.0),
+    "km": ("length", 1000.0),
+    "kilogram": ("mass", 1.0),
+    "kg": ("mass", 1.0),
+    "gram": ("mass", 0.001),
+    "g": ("mass", 0.001),
+    "ton": ("mass", 1000.0),
+    "tonne": ("mass", 1000.0),
+}
+
+"""
+Words that scale the number before them
+"""
+SCALES: dict[str, float] = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "trillion": 1e12}
+
+_label_noise = re.compile(r"\(s\)|[^a-z0-9]+")
+_empty_parts = re.compile(r",(\s*,)+")
+_number = re.compile(r"(-?\d[\d,]*(?:\.\d+)?)\s*([A-Za-z]+)?(?:\s+([A-Za-z]+))?")
+_target_unit = re.compile(r"\bin ([a-z]+)")
+
+
+def normalise_label(label: str) -> str:
+    """
+    An infobox label in lower case, without a plural '(s)' or punctuation: 'Affiliation(s)' becomes 'affiliation'
+    """
+    return " ".join(_label_noise.sub(" ", label.lower()).split())
+
+
+def unit(word: str | None) -> tuple[str, float] | None:
+    if word is None:
+        return None
+    word = word.lower()
+    return UNITS.get(word) or UNITS.get(word[:-1] if word.endswith("s") else word)
+
+
+class MappingStats(Counters):
+    """
+    Counters of the properties filled from infoboxes and of the model calls they made unnecessary.
+
+    A complete page has every property of the schema mapped. Calls are also avoided for pages only missing
+    optional properties when the model only fills the required ones.
+    """
+
+    pages: int = 0
+    properties: int = 0
+    complete_pages: int = 0
+    calls_avoided: int = 0
+
+    derived = ("properties_per_page",)
+
+    @property
+    def properties_per_page(self) -> float:
+        return self.properties / self.pages if self.pages else 0.0
+
+
+class InfoboxMapper:
+    """
+    Fills schema properties straight from a raw page, without the model.
+
+    The infobox values are converted to the type of the property their label maps to: numbers are parsed and
+    converted to the unit named in the property's description, enums are matched without case, patterns are
+    matched against each comma-separated part and arrays are split on commas. The name comes from the infobox
+    title and the continuity from the page's 'Canon_articles' and 'Legends_articles' categories. A value that
+    still does not match its property's schema is left for the model.
+    """
+
+    def __init__(self, json_schema: ai.JsonSchema, labels: dict[str, str] | None = None):
+        """
+        :param json_schema: Schema whose properties are filled
+        :param labels: Normalised infobox labels and the properties they fill, 'LABELS' by default
+        """
+        self.json_schema = json_schema
+        self.stats = MappingStats()
+        self.labels = {}
+        self.validators = {}
+
+        for label, path in (LABELS if labels is None else labels).items():
+            subschema = self.subschema(path)
+            if subschema is not None:
+                self.labels[label] = path
+                self.validators[path] = ai.compile_schema(subschema)
+
+        for name in ("name", "continuity"):
+            if name in json_schema.get("properties", {}):
+                self.validators[name] = ai.compile_schema(json_schema["properties"][name])
+
+    def fingerprint(self) -> dict:
+        """
+        Everything besides the page that changes the mapped properties
+        """
+        return {"labels": self.labels, "units": UNITS}
+
+    def subschema(self, path: str) -> JSON | None:
+        schema = self.json_schema
+        for name in path.split("."):
+            schema = schema.get("properties", {}).get(name)
+            if schema is None:
+                return None
+        return schema
+
+    def map(self, data: JSON) -> dict[str, any]:
+        """
+        The properties of the schema that can be filled from the page
+        """
+        infobox = (data.get("infobox") or {}).get("infobox", {})
+        values = {}
+
+        if "name" in self.validators:
+            values["name"] = infobox.get("title") or data.get("title")
+
+        if "continuity" in self.validators:
+            canon = "Canon_articles" in data.get("categories", [])
+            legends = "Legends_articles" in data.get("categories", [])
+            if canon or legends:
+                values["continuity"] = "Canon/Legends" if canon and legends else "Canon" if canon else "Legends"
+
+        for group, items in infobox.items():
+            if not isinstance(items, dict):
+                continue
+            for label, item in items.items():
+                path = self.labels.get(normalise_label(label))
+                if path is None or path in values or not item.get("value"):
+                    continue
+                value = self.convert(self.subschema(path), item["value"], item.get("links", []))
+                if value is not None:
+                    values[path] = value
+
+        mapped = {}
+        for path, value in values.items():
+            try:
+                self.validators[path](value)
+            except ai.SchemaValidationError:
+                continue
+            *parents, name = path.split(".")
+            target = mapped
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[name] = value
+        return mapped
+
+    def missing(self, mapped: dict[str, any], required_only: bool = False) -> list[str]:
+        """
+        The properties of the schema, or only the required ones, that were not mapped, in schema order.
+        An object property mapped in part gives the dotted paths of the properties still missing inside it,
+        such as 'species.other' when only 'species.native' was mapped.
+        """
+        return list(self.missing_paths(self.json_schema, mapped, required_only))
+
+    @classmethod
+    def missing_paths(cls, schema: JSON, mapped: dict[str, any], required_only: bool, prefix: str = "") -> Iterator[str]:
+        required = schema.get("required", [])
+        for name, subschema in schema.get("properties", {}).items():
+            if name not in mapped:
+                if not required_only or name in required:
+                    yield prefix + name
+            elif subschema.get("type") == "object" and isinstance(mapped[name], dict):
+                yield from cls.missing_paths(subschema, mapped[name], required_only, f"{prefix}{name}.")
+
+    def convert(self, schema: JSON, value: str, links: list[JSON]) -> any:
+        """
+        An infobox value as the type of its property, or None when it cannot be converted
+        """
+        value = _empty_parts.sub(",", value).strip(" ,")
+        parts = [part.strip() for part in value.split(",") if part.strip()]
+        kind = schema.get("type")
+
+        if kind == "array":
+            items = schema.get("items", {})
+            if items.get("type") == "string":
+                return parts
+            if items.get("type") == "object" and items.get("properties", {}).get("name", {}).get("type") == "string":
+                return [{"name": part} for part in parts]
+            return None
+
+        if kind in ("number", "integer"):
+            number = self.number(value, schema.get("description", ""))
+            if number is None:
+                return None
+            return round(number) if kind == "integer" else number
+
+        if kind == "string":
+            candidates = [value, *parts, *(link["text"] for link in links)]
+            if "enum" in schema:
+                allowed = {option.lower(): option for option in schema["enum"]}
+                return next((allowed[c.lower()] for c in candidates if c.lower() in allowed), None)
+            if "pattern" in schema:
+                pattern = re.compile(schema["pattern"])
+                return next((c for c in candidates if pattern.search(c)), None)
+            return value
+
+        return None
+
+    @staticmethod
+    def number(value: str, description: str) -> float | None:
+        """
+        The first number of a value, scaled by a word like 'million' after it and converted to the unit
+        named as 'in <unit>' in the property's description. None when the value's unit is missing,
+        unknown or of another quantity than the one the description names.
+        """
+        match = _number.search(value)
+        if match is None:
+            return None
+
+        number = float(match.group(1).replace(",", ""))
+        word = match.group(2)
+        if word is not None and word.lower() in SCALES:
+            number *= SCALES[word.lower()]
+            word = match.group(3)
+
+        target = _target_unit.search(description.lower())
+        target_unit = unit(target.group(1)) if target else None
+        if target_unit is None:
+            return number
+
+        value_unit = unit(word)
+        if value_unit is None or target_unit[0] != value_unit[0]:
+            return None
+        return number * value_unit[1] / target_unit[1]
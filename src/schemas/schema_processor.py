@@ -1,50 +1,322 @@
+import asyncio
 import json
+import logging
 import os
+from typing import Callable, Collection, Iterable
 
 import ai
+from instrumentation import ProgressReporter, metrics
+from processing import Manifest, changed_records, hash_json, list_tasks, read_records
+from schemas.context_builder import ContextBuilder
+from schemas.infobox_mapper import InfoboxMapper
+from wookiepedia.types import JSON
 
 
 class SchemaProcessor:
     """
     A class to process raw files and summarise their content.
+
+    Written files are recorded in a manifest with the hash of the content sent to the model and of the schema,
+    model and prompt, so a rerun only calls the model for pages that changed or when the schema changed.
+
+    With 'concurrency' above 1, up to that many requests are sent to the server at once and every output
+    is written as soon as its answer arrives. A page that still fails after its retries is logged and
+    left out of the manifest, so the next run tries it again.
+
+    The schema is compiled once into an ExtractionSpec, so every request reuses the same function definition,
+    response format and system prompt, answers are validated against the schema, and pages with identical
+    content are only sent to the model once.
+
+    What is sent for a page is built by a ContextBuilder: its title, infobox fields and the sections most
+    relevant to the schema, within 'context_tokens'. The size of the prompts and the tokens per second of
+    the model are logged once the pages are processed.
+
+    Properties whose value is in the infobox are filled by an InfoboxMapper without the model. The model is
+    then asked only for the properties still missing, or with 'model_fills' set to 'required', only when a
+    required property is missing, so a page whose infobox covers them costs no call at all.
+
+    'process_stream' fills in the schema of the records of a crawl as they are downloaded, so the model
+    works while the crawl is still running instead of after it.
     """
 
     input_dir: str = "output/raw"
     output_dir: str = "output/schemas"
     json_schema: ai.JsonSchema | None = None
+    description: str = "Fill in the schema based on the provided text"
+
+    def __init__(self,
+                 input_dir: str,
+                 output_dir: str,
+                 json_schema: ai.JsonSchema,
+                 template: str | None = None,
+                 manifest_path: str | None = None,
+                 page_ids: Collection[int] | None = None,
+                 concurrency: int = 1,
+                 timeout: float = 120.0,
+                 max_retries: int = 3,
+                 cache_size: int = 1024,
+                 context_tokens: int = 512,
+                 context_sections: int = 4,
+                 map_infobox: bool = True,
+                 model_fills: str = "missing"):
+        """
+        :param input_dir: Directory of raw JSON files, or of the shards written by a ShardWriter
+        :param output_dir: Directory the schema JSON files are written to
+        :param json_schema: Schema the model fills in
+        :param template: Only process the pages of this infobox template when reading from shards
+        :param manifest_path: Where written files are recorded, '.manifest.sqlite' in the output directory by default
+        :param page_ids: Only process these pages, such as the pages of a category selected with a CorpusIndex
+        :param concurrency: Requests in flight at once, 1 to call the model synchronously one page at a time
+        :param timeout: Seconds to wait for an answer when requests are concurrent
+        :param max_retries: Retries of a request that timed out, failed with a 5xx or answered malformed JSON
+        :param cache_size: Answers kept for pages with identical content, 0 to send every page to the model
+        :param context_tokens: Most tokens of infobox fields and sections sent for a page, 0 to send only its title
+        :param context_sections: Most sections sent for a page
+        :param map_infobox: Fill the properties found in the infobox without the model
+        :param model_fills: Properties the model is asked for when the infobox is mapped, 'missing' for all
+                            the ones not mapped, 'required' for none unless a required one is not mapped
+        """
+        if model_fills not in ("missing", "required"):
+            raise ValueError(f"model_fills must be 'missing' or 'required', not {model_fills!r}")
 
-    def __init__(self, input_dir: str, output_dir: str, json_schema: ai.JsonSchema):
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.json_schema = json_schema
+        self.template = template
+        self.manifest_path = manifest_path or os.path.join(output_dir, ".manifest.sqlite")
+        self.page_ids = page_ids
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache_size = cache_size
+        self.spec = ai.ExtractionSpec(json_schema, description=self.description, cache_size=cache_size)
+        self.specs: dict[tuple[str, ...], ai.ExtractionSpec] = {}
+        self.context_builder = ContextBuilder(json_schema, token_budget=context_tokens, max_sections=context_sections)
+        self.mapper = InfoboxMapper(json_schema) if map_infobox else None
+        self.model_fills = model_fills
 
-    def process_raw_files(self):
-        for root, dirs, files in os.walk(self.input_dir):
-            for input_file in files:
-                if input_file.endswith(".json"):
-                    relative_path = os.path.relpath(root, self.input_dir)
-                    output_file_dir = os.path.join(self.output_dir, relative_path)
-                    os.makedirs(output_file_dir, exist_ok=True)
-                    output_file = os.path.join(output_file_dir, input_file)
-                    input_file_path = os.path.join(root, input_file)
-                    self.process_file(input_file_path, output_file)
+    def fingerprint(self) -> dict:
+        """
+        Everything besides the page that changes the output
+        """
+        fingerprint = {**self.spec.fingerprint(), "context": self.context_builder.fingerprint()}
+        if self.mapper is not None:
+            fingerprint["mapping"] = {**self.mapper.fingerprint(), "model_fills": self.model_fills}
+        return fingerprint
 
-    def process_file(self, input_file, output_file):
+    @staticmethod
+    def inputs(data) -> any:
+        """
+        The parts of a record the output depends on
+        """
+        return {key: data.get(key) for key in ("title", "infobox", "sections", "categories")}
+
+    def content(self, data) -> any:
+        """
+        The part of a record sent to the model
+        """
+        if self.context_builder.token_budget <= 0:
+            return data["infobox"]["infobox"]["title"]
+        return self.context_builder.build(data)
+
+    def process_raw_files(self) -> int:
+        """
+        Fill in the schema of every page that changed and return the number of files written
+        """
+        tasks = list_tasks(self.input_dir, self.output_dir, self.template, self.page_ids)
+        progress = ProgressReporter(total=len(tasks), unit="files")
+        return self.process_changed(read_records(self.input_dir, tasks), progress)
+
+    def process_stream(self, records: Iterable[tuple[dict, str]]) -> int:
+        """
+        Fill in the schema of the records of a running crawl as they arrive, skipping those that are up to date,
+        and return the number of files written
+        """
+        return self.process_changed(records, ProgressReporter(total=None, unit="files"), batch_size=1)
+
+    def process_changed(self, records: Iterable[tuple[dict, str]], progress: ProgressReporter, batch_size: int = Manifest.lookup_limit) -> int:
+        """
+        Fill in the schema of the records whose output is not up to date, hashing every record as it is read
+        so each input is read once, and return the number of files written
+        """
+        manifest = Manifest(self.manifest_path)
+        config_hash = hash_json(self.fingerprint())
+        input_hashes: dict[str, str] = {}
+
+        def completed(output_file: str):
+            manifest.record([(output_file, input_hashes.pop(output_file), config_hash)])
+            progress.advance()
+
+        self.process_records(
+            changed_records(records, manifest, config_hash, input_hashes, content=self.inputs, progress=progress, batch_size=batch_size),
+            completed)
+        manifest.close()
+        self.log_stats()
+        return progress.done
+
+    def process_records(self, records: Iterable[tuple[dict, str]], completed: Callable[[str], None]):
+        if self.concurrency > 1:
+            asyncio.run(self.process_concurrently(records, completed))
+        else:
+            for data, output_file in records:
+                try:
+                    self.process_record(data, output_file)
+                except Exception:
+                    # Left out of the manifest, so the next run tries the page again
+                    logging.exception(f"Failed to fill in the schema of {output_file}")
+                    continue
+                completed(output_file)
+
+    def log_stats(self):
+        logging.info(f"Contexts: {self.context_builder.stats.to_dict()}")
+        if self.mapper is not None:
+            logging.info(f"Infobox mapping: {self.mapper.stats.to_dict()}")
+        logging.info(f"Extraction: {self.spec.stats.to_dict()}")
 
-        function_definition = ai.get_function_definition(
-            name=self.json_schema["title"],
-            description="Fill in the schema based on the provided text",
-            json_schema=self.json_schema)
+    async def process_concurrently(self, records: Iterable[tuple[dict, str]], completed: Callable[[str], None]):
+        client = ai.create_async_client()
+        slots = asyncio.Semaphore(self.concurrency)
+        in_flight: set[asyncio.Task] = set()
+        depth = metrics.queue_depth("llm_in_flight")
 
+        def done(task: asyncio.Task):
+            in_flight.discard(task)
+            depth.set(len(in_flight))
+
+        async def process(data, output_file):
+            try:
+                mapped, spec = self.map_record(data)
+                response = {}
+                if spec is not None:
+                    response = await spec.extract_async(
+                        client,
+                        self.content(data),
+                        timeout=self.timeout,
+                        max_retries=self.max_retries)
+                self.write_output(self.merge(response, mapped), output_file)
+                completed(output_file)
+            except Exception:
+                logging.exception(f"Failed to fill in the schema of {output_file}")
+            finally:
+                slots.release()
+
+        # The records may come from a stream that blocks until the next page is downloaded,
+        # so they are read on a thread while the requests in flight carry on
+        records = iter(records)
+
+        try:
+            while True:
+                await slots.acquire()
+                record = await asyncio.to_thread(next, records, None)
+                if record is None:
+                    slots.release()
+                    break
+                data, output_file = record
+                task = asyncio.create_task(process(data, output_file))
+                in_flight.add(task)
+                depth.set(len(in_flight))
+                task.add_done_callback(done)
+
+            await asyncio.gather(*in_flight)
+        finally:
+            # Reading a record may fail, or the run be cancelled, with requests still in flight,
+            # which must finish before their client is closed
+            pending = list(in_flight)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await client.close()
+
+    def function_definition(self) -> dict[str, any]:
+        return self.spec.function_definition
+
+    def process_file(self, input_file, output_file):
         with open(input_file, "r") as i:
             data = json.load(i)
-            # loop hashmap of 'sections' field (key-value of string:string)
-            title = data["infobox"]["infobox"]["title"]
+            self.process_record(data, output_file)
+
+    def process_record(self, data, output_file):
+        mapped, spec = self.map_record(data)
+        response = {}
+        if spec is not None:
+            response = spec.extract(self.content(data), max_retries=self.max_retries)
+        self.write_output(self.merge(response, mapped), output_file)
+
+    def map_record(self, data) -> tuple[dict[str, any], ai.ExtractionSpec | None]:
+        """
+        The properties mapped from the record's infobox and the spec asking the model for the others,
+        None when the model is not needed
+        """
+        if self.mapper is None:
+            return {}, self.spec
+
+        mapped = self.mapper.map(data)
+        missing = self.mapper.missing(mapped)
+        call = bool(self.mapper.missing(mapped, required_only=True) if self.model_fills == "required" else missing)
+        self.mapper.stats.add(pages=1, properties=len(mapped), complete_pages=int(not missing), calls_avoided=int(not call))
+        return mapped, self.spec_for(tuple(missing)) if call else None
+
+    def spec_for(self, properties: tuple[str, ...]) -> ai.ExtractionSpec:
+        """
+        The spec of the schema reduced to some of its properties, given as dotted paths for the properties
+        inside an object, sharing the statistics of the full spec
+        """
+        if properties == tuple(self.json_schema["properties"]):
+            return self.spec
+
+        if properties not in self.specs:
+            self.specs[properties] = ai.ExtractionSpec(
+                self.reduce_schema(self.json_schema, properties),
+                description=self.description,
+                cache_size=self.cache_size,
+                stats=self.spec.stats)
+        return self.specs[properties]
+
+    @classmethod
+    def reduce_schema(cls, schema: JSON, paths: Iterable[str]) -> JSON:
+        """
+        The object schema with only the properties at the dotted paths, an object property reduced to the paths inside it
+        """
+        nested: dict[str, list[str]] = {}
+        for path in paths:
+            name, _, rest = path.partition(".")
+            inner = nested.setdefault(name, [])
+            if rest:
+                inner.append(rest)
+
+        properties = {
+            name: cls.reduce_schema(subschema, nested[name]) if nested[name] else subschema
+            for name, subschema in schema["properties"].items()
+            if name in nested
+        }
+        reduced = {**schema, "properties": properties}
+        if "required" in schema:
+            reduced["required"] = [name for name in schema["required"] if name in properties]
+        return reduced
+
+    def merge(self, response: dict[str, any], mapped: dict[str, any]) -> dict[str, any]:
+        """
+        The model's answer completed with the mapped properties, in the order of the schema
+        """
+        return self.merge_objects(self.json_schema, response, mapped)
 
-            response = ai.call_openai_function(title, function_definition)
+    @classmethod
+    def merge_objects(cls, schema: JSON, response: dict[str, any], mapped: dict[str, any]) -> dict[str, any]:
+        """
+        An object of the answer completed with the mapped properties, merging the objects both of them have
+        """
+        merged = dict(response)
+        for name, value in mapped.items():
+            if isinstance(value, dict) and isinstance(merged.get(name), dict):
+                merged[name] = cls.merge_objects(schema.get("properties", {}).get(name, {}), merged[name], value)
+            else:
+                merged[name] = value
+        ordered = {name: merged.pop(name) for name in schema.get("properties", {}) if name in merged}
+        return {**ordered, **merged}
 
-            if not os.path.exists(self.output_dir):
-                os.makedirs(self.output_dir, exist_ok=True)
+    def write_output(self, response, output_file):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir, exist_ok=True)
 
-            with open(output_file, "w") as output:
-                json.dump(response, output, indent=4)
+        with open(output_file, "w") as output:
+            json.dump(response, output, indent=4)
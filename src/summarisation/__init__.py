@@ -1,2 +1,5 @@
+from summarisation.model_registry import ModelRegistry, registry
 from summarisation.raw_file_processor import RawFileProcessor
+from summarisation.summary_cache import SummaryCache, SummaryCacheStats, normalise_text, simhash
+from summarisation.text_paraphraser import TextParaphraser
 from summarisation.text_summariser import TextSummariser
@@ -0,0 +1,70 @@
+import threading
+from typing import Any, Callable
+
+from instrumentation import stage
+
+
+class ModelRegistry:
+    """
+    A process-wide store of loaded models, so every summariser and paraphraser in a process shares one copy.
+
+    Models are loaded on first use and torch and transformers are only imported then,
+    so importing and constructing the summarisation classes stays cheap.
+    """
+
+    def __init__(self):
+        self.models: dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key not in self.models:
+                with stage(f"load {' '.join(str(part) for part in key)}"):
+                    self.models[key] = load()
+            return self.models[key]
+
+    def seq2seq(self, model_name: str) -> tuple[Any, Any, Any]:
+        """
+        A sequence to sequence model, its fast tokenizer and the device it is on
+        """
+        def load():
+            import torch
+            from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+            model = model.to(device)
+            model.eval()
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            return model, tokenizer, device
+
+        return self.get(("seq2seq", model_name), load)
+
+    def bart(self, model_name: str, quantize: bool = False) -> tuple[Any, Any, Any]:
+        """
+        A BART model, its tokenizer and the device it is on, with the linear layers quantized to int8 on CPU if asked
+        """
+        def load():
+            import torch
+            from transformers import BartForConditionalGeneration, BartTokenizer
+
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            model = BartForConditionalGeneration.from_pretrained(model_name)
+            model = model.to(device)
+            model.eval()
+            if quantize and device.type == "cpu":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            tokenizer = BartTokenizer.from_pretrained(model_name)
+            return model, tokenizer, device
+
+        return self.get(("bart", model_name, quantize), load)
+
+    def clear(self):
+        with self._lock:
+            self.models.clear()
+
+
+"""
+The registry shared by the whole process
+"""
+registry = ModelRegistry()
@@ -1,43 +1,229 @@
+import concurrent.futures
 import json
+import logging
+import multiprocessing
 import os
+from typing import Callable, Collection, Iterable, Iterator
 
+from instrumentation import ProgressReporter, metrics
+from processing import Manifest, changed_records, hash_json, list_tasks, read_records
 from summarisation.text_summariser import TextSummariser
 
 
 class RawFileProcessor:
     """
     A class to process raw files and summarise their content.
+
+    With 'processes' set, the files are summarised by a pool of worker processes, each loading the models once.
+    Written files are recorded in a manifest with the hash of their input and of the summariser's settings,
+    so a rerun, or a killed run started again, only summarises the files that changed.
+
+    'process_stream' summarises the records of a crawl as they are downloaded instead of the files of a
+    finished crawl, in batches of 'batch_files' as they fill up.
     """
 
     input_dir: str = "output/raw"
     output_dir: str = "output/summarised"
 
-    def __init__(self, input_dir: str, output_dir: str):
+    def __init__(self,
+                 input_dir: str,
+                 output_dir: str,
+                 template: str | None = None,
+                 batch_files: int = 16,
+                 processes: int = 0,
+                 threads_per_process: int | None = None,
+                 manifest_path: str | None = None,
+                 page_ids: Collection[int] | None = None,
+                 summarizer: TextSummariser | None = None):
+        """
+        :param input_dir: Directory of raw JSON files, or of the shards written by a ShardWriter
+        :param output_dir: Directory the summarised JSON files are written to
+        :param template: Only process the pages of this infobox template when reading from shards
+        :param batch_files: Files whose sections are summarised together, so the model sees full batches
+        :param processes: Worker processes summarising files, 0 to summarise in this process
+        :param threads_per_process: torch intra-op threads of every worker, the CPUs divided by the workers by default
+        :param manifest_path: Where written files are recorded, '.manifest.sqlite' in the output directory by default
+        :param page_ids: Only process these pages, such as the pages of a category selected with a CorpusIndex
+        :param summarizer: Summariser to use, distilbart-cnn-12-6 by default
+        """
         self.input_dir = input_dir
         self.output_dir = output_dir
-        self.summarizer = TextSummariser()
-        self.summarizer.load_model("sshleifer/distilbart-cnn-12-6")
-
-    def process_raw_files(self):
-        for root, dirs, files in os.walk(self.input_dir):
-            for input_file in files:
-                if input_file.endswith(".json"):
-                    relative_path = os.path.relpath(root, self.input_dir)
-                    output_file_dir = os.path.join(self.output_dir, relative_path)
-                    os.makedirs(output_file_dir, exist_ok=True)
-                    output_file = os.path.join(output_file_dir, input_file)
-                    input_file_path = os.path.join(root, input_file)
-                    self.process_file(input_file_path, output_file)
+        self.template = template
+        self.batch_files = batch_files
+        self.processes = processes
+        self.threads_per_process = threads_per_process
+        self.manifest_path = manifest_path or os.path.join(output_dir, ".manifest.sqlite")
+        self.page_ids = page_ids
+        self.pending: list[tuple[dict, str]] = []
+
+        if summarizer is None:
+            summarizer = TextSummariser()
+            summarizer.load_model("sshleifer/distilbart-cnn-12-6")
+        self.summarizer = summarizer
+
+    def process_raw_files(self) -> int:
+        """
+        Summarise every file that changed and return the number of files written
+        """
+        tasks = list_tasks(self.input_dir, self.output_dir, self.template, self.page_ids)
+        progress = ProgressReporter(total=len(tasks), unit="files")
+        return self.process_changed(read_records(self.input_dir, tasks), progress)
+
+    def process_stream(self, records: Iterable[tuple[dict, str]]) -> int:
+        """
+        Summarise the records of a running crawl as they arrive, skipping those that are up to date,
+        and return the number of files written
+        """
+        return self.process_changed(records, ProgressReporter(total=None, unit="files"), batch_size=1)
+
+    def process_changed(self, records: Iterable[tuple[dict, str]], progress: ProgressReporter, batch_size: int = Manifest.lookup_limit) -> int:
+        """
+        Summarise the records whose output is not up to date, in batches of 'batch_files', hashing every
+        record as it is read so each input is read once, and return the number of files written
+        """
+        manifest = Manifest(self.manifest_path)
+        config_hash = hash_json(self.summarizer.fingerprint())
+        input_hashes: dict[str, str] = {}
+
+        def completed(output_files: list[str]):
+            manifest.record([(output_file, input_hashes.pop(output_file), config_hash) for output_file in output_files])
+            progress.advance(len(output_files))
+
+        def batches() -> Iterator[list[tuple[dict, str]]]:
+            batch = []
+            for record in changed_records(records, manifest, config_hash, input_hashes, progress=progress, batch_size=batch_size):
+                batch.append(record)
+                if len(batch) >= self.batch_files:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        if self.processes > 0:
+            self.process_in_workers(batches(), completed)
+        else:
+            for batch in batches():
+                completed(self.process_records(batch))
+
+        manifest.close()
+        self.log_stats()
+        return progress.done
+
+    def log_stats(self):
+        if self.summarizer.cache is not None:
+            logging.info(f"Summary cache: {self.summarizer.cache.stats.to_dict()}")
+
+    def process_in_workers(self, batches: Iterable[list[tuple[dict, str]]], completed: Callable[[list[str]], None]):
+        """
+        Summarise batches of records on the worker processes, keeping two batches per worker in flight
+        so batches still being read or downloaded are not all held in memory at once
+        """
+        threads = self.threads_per_process or max(1, (os.cpu_count() or 1) // self.processes)
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes,
+                # Forking a process that has already used torch or the tokenizers' thread pools is not safe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initialize_worker,
+                initargs=(self.input_dir, self.output_dir, self.batch_files, self.summarizer, threads)) as executor:
+            depth = metrics.queue_depth("summarise_batches")
+            in_flight: set[concurrent.futures.Future] = set()
+
+            def finished(future: concurrent.futures.Future):
+                output_files, cache_counts = future.result()
+                if cache_counts is not None:
+                    self.summarizer.cache.stats.add(**cache_counts)
+                completed(output_files)
+
+            for batch in batches:
+                if len(in_flight) >= 2 * self.processes:
+                    done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        finished(future)
+                in_flight.add(executor.submit(process_records_in_worker, batch))
+                depth.set(len(in_flight))
+
+            for future in concurrent.futures.as_completed(in_flight):
+                finished(future)
+                depth.add(-1)
+
+    def process_records(self, records: list[tuple[dict, str]]) -> list[str]:
+        """
+        Summarise a batch of records together and return their output files
+        """
+        for data, output_file in records:
+            self.add_record(data, output_file)
+        self.flush()
+        return [output_file for data, output_file in records]
 
     def process_file(self, input_file, output_file):
         with open(input_file, "r") as input:
             data = json.load(input)
-            # loop hashmap of 'sections' field (key-value of string:string)
-            for section_name, content in data["sections"].items():
-                data["sections"][section_name] = self.summarizer.summarize(content)
+            self.process_record(data, output_file)
 
-            if not os.path.exists(self.output_dir):
-                os.makedirs(self.output_dir, exist_ok=True)
+    def process_record(self, data, output_file):
+        self.add_record(data, output_file)
+        self.flush()
 
-            with open(output_file, "w") as output:
+    def add_record(self, data, output_file):
+        """
+        Queue a record, summarising the queued records once 'batch_files' of them are waiting
+        """
+        self.pending.append((data, output_file))
+        if len(self.pending) >= self.batch_files:
+            self.flush()
+
+    def flush(self):
+        """
+        Summarise the sections of every queued record in one batched call and write the records
+        """
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, []
+        # loop hashmap of 'sections' field (key-value of string:string)
+        sections = [(data, section_name) for data, output_file in pending for section_name in data["sections"]]
+        summaries = self.summarizer.summarize_many([data["sections"][section_name] for data, section_name in sections])
+
+        for (data, section_name), summary in zip(sections, summaries):
+            data["sections"][section_name] = summary
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        for data, output_file in pending:
+            # Write to a temporary file first, so a killed run never leaves a partial output behind
+            with open(output_file + ".tmp", "w") as output:
                 json.dump(data, output, indent=4)
+            os.replace(output_file + ".tmp", output_file)
+
+
+"""
+The processor of a worker process, created once per worker so the models are loaded once
+"""
+_worker_processor: RawFileProcessor | None = None
+
+
+def initialize_worker(input_dir: str, output_dir: str, batch_files: int, summarizer: TextSummariser, threads: int):
+    global _worker_processor
+
+    import torch
+    torch.set_num_threads(threads)
+
+    _worker_processor = RawFileProcessor(
+        input_dir=input_dir,
+        output_dir=output_dir,
+        batch_files=batch_files,
+        summarizer=summarizer)
+
+
+def worker_cache_counts() -> dict[str, int] | None:
+    """
+    The summary cache counters of this worker since its last batch, which the parent adds to its own
+    """
+    cache = _worker_processor.summarizer.cache
+    return cache.stats.take() if cache is not None else None
+
+
+def process_records_in_worker(records: list[tuple[dict, str]]) -> tuple[list[str], dict[str, int] | None]:
+    return _worker_processor.process_records(records), worker_cache_counts()
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import re
+import time
+import unicodedata
+
+from instrumentation import Counters
+from wookiepedia.sqlite_store import SqliteStore
+
+"""
+Runs of whitespace, collapsed to a single space before a text is hashed
+"""
+_whitespace_pattern = re.compile(r'\s+')
+
+"""
+Words of a text, the features its SimHash is computed from
+"""
+_word_pattern = re.compile(r'\w+')
+
+"""
+Bits of a SimHash, split into equal bands so a near duplicate is found by an exact match on one of them
+"""
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+
+
+def normalise_text(text: str) -> str:
+    """
+    The text in Unicode NFC with its whitespace collapsed, so texts differing only in spacing share a summary
+    """
+    return _whitespace_pattern.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalise_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle: int = 3) -> int | None:
+    """
+    The 64-bit SimHash of the text's lowercased word shingles, or None when it has too few words to compare.
+
+    Texts sharing most of their shingles get hashes differing in few bits, so the Hamming distance
+    between two hashes estimates how different the texts are.
+    """
+    words = _word_pattern.findall(text.lower())
+    if len(words) < 2 * shingle:
+        return None
+
+    counts = [0] * SIMHASH_BITS
+    for start in range(len(words) - shingle + 1):
+        feature = " ".join(words[start:start + shingle]).encode("utf-8")
+        value = int.from_bytes(hashlib.blake2b(feature, digest_size=8).digest(), "little")
+        for bit in range(SIMHASH_BITS):
+            counts[bit] += 1 if value >> bit & 1 else -1
+
+    return sum(1 << bit for bit, count in enumerate(counts) if count > 0)
+
+
+def bands(value: int) -> list[int]:
+    return [value >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1) for band in range(BANDS)]
+
+
+def signed(value: int) -> int:
+    """
+    An unsigned 64-bit value as the signed integer SQLite stores
+    """
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class SummaryCacheStats(Counters):
+    """
+    Counters for the lookups made against a summary cache
+    """
+
+    hits: int = 0
+    near_hits: int = 0
+    misses: int = 0
+    deduplicated: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    derived = ("hit_rate",)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.near_hits + self.misses
+        return (self.hits + self.near_hits) / lookups if lookups else 0.0
+
+
+class SummaryCache(SqliteStore):
+    """
+    An on-disk cache of section summaries, addressed by the hash of the normalized section text and of the
+    summariser's settings, so a section repeated across pages, or unchanged between runs, is summarised once.
+
+    With 'near_duplicate_distance' set, a text missing from the cache reuses the summary of a cached text
+    whose SimHash differs in at most that many bits, such as the same stub notice with another page name.
+    The hash is split into four bands and a candidate must match one of them exactly, which finds every
+    hash within three bits. The least recently used summaries are evicted once the cache grows beyond its
+    byte budget.
+    """
+
+    schema = f"""
+        CREATE TABLE IF NOT EXISTS summaries (
+            key TEXT PRIMARY KEY,
+            config TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            simhash INTEGER,
+            {", ".join(f"band{band} INTEGER" for band in range(BANDS))},
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS summaries_accessed_at ON summaries (accessed_at);
+        {" ".join(f"CREATE INDEX IF NOT EXISTS summaries_band{band} ON summaries (band{band});" for band in range(BANDS))}
+    """
+
+    def __init__(self,
+                 directory: str = "output/cache",
+                 max_bytes: int = 256 * 1024 ** 2,
+                 near_duplicate_distance: int | None = None):
+        """
+        :param directory: Directory of the cache database
+        :param max_bytes: Size of the cached summaries above which the least recently used are evicted
+        :param near_duplicate_distance: Most bits a SimHash may differ in for a cached summary to be reused,
+                                        None to only reuse the summaries of identical texts
+        """
+        if near_duplicate_distance is not None and not 0 <= near_duplicate_distance < BANDS:
+            raise ValueError(f"near_duplicate_distance must be between 0 and {BANDS - 1}, not {near_duplicate_distance}")
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.near_duplicate_distance = near_duplicate_distance
+        self.stats = SummaryCacheStats()
+        super().__init__(os.path.join(directory, "summaries.sqlite"))
+
+    def opened(self):
+        self.size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # A worker counts from zero and hands its counts to the parent with 'take'
+        self.stats = SummaryCacheStats()
+
+    @staticmethod
+    def key(config: str, text: str) -> str:
+        return hashlib.sha256(f"{config}\n{text_hash(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, config: str, texts: list[str]) -> list[str | None]:
+        """
+        The cached summary of every text, or of a cached near duplicate when they are enabled,
+        None for the texts that must be summarised
+        """
+        keys = [self.key(config, text) for text in texts]
+        found: dict[str, str] = {}
+
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                found.update(rows)
+            if found:
+                self._connection.executemany(
+                    "UPDATE summaries SET accessed_at = ? WHERE key = ?", [(time.time(), key) for key in found])
+                self._connection.commit()
+
+        summaries = [found.get(key) for key in keys]
+        hits = sum(summary is not None for summary in summaries)
+        near_hits = 0
+
+        if self.near_duplicate_distance is not None:
+            for index, text in enumerate(texts):
+                if summaries[index] is None:
+                    summaries[index] = self.find_near_duplicate(config, text)
+                    near_hits += summaries[index] is not None
+
+        self.stats.add(hits=hits, near_hits=near_hits, misses=len(texts) - hits - near_hits)
+        return summaries
+
+    def find_near_duplicate(self, config: str, text: str) -> str | None:
+        value = simhash(text)
+        if value is None:
+            return None
+
+        text_bands = bands(value)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT key, simhash, summary FROM summaries WHERE config = ? AND "
+                f"({' OR '.join(f'band{band} = ?' for band in range(BANDS))})",
+                (config, *text_bands)).fetchall()
+
+        best = None
+        for key, candidate, summary in rows:
+            distance = bin((candidate & (1 << 64) - 1) ^ value).count("1")
+            if distance <= self.near_duplicate_distance and (best is None or distance < best[0]):
+                best = (distance, key, summary)
+
+        if best is None:
+            return None
+        with self._lock:
+            self._connection.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (time.time(), best[1]))
+            self._connection.commit()
+        return best[2]
+
+    def representatives(self, texts: list[str]) -> list[int]:
+        """
+        The index of the first text each text is a near duplicate of, its own index when there is none,
+        so near duplicates missing from the cache are summarised once
+        """
+        if self.near_duplicate_distance is None:
+            return list(range(len(texts)))
+
+        representatives = []
+        seen: dict[tuple[int, int], list[tuple[int, int]]] = {}
+        for index, text in enumerate(texts):
+            value = simhash(text)
+            representative = index
+            if value is not None:
+                for band, band_value in enumerate(bands(value)):
+                    for candidate, candidate_index in seen.get((band, band_value), []):
+                        if bin(candidate ^ value).count("1") <= self.near_duplicate_distance:
+                            representative = candidate_index
+                            break
+                    if representative != index:
+                        break
+                if representative == index:
+                    for band, band_value in enumerate(bands(value)):
+                        seen.setdefault((band, band_value), []).append((value, index))
+            representatives.append(representative)
+        return representatives
+
+    def put_many(self, config: str, texts: list[str], summaries: list[str]):
+        if not texts:
+            return
+        now = time.time()
+        rows = []
+        for text, summary in zip(texts, summaries):
+            value = simhash(text) if self.near_duplicate_distance is not None else None
+            key = self.key(config, text)
+            rows.append((
+                key,
+                config,
+                summary,
+                len(key) + len(summary.encode("utf-8")),
+                signed(value) if value is not None else None,
+                *(bands(value) if value is not None else [None] * BANDS),
+                now))
+
+        # A text repeated in the batch is stored once, so its size is counted once
+        rows = list({row[0]: row for row in rows}.values())
+
+        with self._lock:
+            keys = [row[0] for row in rows]
+            previous = 0
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                previous += self._connection.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM summaries WHERE key IN ({', '.join('?' * len(chunk))})", chunk).fetchone()[0]
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO summaries (key, config, summary, size, simhash, "
+                f"{', '.join(f'band{band}' for band in range(BANDS))}, accessed_at) "
+                f"VALUES ({', '.join('?' * (6 + BANDS))})",
+                rows)
+            self.size += sum(row[3] for row in rows) - previous
+            self.evict()
+            self._connection.commit()
+        self.stats.add(stores=len(rows))
+
+    def evict(self):
+        """
+        Remove the least recently used summaries until the cache is back under 90% of its budget
+        """
+        if self.size <= self.max_bytes:
+            return
+
+        # Worker processes share the database, so the size this process has counted is only an estimate
+        self.size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+        if self.size <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        rows = self._connection.execute("SELECT key, size FROM summaries ORDER BY accessed_at").fetchall()
+        evicted = []
+
+        for key, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((key,))
+            self.size -= size
+
+        self._connection.executemany("DELETE FROM summaries WHERE key = ?", evicted)
+        self.stats.add(evictions=len(evicted))
@@ -1,25 +1,65 @@
-import torch
-
-from transformers import BartForConditionalGeneration, BartTokenizer, pipeline
+from instrumentation import metrics
+from summarisation.model_registry import registry
 
 
 class TextParaphraser:
     """
     A class to perform text paraphrasing using the Hugging Face Transformers library.
+
+    The model is loaded from the shared registry the first time it is needed.
     """
-    
-    def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = BartForConditionalGeneration.from_pretrained('eugenesiow/bart-paraphrase')
-        self.model = self.model.to(self.device)
-        self.tokenizer = BartTokenizer.from_pretrained('eugenesiow/bart-paraphrase')
+
+    def __init__(self, model_name: str = 'eugenesiow/bart-paraphrase', batch_size: int = 16, quantize: bool = False):
+        """
+        :param model_name: Model and tokenizer to load
+        :param batch_size: Texts generated at once by 'paraphrase_many'
+        :param quantize: Quantize the linear layers to int8 when running on the CPU
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.quantize = quantize
+
+    @property
+    def model(self):
+        return registry.bart(self.model_name, self.quantize)[0]
+
+    @property
+    def tokenizer(self):
+        return registry.bart(self.model_name, self.quantize)[1]
+
+    @property
+    def device(self):
+        return registry.bart(self.model_name, self.quantize)[2]
 
     def paraphrase(self, text: str):
-        batch = self.tokenizer(text=text,
-                               return_tensors="pt").to(self.device)  # Move the batch to the same device as the model
-        generated_ids = self.model.generate(batch['input_ids'])
-        generated_sentence = self.tokenizer.decode(
-            generated_ids[0],
-            max_new_tokens=150,
-            skip_special_tokens=True)
-        return generated_sentence
+        return self.paraphrase_many([text])[0]
+
+    def paraphrase_many(self, texts: list[str]) -> list[str]:
+        """
+        Paraphrase many texts, 'batch_size' at a time, returning the paraphrases in the same order.
+
+        Texts are sorted by token length before batching so that each batch is padded as little as possible.
+        """
+        import torch
+
+        model, tokenizer, device = registry.bart(self.model_name, self.quantize)
+        encoded = tokenizer(text=texts)['input_ids']
+        order = sorted(range(len(texts)), key=lambda index: len(encoded[index]))
+        paraphrases = [""] * len(texts)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                indexes = order[start:start + self.batch_size]
+                batch = tokenizer.pad(
+                    {"input_ids": [encoded[index] for index in indexes]},
+                    return_tensors="pt").to(device)  # Move the batch to the same device as the model
+                with metrics.call_seconds("paraphrase").time():
+                    generated_ids = model.generate(batch['input_ids'], attention_mask=batch['attention_mask'])
+                generated_sentences = tokenizer.batch_decode(
+                    generated_ids,
+                    skip_special_tokens=True)
+
+                for index, generated_sentence in zip(indexes, generated_sentences):
+                    paraphrases[index] = generated_sentence
+
+        return paraphrases
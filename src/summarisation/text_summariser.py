@@ -1,60 +1,324 @@
-from transformers import pipeline
+import hashlib
+import json
+import re
+
+from instrumentation import metrics
+from summarisation.model_registry import registry
+from summarisation.summary_cache import SummaryCache, text_hash
 from summarisation.text_paraphraser import TextParaphraser
 
+"""
+Where a sentence ends, i.e. the whitespace after a full stop, question mark or exclamation mark
+"""
+_sentence_end_pattern = re.compile(r'(?<=[.!?])(?=\s)')
+
+
+def split_sentences(content: str) -> list[str]:
+    """
+    Split the content after every sentence, keeping the whitespace at the start of the next sentence
+    so the sentences join back into the content and tokenize to the same tokens as the whole content
+    """
+    sentences = []
+    start = 0
+    for match in _sentence_end_pattern.finditer(content):
+        sentences.append(content[start:match.start()])
+        start = match.start()
+    sentences.append(content[start:])
+    return [sentence for sentence in sentences if sentence]
+
 
 class TextSummariser:
     """
     A class to perform text summarization using the Hugging Face Transformers library.
+
+    'load_model' only chooses the model, which is loaded from the shared registry the first time it is needed.
+
+    Content is tokenized once and split into overlapping windows on sentence boundaries, so nothing beyond the
+    model's input length is dropped, and the token ids of every window are passed straight to 'generate'.
+
+    Identical texts given together are summarised once. With a SummaryCache, texts summarised before,
+    on another page or in an earlier run, reuse their cached summary instead of running the model.
+    """
+
+    """
+    Content up to this many characters is paraphrased instead of summarised
+    """
+    paraphrase_length: int = 250
+
+    """
+    Arguments passed to 'generate' for every window
     """
+    generate_kwargs: dict = {
+        "max_length": 250,
+        "min_length": 20,
+        "length_penalty": 1.5,
+        "num_beams": 4,
+        "early_stopping": True
+    }
 
-    def __init__(self):
-        self.summarization_pipeline = None
-        self.paraphraser = TextParaphraser()
+    def __init__(self,
+                 paraphraser_model: str = "eugenesiow/bart-paraphrase",
+                 batch_size: int = 8,
+                 quantize_paraphraser: bool = False,
+                 overlap: int = 64,
+                 reduce_windows: int = 4,
+                 cache: SummaryCache | None = None):
+        """
+        :param paraphraser_model: Model used to paraphrase content that is too short to summarise
+        :param batch_size: Windows run through the model at once by 'summarize_many'
+        :param quantize_paraphraser: Quantize the paraphrasing model to int8 when running on the CPU
+        :param overlap: Tokens of whole sentences repeated at the start of the next window
+        :param reduce_windows: Content split into more windows than this has the summaries of its windows summarised again
+        :param cache: Cache of the summaries of texts summarised before
+        """
+        self.model_name = None
+        self.paraphraser = TextParaphraser(model_name=paraphraser_model, quantize=quantize_paraphraser)
+        self.batch_size = batch_size
+        self.overlap = overlap
+        self.reduce_windows = reduce_windows
+        self.cache = cache
 
     def load_model(self, model_name):
-        self.summarization_pipeline = pipeline(
-            task="summarization",
-            model=model_name)
+        self.model_name = model_name
+
+    @property
+    def model(self):
+        return self.loaded()[0]
+
+    @property
+    def tokenizer(self):
+        return self.loaded()[1]
+
+    def loaded(self):
+        if self.model_name is None:
+            raise ValueError("No summarisation model, call 'load_model' first")
+        return registry.seq2seq(self.model_name)
+
+    def fingerprint(self) -> dict:
+        """
+        Everything that changes the summaries this summariser produces
+        """
+        fingerprint = self.model_fingerprint()
+        if self.cache is not None and self.cache.near_duplicate_distance is not None:
+            # Near duplicates share a summary, which changes the summaries of some texts
+            fingerprint["near_duplicate_distance"] = self.cache.near_duplicate_distance
+        return fingerprint
+
+    def model_fingerprint(self) -> dict:
+        """
+        Everything that changes the summary of a single text, which the cached summaries are stored under
+        """
+        return {
+            "model": self.model_name,
+            "paraphraser_model": self.paraphraser.model_name,
+            "quantize_paraphraser": self.paraphraser.quantize,
+            "paraphrase_length": self.paraphrase_length,
+            "generate_kwargs": self.generate_kwargs,
+            "overlap": self.overlap,
+            "reduce_windows": self.reduce_windows
+        }
 
     def summarize(self, content: str, max_length=1024):
+        return self.summarize_many([content], max_length=max_length)[0]
+
+    def summarize_many(self, contents: list[str], max_length=1024) -> list[str]:
+        """
+        Summarise many texts at once, returning their summaries in the same order.
+
+        Texts identical once their whitespace is normalised are summarised once, and with a cache only the
+        texts it has no summary of, or of a near duplicate of, are run through the model.
+        """
+        texts: list[str] = []
+        positions: list[int] = []
+        unique: dict[str, int] = {}
+        for content in contents:
+            key = text_hash(content)
+            if key not in unique:
+                unique[key] = len(texts)
+                texts.append(content)
+            positions.append(unique[key])
+
+        if self.cache is None:
+            summaries = self.summarize_uncached(texts, max_length=max_length)
+            return [summaries[position] for position in positions]
+
+        config = hashlib.sha256(
+            json.dumps({**self.model_fingerprint(), "max_length": max_length}, sort_keys=True).encode("utf-8")).hexdigest()
+        summaries = self.cache.get_many(config, texts)
+        missing = [index for index, summary in enumerate(summaries) if summary is None]
+        representatives = self.cache.representatives([texts[index] for index in missing])
+        summarise = [index for position, index in enumerate(missing) if representatives[position] == position]
+
+        summarised = self.summarize_uncached([texts[index] for index in summarise], max_length=max_length)
+        self.cache.put_many(config, [texts[index] for index in summarise], summarised)
+        for index, summary in zip(summarise, summarised):
+            summaries[index] = summary
+        for position, index in enumerate(missing):
+            summaries[index] = summaries[missing[representatives[position]]]
+
+        self.cache.stats.add(deduplicated=len(contents) - len(summarise) - (len(texts) - len(missing)))
+        return [summaries[position] for position in positions]
 
-        if len(content) <= 250:
-            return self.paraphraser.paraphrase(content)
+    def summarize_uncached(self, contents: list[str], max_length=1024) -> list[str]:
+        """
+        Summarise many texts at once with the model, returning their summaries in the same order.
 
-        chunks = self.tokenize_content(
-            content=content,
-            max_length=max_length)
-        return self.summarize_chunks(chunks=chunks)
+        Short texts are paraphrased together in batches. The windows of the other texts are sorted by
+        token length and run through the model in batches of 'batch_size', so the windows in a batch are
+        padded to similar lengths, then each text's summaries are joined back together in window order.
+        Texts with more than 'reduce_windows' windows have the joined summaries summarised again.
+        """
+        summaries = [""] * len(contents)
+        short: list[int] = []
+        long: list[int] = []
+
+        for index, content in enumerate(contents):
+            if len(content) <= self.paraphrase_length:
+                short.append(index)
+            else:
+                long.append(index)
+
+        if short:
+            paraphrases = self.paraphraser.paraphrase_many([contents[index] for index in short])
+            for index, paraphrase in zip(short, paraphrases):
+                summaries[index] = paraphrase
+
+        if not long:
+            return summaries
+
+        windows = self.tokenize_windows_many([contents[index] for index in long], max_length=max_length)
+
+        # Map: summarise every window of every text in one batched pass
+        flat = [(position, part, window)
+                for position, text_windows in enumerate(windows)
+                for part, window in enumerate(text_windows)]
+        flat.sort(key=lambda item: len(item[2]))
+        decoded = self.generate([window for position, part, window in flat])
+        parts: list[list[str]] = [[""] * len(text_windows) for text_windows in windows]
+
+        for (position, part, window), summary in zip(flat, decoded):
+            parts[position][part] = summary.strip()
+
+        reduce: list[int] = []
+        for position, index in enumerate(long):
+            summaries[index] = " ".join(part for part in parts[position] if part)
+            if len(windows[position]) > self.reduce_windows:
+                reduce.append(index)
+
+        # Reduce: summarise the joined summaries of very long texts again, as long as that shortens them
+        if reduce:
+            reduced = self.summarize_uncached([summaries[index] for index in reduce], max_length=max_length)
+            for index, summary in zip(reduce, reduced):
+                if len(summary) < len(summaries[index]):
+                    summaries[index] = summary
+
+        return summaries
 
     def tokenize_content(self, content, max_length=1024):
-        tokens = (self.summarization_pipeline.
-                  tokenizer(content,
-                            return_tensors="pt",
-                            truncation=True,
-                            padding='longest',
-                            max_length=max_length))
-        input_ids = tokens.input_ids[0]
-        chunks = []
-
-        for i in range(0, len(input_ids), max_length):
-            chunk = self.summarization_pipeline.tokenizer.decode(
-                input_ids[i:i + max_length],
-                skip_special_tokens=True)
-            chunks.append(chunk)
-
-        return chunks
-
-    def summarize_chunks(self, chunks):
+        """
+        The text of the windows the content is split into
+        """
+        tokenizer = self.tokenizer
+        return [tokenizer.decode(window, skip_special_tokens=True)
+                for window in self.tokenize_windows(content, max_length=max_length)]
+
+    def tokenize_windows(self, content: str, max_length=1024) -> list[list[int]]:
+        return self.tokenize_windows_many([content], max_length=max_length)[0]
+
+    def tokenize_windows_many(self, contents: list[str], max_length=1024) -> list[list[list[int]]]:
+        """
+        The token ids, with special tokens, of the windows each text is split into.
+
+        The sentences of all texts are tokenized in one call and packed greedily into windows of at most
+        'max_length' tokens, each starting with up to 'overlap' tokens of the previous window's last sentences.
+        """
+        tokenizer = self.tokenizer
+        window_length = max_length - tokenizer.num_special_tokens_to_add()
+        overlap = min(self.overlap, window_length // 2)
+
+        sentences = [split_sentences(content) for content in contents]
+        flat = [sentence for text_sentences in sentences for sentence in text_sentences]
+        ids = tokenizer(flat, add_special_tokens=False)['input_ids'] if flat else []
+
+        windows = []
+        offset = 0
+        for text_sentences in sentences:
+            sentence_ids = ids[offset:offset + len(text_sentences)]
+            offset += len(text_sentences)
+            windows.append([
+                tokenizer.build_inputs_with_special_tokens(window)
+                for window in self.pack_windows(sentence_ids, window_length, overlap)])
+
+        return windows
+
+    @staticmethod
+    def pack_windows(sentence_ids: list[list[int]], window_length: int, overlap: int) -> list[list[int]]:
+        """
+        Pack the token ids of consecutive sentences into windows, splitting a sentence longer than a window into overlapping slices
+        """
+        lengths = [len(ids) for ids in sentence_ids]
+        windows = []
+        start = 0
+        covered = 0
+
+        while covered < len(sentence_ids):
+            end = start
+            size = 0
+            while end < len(sentence_ids) and size + lengths[end] <= window_length:
+                size += lengths[end]
+                end += 1
+
+            if end <= covered:
+                if start < covered:
+                    # The overlap leaves no room for the next sentence, so start it without one
+                    start = covered
+                    continue
+
+                # A single sentence longer than a window
+                ids = sentence_ids[start]
+                step = window_length - overlap
+                windows.extend(ids[i:i + window_length] for i in range(0, max(1, len(ids) - overlap), step))
+                start = covered = start + 1
+                continue
+
+            windows.append([token for ids in sentence_ids[start:end] for token in ids])
+            covered = end
+
+            # Step back over the whole sentences that fit in the overlap, always moving past this window's start
+            window_start = start
+            start = end
+            repeated = 0
+            while start - 1 > window_start and repeated + lengths[start - 1] <= overlap:
+                start -= 1
+                repeated += lengths[start]
+
+        return [window for window in windows if window]
+
+    def generate(self, windows: list[list[int]]) -> list[str]:
+        """
+        Summarise every window on its own, running 'batch_size' consecutive windows through the model at once
+        """
+        import torch
+
+        model, tokenizer, device = self.loaded()
         summaries = []
-        for chunk in chunks:
-            summary = self.summarization_pipeline(
-                chunk,
-                max_length=250,
-                min_length=20,
-                length_penalty=1.5,
-                num_beams=4,
-                early_stopping=True)
-            decoded = summary[0]['summary_text']
-            summaries.append(decoded)
-
-        return ''.join(summaries)
+
+        with torch.inference_mode():
+            for start in range(0, len(windows), self.batch_size):
+                batch = windows[start:start + self.batch_size]
+                longest = max(len(window) for window in batch)
+                input_ids = torch.tensor(
+                    [window + [tokenizer.pad_token_id] * (longest - len(window)) for window in batch], device=device)
+                attention_mask = torch.tensor(
+                    [[1] * len(window) + [0] * (longest - len(window)) for window in batch], device=device)
+                with metrics.call_seconds("summarise").time():
+                    generated_ids = model.generate(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        **self.generate_kwargs)
+                summaries.extend(tokenizer.batch_decode(
+                    generated_ids,
+                    skip_special_tokens=True,
+                    clean_up_tokenization_spaces=False))
+
+        return summaries
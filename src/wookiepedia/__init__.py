@@ -2,8 +2,19 @@ import logging
 from typing import Union, Dict, Any, List
 
 from wookiepedia.output import Output
+from wookiepedia.output_stream import OutputStream, Subscription
 from wookiepedia.page_properties import PageProperties
+from wookiepedia.raw_page import RawPage
+from wookiepedia.sqlite_store import SqliteStore, connect_sqlite
+from wookiepedia.crawl_state import CrawlState
+from wookiepedia.response_cache import ResponseCache, CacheEntry, CacheStats
+from wookiepedia.shards import ShardWriter, ShardReader, ShardEntry
+from wookiepedia.link_graph import LinkGraph, link_title, infobox_links
+from wookiepedia.corpus_index import CorpusIndex, category_name
+from wookiepedia.transport import HttpTransport, TokenBucket, TransportStats
+from wookiepedia.page_builder import ProcessPoolBuilder
 from wookiepedia.page_downloader import PageDownloader
+from wookiepedia.async_crawler import AsyncCrawler, CrawlStats
 
 # Initialize the logger at the module level
 logger = logging.getLogger(__name__)
@@ -0,0 +1,152 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+
+from instrumentation import Counters, metrics
+from wookiepedia.page_downloader import PageDownloader
+from wookiepedia.types import JSON
+
+
+class CrawlStats(Counters):
+    """
+    Counters for a single crawl run
+    """
+
+    pages: int = 0
+    failures: int = 0
+    batches: int = 0
+
+    derived = ("seconds", "pages_per_second")
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+        self.finished = 0.0
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+
+class AsyncCrawler:
+    """
+    Crawls the pages with infoboxes on an asyncio event loop.
+
+    A producer walks the 'pageswithprop' batches into a bounded queue while a fixed window of
+    consumers processes pages, so the next batch is fetched while the current one is still being
+    processed and no worker waits at a batch boundary. Page requests still go through the
+    PageDownloader transport, so pooling, rate limiting and retries apply as usual.
+    """
+
+    def __init__(self,
+                 page_downloader: PageDownloader,
+                 concurrency: int | None = None,
+                 queue_size: int = 1000):
+        """
+        :param page_downloader: Downloader used to list and process the pages
+        :param concurrency: Pages in flight at once, the downloader's worker count by default
+        :param queue_size: Pages buffered ahead of the consumers, about two 'pageswithprop' batches
+        """
+        self.page_downloader = page_downloader
+        self.concurrency = concurrency if concurrency is not None else page_downloader.workers
+        self.queue_size = queue_size
+        self.stats = CrawlStats()
+        self.pending: dict[int, int] = {}
+        self.failed: dict[int, int] = {}
+        self.next_cursors: dict[int, str | None] = {}
+        self.cursor_blocked = False
+
+    def run(self) -> CrawlStats:
+        return asyncio.run(self.crawl())
+
+    async def crawl(self) -> CrawlStats:
+        os.makedirs(self.page_downloader.output_dir, exist_ok=True)
+        self.stats = CrawlStats()
+        self.pending = {}
+        self.failed = {}
+        self.next_cursors = {}
+        self.cursor_blocked = False
+
+        queue: asyncio.Queue[tuple[int, JSON] | None] = asyncio.Queue(maxsize=self.queue_size)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency + 1) as executor:
+            consumers = [asyncio.create_task(self.consume(queue, executor)) for _ in range(self.concurrency)]
+            try:
+                await self.produce(queue, executor)
+            finally:
+                for _ in consumers:
+                    await queue.put(None)
+                await asyncio.gather(*consumers)
+
+        self.stats.finished = time.perf_counter()
+        logging.info(f"Crawl stats: {self.stats.to_dict()}")
+        logging.info(f"Transport stats: {self.page_downloader.transport.stats.to_dict()}")
+        if self.page_downloader.transport.cache is not None:
+            logging.info(f"Cache stats: {self.page_downloader.transport.cache.stats.to_dict()}")
+        return self.stats
+
+    async def produce(self, queue: asyncio.Queue, executor: concurrent.futures.Executor):
+        loop = asyncio.get_running_loop()
+        crawl_state = self.page_downloader.crawl_state
+        cursor = (crawl_state.get_cursor() if crawl_state is not None else None) or 1
+
+        while cursor is not None:
+            pages, cursor = await loop.run_in_executor(
+                executor, self.page_downloader.get_pages_with_infoboxes, cursor)
+            pages = await loop.run_in_executor(
+                executor, self.page_downloader.filter_changed_pages, pages)
+
+            batch = self.stats.batches
+            self.stats.batches += 1
+            self.pending[batch] = len(pages)
+            self.failed[batch] = 0
+            self.next_cursors[batch] = cursor
+
+            for page in pages:
+                await queue.put((batch, page))
+                metrics.queue_depth("crawl").set(queue.qsize())
+
+            self.complete_batches()
+
+    async def consume(self, queue: asyncio.Queue, executor: concurrent.futures.Executor):
+        loop = asyncio.get_running_loop()
+
+        while (item := await queue.get()) is not None:
+            metrics.queue_depth("crawl").set(queue.qsize())
+            batch, page = item
+            try:
+                await loop.run_in_executor(executor, self.page_downloader.process_page, page)
+                self.stats.pages += 1
+            except Exception:
+                self.stats.failures += 1
+                self.failed[batch] += 1
+                logging.exception(f"Failed to process page {page.get('title')}")
+            finally:
+                self.pending[batch] -= 1
+                self.complete_batches()
+
+    def complete_batches(self):
+        """
+        Save the cursor after each batch once it and every batch before it have been processed.
+
+        The cursor is not moved past the first batch with a failed page, so the next run lists that batch
+        again and retries its failed pages, while the pages written since are skipped as unchanged.
+        """
+        while self.pending and self.pending[min(self.pending)] == 0:
+            batch = min(self.pending)
+            del self.pending[batch]
+            cursor = self.next_cursors.pop(batch)
+
+            if self.failed.pop(batch):
+                if not self.cursor_blocked:
+                    logging.warning(f"Batch {batch} has failed pages, the next run resumes from it")
+                self.cursor_blocked = True
+
+            if self.page_downloader.crawl_state is not None and not self.cursor_blocked:
+                self.page_downloader.crawl_state.set_cursor(cursor)
@@ -0,0 +1,285 @@
+import array
+import bisect
+import gzip
+import json
+import logging
+import mmap
+import os
+import sys
+from typing import Iterable, Iterator
+
+from wookiepedia.shards import ShardReader
+from wookiepedia.types import JSON
+
+
+def category_name(category: str) -> str:
+    """
+    A category as stored on the pages: 'Category:Jedi Masters' becomes 'Jedi_Masters'
+    """
+    if category.startswith("Category:"):
+        category = category[len("Category:"):]
+    return category.strip().replace(" ", "_")
+
+
+class CorpusIndex:
+    """
+    An inverted index of the crawl output, from category and template to page ids, and from page id and title
+    to where the page's record is stored, so subsets of the corpus are selected without opening every file.
+
+    The index is a single file: a JSON header with the category and template names, followed by arrays that are
+    memory-mapped, not read, when the index is opened. The page ids of every category and template are a sorted
+    slice of one postings array; the titles and locations are string tables with an array of offsets, and a
+    permutation of the pages sorted by title serves title lookups by binary search.
+    """
+
+    magic: bytes = b"WCI1"
+    file_name: str = ".corpus.index"
+
+    def __init__(self, path: str):
+        """
+        :param path: Index file written by 'build'
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffers: list[memoryview] = []
+        self._views: dict[str, memoryview] = {}
+
+        if self._map[:len(self.magic)] != self.magic:
+            self.close()
+            raise ValueError(f"{path} is not a corpus index")
+        header_length = int.from_bytes(self._map[len(self.magic):len(self.magic) + 8], "little")
+        header_start = len(self.magic) + 8
+        header = json.loads(self._map[header_start:header_start + header_length])
+
+        if header["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError(f"{path} was built on a machine of another byte order, build it again")
+
+        self.directory = os.path.join(os.path.dirname(path), header["directory"])
+        self.shards: bool = header["shards"]
+        self.categories: dict[str, tuple[int, int]] = {name: tuple(span) for name, span in header["categories"].items()}
+        self.templates: dict[str, tuple[int, int]] = {name: tuple(span) for name, span in header["templates"].items()}
+        for name, typecode, start, length in header["sections"]:
+            self._buffers.append(memoryview(self._map)[start:start + length])
+            self._views[name] = self._buffers[-1].cast(typecode) if typecode is not None else self._buffers[-1]
+
+    @classmethod
+    def default_path(cls, input_dir: str) -> str:
+        return os.path.join(input_dir, cls.file_name)
+
+    @classmethod
+    def open(cls, input_dir: str) -> "CorpusIndex":
+        """
+        Open the index of a crawl output directory
+        """
+        return cls(cls.default_path(input_dir))
+
+    @classmethod
+    def build(cls, input_dir: str, path: str | None = None) -> str:
+        """
+        Index the raw JSON files of a directory, or the records of the shards in it, and return the index file
+        """
+        path = path or cls.default_path(input_dir)
+        pages = sorted(cls.read_pages(input_dir), key=lambda page: page[0])
+
+        page_ids = array.array("q", (page[0] for page in pages))
+        if len(set(page_ids)) != len(page_ids):
+            raise ValueError(f"{input_dir} has several records of the same page id")
+
+        titles, title_offsets = cls.string_table(page[1] for page in pages)
+        locations, location_offsets = cls.string_table(page[4] for page in pages)
+        offsets = array.array("Q", (page[5] for page in pages))
+        lengths = array.array("Q", (page[6] for page in pages))
+        title_order = array.array("I", sorted(range(len(pages)), key=lambda row: pages[row][1]))
+
+        postings = array.array("q")
+        spans = {"categories": {}, "templates": {}}
+        keys = {"categories": {}, "templates": {}}
+        for page_id, title, template, categories, *location in pages:
+            for category in categories:
+                keys["categories"].setdefault(category, []).append(page_id)
+            if template is not None:
+                keys["templates"].setdefault(template, []).append(page_id)
+        for kind, ids_by_key in keys.items():
+            for key in sorted(ids_by_key):
+                spans[kind][key] = (len(postings), len(ids_by_key[key]))
+                postings.extend(ids_by_key[key])
+
+        sections = {
+            "page_ids": page_ids,
+            "title_offsets": title_offsets,
+            "titles": titles,
+            "location_offsets": location_offsets,
+            "locations": locations,
+            "offsets": offsets,
+            "lengths": lengths,
+            "title_order": title_order,
+            "postings": postings
+        }
+        cls.write(path, sections, {
+            "byteorder": sys.byteorder,
+            "directory": os.path.relpath(input_dir, os.path.dirname(os.path.abspath(path))),
+            "shards": ShardReader.is_shard_directory(input_dir),
+            "categories": spans["categories"],
+            "templates": spans["templates"]
+        })
+        logging.info(f"Indexed {len(pages)} pages in {len(spans['categories'])} categories "
+                     f"and {len(spans['templates'])} templates to {path}")
+        return path
+
+    @staticmethod
+    def read_pages(input_dir: str) -> Iterator[tuple[int, str, str | None, list[str], str, int, int]]:
+        """
+        The page id, title, template, categories and location (file or shard, offset, length) of every record
+        """
+        def describe(data: JSON) -> tuple[int, str, str | None, list[str]]:
+            return data["id"], data["title"], (data.get("infobox") or {}).get("template"), data.get("categories", [])
+
+        if ShardReader.is_shard_directory(input_dir):
+            reader = ShardReader(input_dir)
+            try:
+                for entry, data in reader.iter_records():
+                    yield *describe(data), entry.shard, entry.offset, entry.length
+            finally:
+                reader.close()
+            return
+
+        for root, dirs, files in os.walk(input_dir):
+            for file in files:
+                if file.endswith(".json"):
+                    file_path = os.path.join(root, file)
+                    with open(file_path, "r") as input:
+                        data = json.load(input)
+                    yield *describe(data), os.path.relpath(file_path, input_dir), 0, os.path.getsize(file_path)
+
+    @staticmethod
+    def string_table(strings: Iterable[str]) -> tuple[bytes, array.array]:
+        """
+        The strings encoded one after the other, and the offset of each followed by the end of the last
+        """
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = array.array("Q", [0])
+        for string in encoded:
+            offsets.append(offsets[-1] + len(string))
+        return b"".join(encoded), offsets
+
+    @classmethod
+    def write(cls, path: str, sections: dict[str, array.array | bytes], header: JSON):
+        """
+        Write the header and the sections, each aligned to 8 bytes so they can be cast in place once mapped
+        """
+        def align(position: int) -> int:
+            return (position + 7) // 8 * 8
+
+        # The header holds the positions of the sections, which depend on the length of the header
+        layout = []
+        header_length = 0
+        while True:
+            position = align(len(cls.magic) + 8 + header_length)
+            layout = []
+            for name, values in sections.items():
+                length = len(values) * values.itemsize if isinstance(values, array.array) else len(values)
+                layout.append((name, values.typecode if isinstance(values, array.array) else None, position, length))
+                position = align(position + length)
+            encoded = json.dumps({**header, "sections": layout}).encode("utf-8")
+            if len(encoded) == header_length:
+                break
+            header_length = len(encoded)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as output:
+            output.write(cls.magic)
+            output.write(header_length.to_bytes(8, "little"))
+            output.write(encoded)
+            for (name, typecode, start, length), values in zip(layout, sections.values()):
+                output.write(bytes(start - output.tell()))
+                output.write(values.tobytes() if isinstance(values, array.array) else values)
+        os.replace(path + ".tmp", path)
+
+    def __len__(self) -> int:
+        return len(self._views["page_ids"])
+
+    def __enter__(self) -> "CorpusIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def pages(self, category: str | None = None, template: str | None = None) -> list[int]:
+        """
+        The sorted page ids in a category and of a template, all the pages when neither is given
+        """
+        selected = None
+        if category is not None:
+            selected = self._postings(self.categories.get(category_name(category)))
+        if template is not None:
+            of_template = self._postings(self.templates.get(template))
+            selected = of_template if selected is None else sorted(set(selected).intersection(of_template))
+        return selected if selected is not None else self._views["page_ids"].tolist()
+
+    def category_counts(self) -> dict[str, int]:
+        return {name: count for name, (start, count) in self.categories.items()}
+
+    def template_counts(self) -> dict[str, int]:
+        return {name: count for name, (start, count) in self.templates.items()}
+
+    def row(self, page_id: int) -> int | None:
+        page_ids = self._views["page_ids"]
+        row = bisect.bisect_left(page_ids, page_id)
+        return row if row < len(page_ids) and page_ids[row] == page_id else None
+
+    def title(self, page_id: int) -> str | None:
+        row = self.row(page_id)
+        return self._string("titles", row) if row is not None else None
+
+    def find(self, title: str) -> int | None:
+        """
+        The page id of a title, found by binary search over the titles in order
+        """
+        order = self._views["title_order"]
+        position = bisect.bisect_left(order, title, key=lambda row: self._string("titles", row))
+        if position < len(order) and self._string("titles", order[position]) == title:
+            return self._views["page_ids"][order[position]]
+        return None
+
+    def locate(self, page_id: int) -> tuple[str, int, int] | None:
+        """
+        The file holding a page's record, relative to the indexed directory, and the offset and length of the record
+        """
+        row = self.row(page_id)
+        if row is None:
+            return None
+        return self._string("locations", row), self._views["offsets"][row], self._views["lengths"][row]
+
+    def read(self, page_id: int) -> JSON | None:
+        """
+        The record of a page, read from its raw file or shard
+        """
+        location = self.locate(page_id)
+        if location is None:
+            return None
+        file, offset, length = location
+        with open(os.path.join(self.directory, file), "rb") as input:
+            input.seek(offset)
+            data = input.read(length)
+        return json.loads(gzip.decompress(data) if self.shards else data)
+
+    def close(self):
+        # The views must be released before the map they point into can be closed
+        for view in [*self._views.values(), *self._buffers]:
+            view.release()
+        self._views = {}
+        self._buffers = []
+        self._map.close()
+        self._file.close()
+
+    def _postings(self, span: tuple[int, int] | None) -> list[int]:
+        if span is None:
+            return []
+        start, count = span
+        return self._views["postings"][start:start + count].tolist()
+
+    def _string(self, table: str, row: int) -> str:
+        offsets = self._views[f"{table[:-1]}_offsets"]
+        return bytes(self._views[table][offsets[row]:offsets[row + 1]]).decode("utf-8")
@@ -0,0 +1,118 @@
+import os
+import time
+
+from wookiepedia.shards import ShardReader
+from wookiepedia.sqlite_store import SqliteStore
+
+
+class CrawlState(SqliteStore):
+    """
+    A SQLite store of crawl progress, used to resume an interrupted crawl and to skip pages that have not changed.
+
+    It records the 'pwpcontinue' cursor of the next batch to crawl, and for every page its
+    revision id, 'touched' timestamp and the file its output was written to, or the shard directory
+    for pages written to shards, since compaction moves their records between shard files.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS cursors (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            page_id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            revision_id INTEGER,
+            touched TEXT,
+            output_path TEXT,
+            crawled_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = "output/crawl_state.sqlite"):
+        super().__init__(path)
+
+    def get_cursor(self, name: str = "pageswithprop") -> str | None:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, value: str | int | None, name: str = "pageswithprop"):
+        with self._lock:
+            if value is None:
+                self._connection.execute("DELETE FROM cursors WHERE name = ?", (name,))
+            else:
+                self._connection.execute(
+                    "INSERT INTO cursors (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                    (name, str(value)))
+            self._connection.commit()
+
+    def get_pages(self, page_ids: list[int]) -> dict[int, tuple[int | None, str | None, str | None]]:
+        """
+        Look up the recorded (revision id, touched, output path) of the given pages
+        """
+        if not page_ids:
+            return {}
+
+        placeholders = ",".join("?" * len(page_ids))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT page_id, revision_id, touched, output_path FROM pages WHERE page_id IN ({placeholders})",
+                page_ids).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def unchanged_page_ids(self, revisions: dict[int, tuple[int | None, str | None]]) -> set[int]:
+        """
+        Find the pages whose (revision id, touched) matches what was recorded when their output was last written
+        """
+        recorded = self.get_pages(list(revisions))
+        outputs = {}
+
+        for page_id, (revision_id, touched) in revisions.items():
+            if page_id not in recorded or revision_id is None:
+                continue
+
+            recorded_revision, recorded_touched, output_path = recorded[page_id]
+            if recorded_revision == revision_id and recorded_touched == touched and output_path is not None:
+                outputs[page_id] = output_path
+
+        return self.existing_outputs(outputs)
+
+    @staticmethod
+    def existing_outputs(outputs: dict[int, str]) -> set[int]:
+        """
+        The pages whose recorded output still exists: its file, or its record in the index of a shard directory
+        """
+        existing = set()
+        shard_pages: dict[str, list[int]] = {}
+
+        for page_id, output_path in outputs.items():
+            if os.path.isdir(output_path) and ShardReader.is_shard_directory(output_path):
+                shard_pages.setdefault(output_path, []).append(page_id)
+            elif os.path.exists(output_path):
+                existing.add(page_id)
+
+        for directory, page_ids in shard_pages.items():
+            reader = ShardReader(directory)
+            try:
+                existing.update(reader.indexed(page_ids))
+            finally:
+                reader.close()
+
+        return existing
+
+    def record_page(self,
+                    page_id: int,
+                    title: str,
+                    revision_id: int | None,
+                    touched: str | None,
+                    output_path: str | None):
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO pages (page_id, title, revision_id, touched, output_path, crawled_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET title = excluded.title, revision_id = excluded.revision_id, "
+                "touched = excluded.touched, output_path = excluded.output_path, crawled_at = excluded.crawled_at",
+                (page_id, title, revision_id, touched, output_path, time.time()))
+            self._connection.commit()
@@ -0,0 +1,158 @@
+import html
+import re
+
+"""
+Elements that never have content, so they are never left open
+"""
+VOID_ELEMENTS = frozenset([
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image", "img",
+    "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr"
+])
+
+"""
+Elements whose content is raw text that is never part of the extracted text
+"""
+RAW_TEXT_ELEMENTS = frozenset(["script", "style"])
+
+_token_pattern = re.compile(
+    r'<!--.*?-->'
+    r'|<(?P<end>/?)(?P<name>[a-zA-Z][^\t\n\r\f />\x00]*)(?P<attrs>(?:[^>"\']|"[^"]*"|\'[^\']*\')*)>'
+    r'|<!\[CDATA\[(?P<cdata>.*?)\]\]>'
+    r'|<![^>]*>'
+    r'|<\?[^>]*>',
+    re.DOTALL)
+
+_attribute_pattern = re.compile(
+    r'([^\s/>"\'=][^\s/>=]*)(?:\s*=+\s*(\'[^\']*\'|"[^"]*"|(?![\'"])[^>\s]*))?')
+
+_raw_text_end_patterns = {name: re.compile(rf'</{name}\s*>', re.IGNORECASE) for name in RAW_TEXT_ELEMENTS}
+
+
+class _Link:
+    __slots__ = ("href", "parts")
+
+    def __init__(self, href: str):
+        self.href = href
+        self.parts: list[str] = []
+
+
+def parse_attributes(attrs: str) -> dict[str, str]:
+    attributes = {}
+    for name, value in _attribute_pattern.findall(attrs):
+        if value[:1] in ("'", '"') and value[:1] == value[-1:]:
+            value = value[1:-1]
+        attributes[name.lower()] = html.unescape(value) if value else ""
+    return attributes
+
+
+def _append_text(text: str, strings: list[str], open_links: list[_Link]):
+    text = text.strip()
+    if text:
+        strings.append(text)
+        for link in open_links:
+            link.parts.append(text)
+
+
+def _scan(fragment: str, skip: frozenset[str], links: list[_Link] | None) -> list[str]:
+    """
+    Walk an HTML fragment without building a tree and return its stripped, non-empty text nodes.
+
+    Text inside 'skip' elements is left out, as if those elements had been decomposed.
+    When 'links' is given, every <a href> outside a skipped element is appended to it with its own text nodes.
+    Unmatched end tags are ignored and an end tag closes every element opened after its start tag,
+    which is how BeautifulSoup's html.parser tree builder nests the same markup.
+    """
+    strings: list[str] = []
+    stack: list[tuple[str, _Link | None]] = []
+    open_links: list[_Link] = []
+    skipped = 0
+    position = 0
+    length = len(fragment)
+
+    while position < length:
+        match = _token_pattern.search(fragment, position)
+        end = match.start() if match is not None else length
+
+        if end > position and not skipped:
+            text = fragment[position:end]
+            if "&" in text:
+                text = html.unescape(text)
+            _append_text(text, strings, open_links)
+
+        if match is None:
+            break
+
+        position = match.end()
+        name = match.group("name")
+
+        if name is None:
+            cdata = match.group("cdata")
+            if cdata is not None and not skipped:
+                _append_text(cdata, strings, open_links)
+            continue
+
+        name = name.lower()
+
+        if match.group("end"):
+            for index in range(len(stack) - 1, -1, -1):
+                if stack[index][0] == name:
+                    for open_name, link in stack[index:]:
+                        if open_name in skip:
+                            skipped -= 1
+                        if link is not None:
+                            open_links.remove(link)
+                    del stack[index:]
+                    break
+            continue
+
+        if name in RAW_TEXT_ELEMENTS:
+            raw_end = _raw_text_end_patterns[name].search(fragment, position)
+            position = raw_end.end() if raw_end is not None else length
+            continue
+
+        link = None
+        attrs = match.group("attrs")
+
+        if name == "a" and links is not None and not skipped and "href" in attrs.lower():
+            attributes = parse_attributes(attrs)
+            if "href" in attributes:
+                link = _Link(attributes["href"])
+                links.append(link)
+
+        if name in VOID_ELEMENTS or attrs.endswith("/"):
+            continue
+
+        stack.append((name, link))
+        if name in skip:
+            skipped += 1
+        if link is not None:
+            open_links.append(link)
+
+    return strings
+
+
+def strings(fragment: str, skip: frozenset[str] = frozenset()) -> list[str]:
+    """
+    The stripped, non-empty text nodes of an HTML fragment, outside the 'skip' elements
+    """
+    return _scan(fragment, skip, None)
+
+
+def strings_and_links(fragment: str, skip: frozenset[str] = frozenset()) -> tuple[list[str], list[tuple[str, str]]]:
+    """
+    The text nodes of an HTML fragment and the (href, text) of its links, outside the 'skip' elements
+    """
+    links: list[_Link] = []
+    text = _scan(fragment, skip, links)
+    return text, [(link.href, "".join(link.parts)) for link in links]
+
+
+def find_attributes(fragment: str, tag: str) -> dict[str, str] | None:
+    """
+    The attributes of the first 'tag' element in an HTML fragment
+    """
+    for match in _token_pattern.finditer(fragment):
+        name = match.group("name")
+        if name is not None and not match.group("end") and name.lower() == tag:
+            return parse_attributes(match.group("attrs"))
+    return None
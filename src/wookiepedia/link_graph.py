@@ -0,0 +1,295 @@
+import array
+import json
+import logging
+import os
+import re
+import sys
+import urllib.parse
+from collections import deque
+from typing import Iterable, Iterator
+
+from wookiepedia.shards import ShardReader
+from wookiepedia.types import JSON
+
+"""
+Namespaces of links that do not point to articles
+"""
+IGNORED_NAMESPACES = frozenset(["Category", "File", "Forum", "Help", "Module", "Special", "Template", "User", "Wookieepedia"])
+
+_article_path = re.compile(r"^/wiki/([^?#]+)")
+
+
+def link_title(href: str) -> str | None:
+    """
+    The title of the article a link points to, or None for a link outside the articles
+    """
+    match = _article_path.match(href)
+    if match is None:
+        return None
+    title = urllib.parse.unquote(match.group(1)).replace("_", " ").strip()
+    if ":" in title and title.split(":", 1)[0] in IGNORED_NAMESPACES:
+        return None
+    return title or None
+
+
+def infobox_links(data: JSON) -> Iterator[str]:
+    """
+    The titles linked from the values of a raw page's infobox
+    """
+    infobox = (data.get("infobox") or {}).get("infobox", {})
+    for group, items in infobox.items():
+        if not isinstance(items, dict):
+            continue
+        for label, item in items.items():
+            for link in item.get("links", []):
+                title = link_title(link.get("href", ""))
+                if title is not None:
+                    yield title
+
+
+class LinkGraph:
+    """
+    An index of the links between pages, built once the pages are crawled.
+
+    Every title, crawled or only linked to, is interned to a node number. The edges are stored in arrays, once
+    by source and once by target, as compressed sparse rows: the neighbours of node n are
+    'targets[offsets[n]:offsets[n + 1]]', so answering which pages link to another is a slice, not a scan of the
+    raw files. Only infobox links are indexed, as the sections are stored as plain text without their links.
+    """
+
+    magic: bytes = b"WLG1"
+
+    def __init__(self,
+                 titles: list[str],
+                 page_ids: array.array,
+                 templates: list[str],
+                 node_templates: array.array,
+                 offsets: array.array,
+                 targets: array.array,
+                 reverse_offsets: array.array,
+                 sources: array.array):
+        """
+        :param titles: Title of every node
+        :param page_ids: Page id of every node, -1 for a title that was linked to but not crawled
+        :param templates: Infobox templates of the crawled pages
+        :param node_templates: Index in 'templates' of every node's template, -1 for none
+        :param offsets: Start of every node's outgoing edges in 'targets', and the number of edges last
+        :param targets: Target node of every edge, grouped by source
+        :param reverse_offsets: Start of every node's incoming edges in 'sources', and the number of edges last
+        :param sources: Source node of every edge, grouped by target
+        """
+        self.titles = titles
+        self.page_ids = page_ids
+        self.templates = templates
+        self.node_templates = node_templates
+        self.offsets = offsets
+        self.targets = targets
+        self.reverse_offsets = reverse_offsets
+        self.sources = sources
+        self.nodes = {title: node for node, title in enumerate(titles)}
+        self.template_numbers = {template: number for number, template in enumerate(templates)}
+
+    @classmethod
+    def build(cls, records: Iterable[JSON]) -> "LinkGraph":
+        """
+        Index the infobox links of raw page records
+        """
+        nodes: dict[str, int] = {}
+        titles: list[str] = []
+        page_ids = array.array("q")
+        templates: dict[str, int] = {}
+        node_templates = array.array("h")
+        edge_sources = array.array("I")
+        edge_targets = array.array("I")
+
+        def intern(title: str) -> int:
+            node = nodes.get(title)
+            if node is None:
+                node = nodes[title] = len(titles)
+                titles.append(title)
+                page_ids.append(-1)
+                node_templates.append(-1)
+            return node
+
+        for data in records:
+            node = intern(data["title"])
+            page_ids[node] = data.get("id", -1)
+            template = (data.get("infobox") or {}).get("template")
+            if template is not None:
+                node_templates[node] = templates.setdefault(template, len(templates))
+
+            for target in sorted({intern(title) for title in infobox_links(data)} - {node}):
+                edge_sources.append(node)
+                edge_targets.append(target)
+
+        offsets, targets = cls.compress(len(titles), edge_sources, edge_targets)
+        reverse_offsets, sources = cls.compress(len(titles), edge_targets, edge_sources)
+        return cls(titles, page_ids, list(templates), node_templates, offsets, targets, reverse_offsets, sources)
+
+    @classmethod
+    def from_directory(cls, input_dir: str) -> "LinkGraph":
+        """
+        Index the raw JSON files of a directory, or the records of the shards in it
+        """
+        return cls.build(cls.read_directory(input_dir))
+
+    @staticmethod
+    def read_directory(input_dir: str) -> Iterator[JSON]:
+        if ShardReader.is_shard_directory(input_dir):
+            reader = ShardReader(input_dir)
+            try:
+                for entry, data in reader.iter_records():
+                    yield data
+            finally:
+                reader.close()
+            return
+
+        for root, dirs, files in os.walk(input_dir):
+            for file in sorted(files):
+                if file.endswith(".json"):
+                    with open(os.path.join(root, file), "r") as input:
+                        yield json.load(input)
+
+    @staticmethod
+    def compress(node_count: int, keys: array.array, values: array.array) -> tuple[array.array, array.array]:
+        """
+        Group the values by key with a counting sort, returning the start of every key's values and the values
+        """
+        offsets = array.array("I", bytes(4 * (node_count + 1)))
+        for key in keys:
+            offsets[key + 1] += 1
+        for node in range(node_count):
+            offsets[node + 1] += offsets[node]
+
+        grouped = array.array("I", bytes(4 * len(values)))
+        positions = offsets[:-1]
+        for key, value in zip(keys, values):
+            grouped[positions[key]] = value
+            positions[key] += 1
+        return offsets, grouped
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def node(self, title: str) -> int | None:
+        return self.nodes.get(title)
+
+    def page_id(self, title: str) -> int | None:
+        """
+        The page id of a title, None when it was not crawled
+        """
+        node = self.nodes.get(title)
+        if node is None or self.page_ids[node] < 0:
+            return None
+        return self.page_ids[node]
+
+    def template(self, title: str) -> str | None:
+        node = self.nodes.get(title)
+        if node is None or self.node_templates[node] < 0:
+            return None
+        return self.templates[self.node_templates[node]]
+
+    def neighbours(self, title: str, template: str | None = None) -> list[str]:
+        """
+        The titles a page links to, only the pages of 'template' if given
+        """
+        return self._adjacent(title, self.offsets, self.targets, template)
+
+    def linked_from(self, title: str, template: str | None = None) -> list[str]:
+        """
+        The titles of the pages linking to a title, only the pages of 'template' if given
+        """
+        return self._adjacent(title, self.reverse_offsets, self.sources, template)
+
+    def expand(self, title: str, hops: int = 2, reverse: bool = False, template: str | None = None) -> dict[str, int]:
+        """
+        The titles reachable from a title in at most 'hops' links, or reaching it with 'reverse', and their distance.
+        With 'template', only the pages of that template are returned, though the others are still followed.
+        """
+        start = self.nodes.get(title)
+        if start is None:
+            return {}
+
+        offsets, edges = (self.reverse_offsets, self.sources) if reverse else (self.offsets, self.targets)
+        wanted = self.template_numbers.get(template, -2) if template is not None else None
+        distances = {start: 0}
+        queue = deque([start])
+
+        while queue:
+            node = queue.popleft()
+            distance = distances[node]
+            if distance == hops:
+                continue
+            for neighbour in edges[offsets[node]:offsets[node + 1]]:
+                if neighbour not in distances:
+                    distances[neighbour] = distance + 1
+                    queue.append(neighbour)
+
+        return {
+            self.titles[node]: distance
+            for node, distance in distances.items()
+            if node != start and (wanted is None or self.node_templates[node] == wanted)
+        }
+
+    def _adjacent(self, title: str, offsets: array.array, edges: array.array, template: str | None) -> list[str]:
+        node = self.nodes.get(title)
+        if node is None:
+            return []
+        adjacent = edges[offsets[node]:offsets[node + 1]]
+        if template is not None:
+            wanted = self.template_numbers.get(template, -2)
+            adjacent = [neighbour for neighbour in adjacent if self.node_templates[neighbour] == wanted]
+        return [self.titles[neighbour] for neighbour in adjacent]
+
+    def save(self, path: str):
+        """
+        Write the index to a file: a JSON header with the titles and templates, followed by the raw arrays
+        """
+        arrays = self._arrays()
+        header = json.dumps({
+            "byteorder": sys.byteorder,
+            "titles": self.titles,
+            "templates": self.templates,
+            "arrays": [(name, values.typecode, len(values)) for name, values in arrays.items()]
+        }).encode("utf-8")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as output:
+            output.write(self.magic)
+            output.write(len(header).to_bytes(8, "little"))
+            output.write(header)
+            for values in arrays.values():
+                values.tofile(output)
+        os.replace(path + ".tmp", path)
+        logging.info(f"Saved a link graph of {len(self)} titles and {self.edge_count} links to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "LinkGraph":
+        with open(path, "rb") as input:
+            if input.read(len(cls.magic)) != cls.magic:
+                raise ValueError(f"{path} is not a link graph")
+            header = json.loads(input.read(int.from_bytes(input.read(8), "little")))
+
+            arrays = {}
+            for name, typecode, length in header["arrays"]:
+                values = array.array(typecode)
+                values.fromfile(input, length)
+                if header["byteorder"] != sys.byteorder:
+                    values.byteswap()
+                arrays[name] = values
+
+        return cls(titles=header["titles"], templates=header["templates"], **arrays)
+
+    def _arrays(self) -> dict[str, array.array]:
+        return {
+            "page_ids": self.page_ids,
+            "node_templates": self.node_templates,
+            "offsets": self.offsets,
+            "targets": self.targets,
+            "reverse_offsets": self.reverse_offsets,
+            "sources": self.sources
+        }
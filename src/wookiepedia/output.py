@@ -31,6 +31,6 @@ class Output:
             "title": self.title,
             "id": self.page_id,
             "sections": self.sections,
-            "categories": list(self.categories),
+            "categories": sorted(self.categories),
             "infobox": self.infobox
         }
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from typing import Iterator
+
+from instrumentation import metrics
+from wookiepedia.output import Output
+
+
+class Subscription:
+    """
+    The bounded queue of one consumer of an OutputStream, iterated until the stream is closed
+    """
+
+    name: str
+    maxsize: int
+
+    """
+    Put in the queue once the stream is closed
+    """
+    end = object()
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.cancelled = threading.Event()
+        self.received = 0
+        self._depth = metrics.queue_depth(f"stream_{name}")
+        self._put_wait = metrics.queue_wait_seconds(f"stream_{name}", "put")
+        self._get_wait = metrics.queue_wait_seconds(f"stream_{name}", "get")
+
+    def put(self, item: Output | object):
+        """
+        Queue an item, blocking while the queue is full, or drop it once the consumer has cancelled
+        """
+        start = time.perf_counter()
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self._put_wait.observe(time.perf_counter() - start)
+        self._depth.set(self.queue.qsize())
+
+    def __iter__(self) -> Iterator[Output]:
+        while True:
+            start = time.perf_counter()
+            item = self.queue.get()
+            self._get_wait.observe(time.perf_counter() - start)
+            self._depth.set(self.queue.qsize())
+            if item is self.end:
+                return
+            self.received += 1
+            yield item
+
+    def cancel(self):
+        """
+        Stop receiving, so a consumer that failed or finished early never blocks the producer
+        """
+        self.cancelled.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self._depth.set(0)
+
+
+class OutputStream:
+    """
+    Hands the Outputs of a crawl to the stages processing them while the crawl is still running.
+
+    Every consumer subscribes before the crawl starts and reads its own bounded queue, so a slow consumer
+    applies backpressure: once its queue holds 'maxsize' outputs, the downloading threads wait for it
+    instead of buffering the crawl in memory. Closing the stream ends the iteration of every subscription
+    once the outputs before it are consumed.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        """
+        :param maxsize: Outputs waiting in the queue of a consumer before the producer blocks
+        """
+        self.maxsize = maxsize
+        self.subscriptions: list[Subscription] = []
+        self.published = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def subscribe(self, name: str) -> Subscription:
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"Cannot subscribe {name} to a closed stream")
+            subscription = Subscription(name, self.maxsize)
+            self.subscriptions.append(subscription)
+            return subscription
+
+    def publish(self, output: Output):
+        """
+        Queue an output for every consumer, blocking while any of their queues is full
+        """
+        if self._closed:
+            raise ValueError("Cannot publish to a closed stream")
+        for subscription in self.subscriptions:
+            subscription.put(output)
+        with self._lock:
+            self.published += 1
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for subscription in self.subscriptions:
+            subscription.put(Subscription.end)
@@ -0,0 +1,114 @@
+import concurrent.futures
+import logging
+import threading
+import time
+
+from wookiepedia.output import Output
+from wookiepedia.raw_page import RawPage
+
+
+def build_outputs(downloader_class: type, raw_pages: list[RawPage]) -> list[Output | Exception]:
+    """
+    Build the outputs of a batch of downloaded pages, called in a worker process.
+    A page that fails gets its exception in place of its output, so it does not fail the rest of the batch.
+    """
+    outputs = []
+    for raw_page in raw_pages:
+        try:
+            outputs.append(downloader_class.build_output(raw_page))
+        except Exception as e:
+            outputs.append(e)
+    return outputs
+
+
+class ProcessPoolBuilder:
+    """
+    Builds page outputs on a pool of processes, so HTML cleanup and infobox parsing are not serialized by the GIL.
+
+    Downloaded pages are sent to the workers in batches to amortise the pickling round trip.
+    A partial batch is sent once its oldest page has waited 'linger' seconds, so callers
+    blocked on 'build' never wait for a batch that cannot fill up.
+    """
+
+    def __init__(self,
+                 downloader_class: type,
+                 processes: int | None = None,
+                 batch_size: int = 8,
+                 linger: float = 0.05):
+        """
+        :param downloader_class: Class whose 'build_output' is called in the workers
+        :param processes: Number of worker processes, the number of CPUs by default
+        :param batch_size: Pages sent to a worker at once
+        :param linger: Seconds a partial batch waits for more pages before it is sent
+        """
+        self.downloader_class = downloader_class
+        self.batch_size = batch_size
+        self.linger = linger
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+        self._pending: list[tuple[RawPage, concurrent.futures.Future]] = []
+        self._pending_since = 0.0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def build(self, raw_page: RawPage) -> Output:
+        return self.submit(raw_page).result()
+
+    def submit(self, raw_page: RawPage) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+
+        with self._lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append((raw_page, future))
+            if len(self._pending) >= self.batch_size:
+                self._send()
+
+        return future
+
+    def flush(self):
+        with self._lock:
+            self._send()
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+        self.executor.shutdown(wait=True)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.linger):
+            with self._lock:
+                if self._pending and time.monotonic() - self._pending_since >= self.linger:
+                    self._send()
+
+    def _send(self):
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        futures = [future for raw_page, future in batch]
+
+        try:
+            batch_future = self.executor.submit(build_outputs, self.downloader_class, [raw_page for raw_page, future in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        def resolve(completed: concurrent.futures.Future):
+            try:
+                outputs = completed.result()
+            except Exception as e:
+                logging.error(f"Failed to build a batch of {len(futures)} pages: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                return
+
+            for future, output in zip(futures, outputs):
+                if isinstance(output, Exception):
+                    future.set_exception(output)
+                else:
+                    future.set_result(output)
+
+        batch_future.add_done_callback(resolve)
@@ -1,12 +1,20 @@
 import concurrent.futures
+import html as html_lib
 import json
 import logging
 import os
 import re
-import requests
+from datetime import datetime
 from urllib.parse import urlencode
-from bs4 import BeautifulSoup
 from wookiepedia import Output, PageProperties
+from wookiepedia import html_fragment, text_normalisation
+from wookiepedia.crawl_state import CrawlState
+from wookiepedia.output_stream import OutputStream
+from wookiepedia.page_builder import ProcessPoolBuilder
+from wookiepedia.raw_page import RawPage
+from wookiepedia.response_cache import ResponseCache
+from wookiepedia.shards import ShardWriter
+from wookiepedia.transport import HttpTransport
 from wookiepedia.types import JSON
 
 
@@ -17,9 +25,13 @@ class PageDownloader:
 
     url: str = "https://starwars.fandom.com/api.php"
     trim: str = "\"',.:-"
-    value_elems = ["sup", "br", "li"]
     output_dir = "output/raw"
 
+    """
+    Elements left out of infobox labels and values, such as reference markers
+    """
+    ignore_elems = frozenset(["sup"])
+
     """
     Sections to ignore when requesting 'sections' from the API
     """
@@ -34,73 +46,245 @@ class PageDownloader:
         "Non-canon sources"
     ]
 
-    def __init__(self, output_dir: str = "output/raw"):
+    """
+    Patterns used to locate section headings in the rendered page HTML
+    """
+    heading_pattern = re.compile(r'<h([1-6])\b[^>]*>.*?</h\1\s*>', re.IGNORECASE | re.DOTALL)
+    heading_id_pattern = re.compile(r'\bid="([^"]*)"')
+
+    def __init__(self,
+                 output_dir: str = "output/raw",
+                 batch_requests: bool = False,
+                 workers: int = 8,
+                 transport: HttpTransport | None = None,
+                 crawl_state: CrawlState | None = None,
+                 cache: ResponseCache | None = None,
+                 processes: int = 0,
+                 sink: ShardWriter | None = None,
+                 stream: OutputStream | None = None):
+        """
+        :param output_dir: Directory the per-page JSON files are written to
+        :param batch_requests: Fetch text, sections, properties and categories in a single
+            'parse' request and split the sections locally, instead of one request per section
+        :param workers: Number of pages processed concurrently
+        :param transport: HTTP transport shared by all requests, sized to the workers by default
+        :param crawl_state: Store used to resume interrupted crawls and skip pages whose revision has not changed
+        :param cache: Opt-in response cache, attached to the transport
+        :param processes: Worker processes that clean up section HTML and parse infoboxes,
+            or 0 to do it on the downloading threads
+        :param sink: Writer the outputs are appended to instead of one JSON file per page
+        :param stream: Stream every output is published to once written, so later stages process the pages
+            while the crawl is running
+        """
         self.output_dir = output_dir
+        self.batch_requests = batch_requests
+        self.workers = workers
+        self.transport = transport if transport is not None else HttpTransport(pool_size=workers)
+        if cache is not None:
+            self.transport.cache = cache
+        self.crawl_state = crawl_state
+        self.builder = ProcessPoolBuilder(type(self), processes=processes) if processes > 0 else None
+        self.sink = sink
+        self.stream = stream
 
     @staticmethod
     def get_safe_file_name(template: str, page_id: int, title: str) -> str:
-        safe_template = re.sub(r'[^\w\s-]', '_', template)
-        safe_title = re.sub(r'[^\w\s-]', '_', title).replace(' ', '_')
+        safe_template = text_normalisation.safe_file_name_part(template)
+        safe_title = text_normalisation.safe_file_name_part(title).replace(' ', '_')
         return f"{page_id}_{safe_template}_{safe_title}.json"
 
     def process_page(self, page: JSON):
+        raw_page = self.fetch_page(page)
+
+        if self.builder is not None:
+            output = self.builder.build(raw_page)
+        else:
+            output = self.build_output(raw_page)
+
+        if self.sink is not None:
+            self.sink.write(output)
+            # Compaction moves the record to another shard, so the crawl state keeps the directory of the shards
+            file_path = self.sink.directory
+        else:
+            file_path = self.write_to_file(output)
+
+        if self.stream is not None:
+            self.stream.publish(output)
+
+        if self.crawl_state is not None:
+            self.crawl_state.record_page(
+                page_id=raw_page.page_id,
+                title=raw_page.title,
+                revision_id=page.get('lastrevid'),
+                touched=page.get('touched'),
+                output_path=file_path)
+
+    def fetch_page(self, page: JSON) -> RawPage:
+        """
+        Download the categories, section HTML and infobox JSON of a page without parsing them
+        """
         title = str(page['title'])
         page_id = int(page['pageid'])
+        # A page found changed by the crawl state must not be answered with a response cached before the change
+        changed_at = datetime.fromisoformat(page['touched'].replace('Z', '+00:00')).timestamp() if page.get('touched') else None
 
         # Load additional data
-        page_properties = self.get_page_props(title=title)
-        page_categories = self.get_page_categories(title=title)
+        if self.batch_requests:
+            page_properties = self.get_page(title=title, parse_infoboxes=False, changed_at=changed_at)
+            page_categories = page_properties.categories
+        else:
+            page_properties = self.get_page_props(title=title, parse_infoboxes=False, changed_at=changed_at)
+            page_categories = self.get_page_categories(title=title, changed_at=changed_at)
+
         page_sections: dict[str, str] = {}
 
         for page_section in page_properties.sections:
-            html_content = self.get_section_content(
-                page_title=title,
-                section_index=page_section['index'])
-            content = self.cleanup_section_html(html=html_content)
-            page_sections[page_section['line']] = content
-
-        page_infobox = page_properties.infoboxes[0] if len(page_properties.infoboxes) == 1 else None
-
-        # Create output object
-        output = Output(
+            if page_properties.section_html is not None and page_section['index'] in page_properties.section_html:
+                html_content = page_properties.section_html[page_section['index']]
+            else:
+                html_content = self.get_section_content(
+                    page_title=title,
+                    section_index=page_section['index'],
+                    changed_at=changed_at)
+            page_sections[page_section['line']] = html_content
+
+        return RawPage(
             title=title,
             page_id=page_id,
             categories=page_categories,
+            sections=page_sections,
+            infoboxes=page_properties.infobox_json)
+
+    @classmethod
+    def build_output(cls, raw_page: RawPage) -> Output:
+        """
+        Clean up the section HTML and parse the infobox of a downloaded page.
+        This is the CPU-bound half of processing a page, so it may run in a worker process.
+        """
+        page_sections = {line: cls.cleanup_section_html(html=html) for line, html in raw_page.sections.items()}
+        page_infobox = cls.parse_infobox(raw_page.infoboxes[0]) if len(raw_page.infoboxes) == 1 else None
+
+        # Create output object
+        return Output(
+            title=raw_page.title,
+            page_id=raw_page.page_id,
+            categories=raw_page.categories,
             infobox=page_infobox,
             sections=page_sections)
 
-        self.write_to_file(output)
-
-    def download_pages_with_infoboxes(self):
-        should_continue = True
+    def download_pages_with_infoboxes(self) -> int:
+        """
+        Download every changed page with an infobox, resuming from the crawl state, and return the number of pages.
+
+        A page that fails is logged and left out of the count. The saved cursor is not moved past the first
+        batch with a failure, so the next run lists that batch again and retries its failed pages, while the
+        pages written since are skipped as unchanged.
+        """
+        downloaded = 0
+        failed = 0
+        cursor = self.crawl_state.get_cursor() if self.crawl_state is not None else None
+        cursor = cursor or 1
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        while cursor is not None:
+            pages, cursor = self.get_pages_with_infoboxes(cursor=cursor)
+            pages = self.filter_changed_pages(pages)
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self.process_page, page): page for page in pages}
+
+            for future, page in futures.items():
+                try:
+                    future.result()
+                    downloaded += 1
+                except Exception:
+                    failed += 1
+                    logging.exception(f"Failed to process page {page.get('title')}")
+
+            if self.crawl_state is not None and not failed:
+                self.crawl_state.set_cursor(cursor)
+
+        if failed:
+            logging.warning(f"Failed to process {failed} pages, the next run resumes from the first batch with a failure")
+
+        logging.info(f"Transport stats: {self.transport.stats.to_dict()}")
+        if self.transport.cache is not None:
+            logging.info(f"Cache stats: {self.transport.cache.stats.to_dict()}")
+        return downloaded
+
+    def get_pages_with_infoboxes(self, cursor: str | int = 1) -> tuple[list[JSON], str | None]:
+        """
+        Load one batch of article pages that have an infobox.
+        Returns the pages and the 'pwpcontinue' cursor of the next batch, or None after the last batch.
+        """
         params = {
             "action": "query",
             "list": "pageswithprop",
             "pwppropname": "infoboxes",
             "pwplimit": "max",
-            "pwpcontinue": 1,
+            "pwpcontinue": cursor,
             "format": "json"
         }
-        full_url = f"{self.url}?{urlencode(params)}"
-        logging.info(f"Making request to {full_url}")
-
-        os.makedirs("output", exist_ok=True)
+        data = self.request(params)
+        next_cursor = data["continue"]["pwpcontinue"] if "continue" in data else None
+        pages = [page for page in data['query']['pageswithprop'] if page['ns'] == 0]
+        return pages, next_cursor
+
+    def filter_changed_pages(self, pages: list[JSON]) -> list[JSON]:
+        """
+        Drop the pages whose revision and 'touched' timestamp match the crawl state.
+        The revision info is kept on the remaining pages so it can be recorded once they are written.
+        """
+        if self.crawl_state is None:
+            return pages
+
+        changed = []
+
+        for start in range(0, len(pages), self.page_info_limit):
+            chunk = pages[start:start + self.page_info_limit]
+            page_info = self.get_page_info([int(page['pageid']) for page in chunk])
+            revisions = {}
+
+            for page in chunk:
+                info = page_info.get(int(page['pageid']), {})
+                page['lastrevid'] = info.get('lastrevid')
+                page['touched'] = info.get('touched')
+                revisions[int(page['pageid'])] = (page['lastrevid'], page['touched'])
+
+            unchanged = self.crawl_state.unchanged_page_ids(revisions)
+            changed.extend(page for page in chunk if int(page['pageid']) not in unchanged)
+
+        logging.info(f"Skipping {len(pages) - len(changed)} of {len(pages)} unchanged pages")
+        return changed
 
-        while should_continue:
-            response = requests.get(self.url, params=params)
-            data = response.json()
-            should_continue = data.get("continue", False)
+    """
+    Maximum number of page ids per 'info' query
+    """
+    page_info_limit = 50
 
-            if should_continue:
-                params['pwpcontinue'] = data["continue"]["pwpcontinue"]
+    def get_page_info(self, page_ids: list[int]) -> dict[int, JSON]:
+        params = {
+            "action": "query",
+            "prop": "info",
+            "pageids": "|".join(str(page_id) for page_id in page_ids),
+            "format": "json"
+        }
+        data = self.request(params)
+        return {int(page_id): info for page_id, info in data['query']['pages'].items()}
 
-            pages = data['query']['pageswithprop']
-            pages = filter(lambda page: page['ns'] == 0, pages)
+    def close(self):
+        if self.builder is not None:
+            self.builder.close()
+        if self.sink is not None:
+            self.sink.close()
+        self.transport.close()
 
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                executor.map(self.process_page, pages)
+    def request(self, params: dict, changed_at: float | None = None) -> JSON:
+        full_url = f"{self.url}?{urlencode(params)}"
+        logging.info(f"Making request to {full_url}")
+        return self.transport.get_json(self.url, params=params, changed_at=changed_at)
 
-    def write_to_file(self, output: Output):
+    def write_to_file(self, output: Output) -> str:
 
         template_name = output.infobox['template']
 
@@ -109,7 +293,7 @@ class PageDownloader:
             page_id=output.page_id,
             title=output.title)
 
-        file_path = os.path.join("output", "raw", template_name, file_name)
+        file_path = os.path.join(self.output_dir, template_name, file_name)
 
         directory = os.path.dirname(file_path)
         os.makedirs(name=directory, exist_ok=True)
@@ -117,6 +301,8 @@ class PageDownloader:
         with open(file_path, 'w') as file:
             json.dump(output.to_dict(), file, indent=4)
 
+        return file_path
+
     def get_category_members(self, name: str = "Planets", limit: int = 10):
         params = {
             "action": "query",
@@ -126,44 +312,96 @@ class PageDownloader:
             "format": "json"
         }
 
-        full_url = f"{self.url}?{urlencode(params)}"
-        logging.info(f"Making request to {full_url}")
-
-        response = requests.get(self.url, params=params)
-        data = response.json()
+        data = self.request(params)
         return data['query']['categorymembers']
 
-    def get_page_props(self, title: str) -> PageProperties:
+    def get_page_props(self, title: str, parse_infoboxes: bool = True, changed_at: float | None = None) -> PageProperties:
         params = {
             "action": "parse",
             "page": title,
             "format": "json",
             "prop": "sections|properties"
         }
-        full_url = f"{self.url}?{urlencode(params)}"
-        logging.info(f"Making request to {full_url}")
-        response = requests.get(self.url, params=params)
-        data = response.json()
+        data = self.request(params, changed_at=changed_at)
+        return self.read_page_props(title=title, data=data, parse_infoboxes=parse_infoboxes)
+
+    def get_page(self, title: str, parse_infoboxes: bool = True, changed_at: float | None = None) -> PageProperties:
+        """
+        Load the sections, properties, categories and section HTML of a page with a single request
+        """
+        params = {
+            "action": "parse",
+            "page": title,
+            "format": "json",
+            "prop": "text|sections|properties|categories"
+        }
+        data = self.request(params, changed_at=changed_at)
+        page_properties = self.read_page_props(title=title, data=data, parse_infoboxes=parse_infoboxes)
+        page_properties.categories = [cat["*"] for cat in data["parse"]["categories"]]
+        page_properties.section_html = self.split_sections_html(
+            html=data["parse"]["text"]["*"],
+            sections=data["parse"]["sections"])
+        return page_properties
+
+    def read_page_props(self, title: str, data: JSON, parse_infoboxes: bool = True) -> PageProperties:
         sections = data['parse']['sections']
         sections = filter(lambda section: section['index'] != "", sections)
         sections = filter(lambda section: section['line'] not in self.ignore_sections, sections)
-        infoboxes = []
+        infobox_json = []
 
         for prop in data['parse']['properties']:
             name = prop['name']
             value = prop['*']
             if name == 'infoboxes' and value is not None:
-                infoboxes.append(self.parse_infobox(value))
+                infobox_json.append(value)
 
         return PageProperties(
             title=title,
-            sections=sections,
-            infoboxes=infoboxes
+            sections=list(sections),
+            infoboxes=[self.parse_infobox(value) for value in infobox_json] if parse_infoboxes else [],
+            infobox_json=infobox_json
         )
 
+    def split_sections_html(self, html: str, sections: list[dict]) -> dict[str, str]:
+        """
+        Split the rendered HTML of a whole page into the HTML of each section, keyed by section index.
+
+        A section runs from its heading up to the next heading of the same or a higher level,
+        which matches what 'parse' returns for a single 'section'. Sections whose heading
+        cannot be found in the HTML are left out so the caller can fall back to requesting them.
+        """
+        anchors = {section['anchor'] for section in sections}
+        heading_offsets: dict[str, int] = {}
+
+        for match in self.heading_pattern.finditer(html):
+            for heading_id in self.heading_id_pattern.findall(match.group(0)):
+                anchor = html_lib.unescape(heading_id)
+                if anchor in anchors and anchor not in heading_offsets:
+                    heading_offsets[anchor] = match.start()
+                    break
+
+        section_html: dict[str, str] = {}
+
+        for position, section in enumerate(sections):
+            start = heading_offsets.get(section['anchor'])
+            if start is None or section['index'] == "":
+                continue
+
+            end = len(html)
+            for following in sections[position + 1:]:
+                following_start = heading_offsets.get(following['anchor'])
+                if following_start is not None and int(following['level']) <= int(section['level']):
+                    end = following_start
+                    break
+
+            section_html[section['index']] = html[start:end]
+
+        return section_html
+
     def get_section_content(self,
                             page_title: str,
-                            section_index: str | int) -> str:
+                            section_index: str | int,
+                            changed_at: float | None = None) -> str:
         params = {
             "action": "parse",
             "page": page_title,
@@ -171,10 +409,7 @@ class PageDownloader:
             "section": section_index,
             "format": "json"
         }
-        full_url = f"{self.url}?{urlencode(params)}"
-        logging.info(f"Making request to {full_url}")
-        response = requests.get(self.url, params=params)
-        data = response.json()
+        data = self.request(params, changed_at=changed_at)
         return data["parse"]["text"]["*"]
 
     template_ns = 10
@@ -188,35 +423,27 @@ class PageDownloader:
             "aplimit": "max",
             "format": "json"
         }
-        full_url = f"{self.url}?{urlencode(params)}"
-        logging.info(f"Making request to {full_url}")
-        response = requests.get(self.url, params=params)
-        data = response.json()
+        data = self.request(params)
         templates = [page['title'] for page in data['query']['allpages']]
         return templates
 
-    def get_page_categories(self, title: str) -> list[str]:
+    def get_page_categories(self, title: str, changed_at: float | None = None) -> list[str]:
         params = {
             "action": "parse",
             "page": title,
             "format": "json",
             "prop": "categories"
         }
-        full_url = f"{self.url}?{urlencode(params)}"
-        logging.info(f"Making request to {full_url}")
-        response = requests.get(self.url, params=params)
-        data = response.json()
+        data = self.request(params, changed_at=changed_at)
         categories = [cat["*"] for cat in data["parse"]["categories"]]
         return categories
 
-    def cleanup_section_html(self, html: str) -> str:
-        soup = BeautifulSoup(html, "html.parser")
-        text = soup.get_text(strip=True, separator=" ")
-        text = re.sub(r'\[\\]', '', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+    @classmethod
+    def cleanup_section_html(cls, html: str) -> str:
+        return text_normalisation.html_to_text(html)
 
-    def parse_infobox(self, json_string: str) -> JSON:
+    @classmethod
+    def parse_infobox(cls, json_string: str) -> JSON:
         infobox_data = json.loads(json_string)
 
         parsed_data = {
@@ -229,51 +456,36 @@ class PageDownloader:
                 parsed_data['infobox']['image'] = item['data'][0]['url']
 
             elif item['type'] == 'navigation':
-                navigation = BeautifulSoup(item['data']['value'], "html.parser")
-                anchor = navigation.find("a")
+                anchor = html_fragment.find_attributes(item['data']['value'], "a")
                 parsed_data['template'] = anchor['href'].split(":")[-1]
 
             elif item['type'] == 'title':
                 parsed_data['infobox']['title'] = item['data']['value']
 
             elif item['type'] == 'group':
-                group_name_html = BeautifulSoup(item['data']['value'][0]['data']['value'], "html.parser")
-                group_name = group_name_html.get_text(strip=True, separator=", ").strip(self.trim)
+                group_name_strings = html_fragment.strings(item['data']['value'][0]['data']['value'])
+                group_name = ", ".join(group_name_strings).strip(cls.trim)
                 parsed_data['infobox'][group_name] = {}
 
                 for group_item in item['data']['value']:
                     if group_item['type'] == 'data':
-                        soup_label = BeautifulSoup(group_item['data']['label'], "html.parser")
-                        for tag in soup_label.find_all("sup"):
-                            tag.decompose()
-
-                        soup_value = BeautifulSoup(group_item['data']['value'], "html.parser")
-                        for tag in soup_value.find_all(self.value_elems):
-                            if tag.name == "li":
-                                tag.insert_before("\n")
-                            if tag.name == "br":
-                                tag.insert_before("\n")
-                            if tag.name == "sup":
-                                tag.decompose()
+                        label_strings = html_fragment.strings(
+                            group_item['data']['label'],
+                            skip=cls.ignore_elems)
+
+                        value_strings, value_links = html_fragment.strings_and_links(
+                            group_item['data']['value'],
+                            skip=cls.ignore_elems)
 
                         links = []
-                        for link in soup_value.find_all("a", href=True):
+                        for href, text in value_links:
                             links.append({
-                                "href": link['href'],
-                                "text": link.get_text(strip=True).strip(self.trim)
+                                "href": href,
+                                "text": text.strip(cls.trim)
                             })
 
-                        label = (soup_label
-                                 .get_text(strip=True, separator=", ")
-                                 .replace("  ", " ")
-                                 .replace("\\", "")
-                                 .strip(self.trim))
-
-                        value = (soup_value
-                                 .get_text(strip=True, separator=", ")
-                                 .replace("  ", " ")
-                                 .replace("\\", "")
-                                 .strip(self.trim))
+                        label = text_normalisation.infobox_text(label_strings, cls.trim)
+                        value = text_normalisation.infobox_text(value_strings, cls.trim)
 
                         parsed_data['infobox'][group_name][label] = {
                             "value": value,
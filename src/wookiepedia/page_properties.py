@@ -6,15 +6,28 @@ class PageProperties:
     title: str
     sections: list[dict] = []
     infoboxes: list[dict] = []
+    categories: list[str] | None = None
+    section_html: dict[str, str] | None = None
+    infobox_json: list[str] = []
 
-    def __init__(self, title: str, sections: list[dict], infoboxes: list[dict]):
+    def __init__(self,
+                 title: str,
+                 sections: list[dict],
+                 infoboxes: list[dict],
+                 categories: list[str] | None = None,
+                 section_html: dict[str, str] | None = None,
+                 infobox_json: list[str] | None = None):
         self.title = title
         self.sections = sections
         self.infoboxes = infoboxes
+        self.categories = categories
+        self.section_html = section_html
+        self.infobox_json = infobox_json if infobox_json is not None else []
 
     def to_dict(self):
         return {
             "title": self.title,
             "sections": self.sections,
-            "infoboxes": self.infoboxes
+            "infoboxes": self.infoboxes,
+            "categories": self.categories
         }
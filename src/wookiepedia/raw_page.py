@@ -0,0 +1,22 @@
+class RawPage:
+    """
+    Represents a downloaded Wookiepedia page before its HTML and infoboxes are parsed.
+    """
+
+    title: str
+    page_id: int
+    categories: list[str]
+    sections: dict[str, str]
+    infoboxes: list[str]
+
+    def __init__(self,
+                 title: str,
+                 page_id: int,
+                 categories: list[str],
+                 sections: dict[str, str],
+                 infoboxes: list[str]):
+        self.title = title
+        self.page_id = page_id
+        self.categories = categories
+        self.sections = sections
+        self.infoboxes = infoboxes
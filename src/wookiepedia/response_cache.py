@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import time
+
+from instrumentation import Counters
+from wookiepedia.sqlite_store import SqliteStore
+from wookiepedia.types import JSON
+
+DAY = 24 * 60 * 60
+
+
+class CacheEntry:
+    """
+    A cached API response and the validators needed to revalidate it
+    """
+
+    key: str
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+    fresh: bool
+
+    def __init__(self, key: str, body: bytes, etag: str | None, last_modified: str | None, stored_at: float, fresh: bool):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.fresh = fresh
+
+    def json(self) -> JSON:
+        return json.loads(self.body)
+
+    def conditional_headers(self) -> dict[str, str] | None:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers or None
+
+
+class CacheStats(Counters):
+    """
+    Counters for the lookups made against a response cache
+    """
+
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    revalidated: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    derived = ("hit_rate",)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.stale
+        return (self.hits + self.revalidated) / lookups if lookups else 0.0
+
+
+class ResponseCache(SqliteStore):
+    """
+    An on-disk cache of API responses keyed by the normalized request parameters.
+
+    Entries expire after a TTL chosen per action (the most specific of 'action:list', 'action:prop'
+    and 'action' wins), stale entries are revalidated with ETag/Last-Modified when the server sent them,
+    and the least recently used entries are evicted once the cache grows beyond its byte budget.
+    """
+
+    """
+    Seconds a response stays fresh, 0 to never cache and None to never expire
+    """
+    default_ttls: dict[str, float | None] = {
+        "parse": DAY,
+        "query": DAY,
+        "query:pageswithprop": 60 * 60,
+        "query:allpages": 7 * DAY,
+        "query:categorymembers": 7 * DAY,
+        "query:info": 0
+    }
+
+    """
+    Parameters whose '|' separated values can be given in any order
+    """
+    unordered_params = {"prop"}
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+    """
+
+    def __init__(self,
+                 directory: str = "output/cache",
+                 max_bytes: int = 2 * 1024 ** 3,
+                 ttls: dict[str, float | None] | None = None,
+                 offline: bool = False):
+        """
+        :param directory: Directory of the cache database
+        :param max_bytes: Size of the cached responses above which the least recently used are evicted
+        :param ttls: TTL overrides merged over the default TTLs
+        :param offline: Treat every cached response as fresh, e.g. when re-running the parser over a finished crawl
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = {**self.default_ttls, **(ttls or {})}
+        self.offline = offline
+        self.stats = CacheStats()
+        super().__init__(os.path.join(directory, "responses.sqlite"))
+
+    def opened(self):
+        self.size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def key(self, params: dict) -> str:
+        normalized = {}
+        for name, value in params.items():
+            value = str(value)
+            if name in self.unordered_params:
+                value = "|".join(sorted(value.split("|")))
+            normalized[name] = value
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def ttl(self, params: dict) -> float | None:
+        action = str(params.get("action", ""))
+        for name in (f"{action}:{params.get('list')}", f"{action}:{params.get('prop')}", action):
+            if name in self.ttls:
+                return self.ttls[name]
+        return DAY
+
+    def is_cacheable(self, params: dict) -> bool:
+        return self.ttl(params) != 0
+
+    def get(self, params: dict, changed_at: float | None = None) -> CacheEntry | None:
+        """
+        Look up the cached response to 'params', stale when its TTL passed or it was stored before 'changed_at',
+        the time the requested page last changed, if known
+        """
+        if not self.is_cacheable(params):
+            return None
+
+        key = self.key(params)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.add(misses=1)
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+
+        body, etag, last_modified, stored_at = row
+        ttl = self.ttl(params)
+        fresh = self.offline or ((ttl is None or time.time() - stored_at < ttl)
+                                 and (changed_at is None or stored_at >= changed_at))
+        if fresh:
+            self.stats.add(hits=1)
+        else:
+            self.stats.add(stale=1)
+        return CacheEntry(key, body, etag, last_modified, stored_at, fresh)
+
+    def put(self, params: dict, body: bytes, etag: str | None = None, last_modified: str | None = None):
+        if not self.is_cacheable(params):
+            return
+
+        key = self.key(params)
+        now = time.time()
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, etag, last_modified, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, len(body), etag, last_modified, now, now))
+            self.size += len(body) - (previous[0] if previous else 0)
+            self.evict()
+            self._connection.commit()
+        self.stats.add(stores=1)
+
+    def revalidated(self, entry: CacheEntry):
+        """
+        Mark a stale entry as fresh again after the server answered 304 Not Modified
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, entry.key))
+            self._connection.commit()
+        self.stats.add(revalidated=1)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is back under 90% of its budget
+        """
+        if self.size <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+
+        for key, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((key,))
+            self.size -= size
+
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stats.add(evictions=len(evicted))
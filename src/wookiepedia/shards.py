@@ -0,0 +1,271 @@
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterator
+
+from wookiepedia.output import Output
+from wookiepedia.sqlite_store import connect_sqlite
+from wookiepedia.types import JSON
+
+
+class ShardEntry:
+    """
+    The location of a record in the shards
+    """
+
+    page_id: int
+    template: str | None
+    title: str
+    shard: str
+    offset: int
+    length: int
+
+    def __init__(self, page_id: int, template: str | None, title: str, shard: str, offset: int, length: int):
+        self.page_id = page_id
+        self.template = template
+        self.title = title
+        self.shard = shard
+        self.offset = offset
+        self.length = length
+
+
+class ShardWriter:
+    """
+    Appends Output records to sharded, gzip-compressed JSON Lines files instead of one indented JSON file per page.
+
+    Every record is written as its own gzip member, so a shard can be streamed with any gzip reader
+    while the index (page id -> shard, byte offset, length, template, title) allows reading a single
+    record with one seek. A page written again replaces its index entry, and readers only see the latest copy,
+    but the earlier copy stays in its shard until 'compact' rewrites the shards holding replaced records.
+    """
+
+    index_file = "index.sqlite"
+
+    """
+    File names of the shards, with the number they are ordered by
+    """
+    shard_pattern = re.compile(r"shard-(\d+)\.jsonl\.gz")
+
+    def __init__(self,
+                 directory: str = "output/shards",
+                 max_shard_bytes: int = 256 * 1024 ** 2,
+                 compresslevel: int = 6):
+        """
+        :param directory: Directory of the shards and their index
+        :param max_shard_bytes: Size after which a new shard is started
+        :param compresslevel: gzip compression level of the records
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        self.compresslevel = compresslevel
+        self._lock = threading.Lock()
+        self._connection = connect_index(directory)
+        self._shard_number = self._last_shard_number()
+        self._shard = open(self.shard_path(self._shard_number), "ab")
+
+    def shard_name(self, number: int) -> str:
+        return f"shard-{number:05d}.jsonl.gz"
+
+    def shard_path(self, number: int) -> str:
+        return os.path.join(self.directory, self.shard_name(number))
+
+    def write(self, output: Output) -> str:
+        """
+        Append a record and return the path of the shard it was written to
+        """
+        record = output.to_dict()
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        member = gzip.compress(line.encode("utf-8"), compresslevel=self.compresslevel, mtime=0)
+        template = output.infobox['template'] if output.infobox is not None else None
+
+        with self._lock:
+            if self._shard.tell() + len(member) > self.max_shard_bytes and self._shard.tell() > 0:
+                self._shard.close()
+                self._shard_number += 1
+                self._shard = open(self.shard_path(self._shard_number), "ab")
+
+            offset = self._shard.tell()
+            self._shard.write(member)
+            self._shard.flush()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO records (page_id, template, title, shard, offset, length) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (output.page_id, template, output.title, self.shard_name(self._shard_number), offset, len(member)))
+            self._connection.commit()
+            # Read under the lock, as another thread may start a new shard as soon as it is released
+            path = self.shard_path(self._shard_number)
+
+        return path
+
+    def compact(self, min_garbage: float = 0.25) -> int:
+        """
+        Copy the live records of every shard in which at least 'min_garbage' of the bytes are records replaced
+        by a later write to new shards, delete those shards and return the bytes reclaimed.
+
+        The gzip members are copied without recompressing them, and the index moves to the new shards in one
+        transaction before the old shards are deleted, so an interrupted compaction leaves every record readable.
+        No reader may be iterating the shards meanwhile, since the entries it listed would point to deleted files.
+        """
+        with self._lock:
+            self._shard.flush()
+            live = dict(self._connection.execute("SELECT shard, SUM(length) FROM records GROUP BY shard").fetchall())
+            numbers = {name: int(match.group(1)) for name in os.listdir(self.directory)
+                       if (match := self.shard_pattern.fullmatch(name))}
+
+            garbage = {}
+            for name in numbers:
+                size = os.path.getsize(os.path.join(self.directory, name))
+                dead = size - live.get(name, 0)
+                if dead > 0 and dead >= min_garbage * size:
+                    garbage[name] = dead
+            if not garbage:
+                return 0
+
+            # The live records, and the writes after them, go to shards after every existing one
+            self._shard.close()
+            self._shard_number = max(numbers.values()) + 1
+            self._shard = open(self.shard_path(self._shard_number), "ab")
+
+            rows = self._connection.execute(
+                f"SELECT page_id, shard, offset, length FROM records WHERE shard IN ({', '.join('?' * len(garbage))}) "
+                f"ORDER BY shard, offset",
+                list(garbage)).fetchall()
+            moved = []
+            source_name = None
+            source = None
+            try:
+                for page_id, shard, offset, length in rows:
+                    if shard != source_name:
+                        if source is not None:
+                            source.close()
+                        source_name = shard
+                        source = open(os.path.join(self.directory, shard), "rb")
+                    source.seek(offset)
+                    member = source.read(length)
+
+                    if self._shard.tell() + length > self.max_shard_bytes and self._shard.tell() > 0:
+                        self._shard.close()
+                        self._shard_number += 1
+                        self._shard = open(self.shard_path(self._shard_number), "ab")
+                    moved.append((self.shard_name(self._shard_number), self._shard.tell(), page_id))
+                    self._shard.write(member)
+            finally:
+                if source is not None:
+                    source.close()
+
+            self._shard.flush()
+            os.fsync(self._shard.fileno())
+            self._connection.executemany("UPDATE records SET shard = ?, offset = ? WHERE page_id = ?", moved)
+            self._connection.commit()
+
+            for name in garbage:
+                os.remove(os.path.join(self.directory, name))
+
+        reclaimed = sum(garbage.values())
+        logging.info(f"Compacted {len(garbage)} shards, moving {len(moved)} records and reclaiming {reclaimed} bytes")
+        return reclaimed
+
+    def close(self):
+        with self._lock:
+            self._shard.close()
+            self._connection.close()
+
+    def _last_shard_number(self) -> int:
+        row = self._connection.execute("SELECT MAX(shard) FROM records").fetchone()
+        if row[0] is None:
+            return 0
+        return int(row[0].split("-")[1].split(".")[0])
+
+
+class ShardReader:
+    """
+    Streams the records written by a ShardWriter, in shard order, optionally limited to one template
+    """
+
+    def __init__(self, directory: str = "output/shards"):
+        self.directory = directory
+        self._connection = connect_index(directory)
+
+    @staticmethod
+    def is_shard_directory(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, ShardWriter.index_file))
+
+    def entries(self, template: str | None = None) -> list[ShardEntry]:
+        query = "SELECT page_id, template, title, shard, offset, length FROM records"
+        params: tuple = ()
+        if template is not None:
+            query += " WHERE template = ?"
+            params = (template,)
+        rows = self._connection.execute(query + " ORDER BY shard, offset", params).fetchall()
+        return [ShardEntry(*row) for row in rows]
+
+    def entry(self, page_id: int) -> ShardEntry | None:
+        row = self._connection.execute(
+            "SELECT page_id, template, title, shard, offset, length FROM records WHERE page_id = ?",
+            (page_id,)).fetchone()
+        return ShardEntry(*row) if row else None
+
+    def indexed(self, page_ids: list[int]) -> set[int]:
+        """
+        The given pages that have a record in the shards
+        """
+        found = set()
+        for start in range(0, len(page_ids), 500):
+            chunk = page_ids[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT page_id FROM records WHERE page_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+    def read(self, entry: ShardEntry) -> JSON:
+        with open(os.path.join(self.directory, entry.shard), "rb") as shard:
+            shard.seek(entry.offset)
+            return json.loads(gzip.decompress(shard.read(entry.length)))
+
+    def get(self, page_id: int) -> JSON | None:
+        entry = self.entry(page_id)
+        return self.read(entry) if entry is not None else None
+
+    def iter_records(self, template: str | None = None) -> Iterator[tuple[ShardEntry, JSON]]:
+        return self.iter_entries(self.entries(template=template))
+
+    def iter_entries(self, entries: list[ShardEntry]) -> Iterator[tuple[ShardEntry, JSON]]:
+        """
+        Read the given entries, opening every shard once and reading sequentially within it
+        """
+        shard_name = None
+        shard = None
+        try:
+            for entry in sorted(entries, key=lambda e: (e.shard, e.offset)):
+                if entry.shard != shard_name:
+                    if shard is not None:
+                        shard.close()
+                    shard_name = entry.shard
+                    shard = open(os.path.join(self.directory, shard_name), "rb")
+                shard.seek(entry.offset)
+                yield entry, json.loads(gzip.decompress(shard.read(entry.length)))
+        finally:
+            if shard is not None:
+                shard.close()
+
+    def close(self):
+        self._connection.close()
+
+
+def connect_index(directory: str) -> sqlite3.Connection:
+    return connect_sqlite(os.path.join(directory, ShardWriter.index_file), """
+        CREATE TABLE IF NOT EXISTS records (
+            page_id INTEGER PRIMARY KEY,
+            template TEXT,
+            title TEXT NOT NULL,
+            shard TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS records_template ON records (template);
+    """)
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+
+
+def connect_sqlite(path: str, schema: str, timeout: float = 30) -> sqlite3.Connection:
+    """
+    Open a SQLite database in WAL mode, so readers never wait for the writer, and create its tables
+    """
+    connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(schema)
+    connection.commit()
+    return connection
+
+
+class SqliteStore:
+    """
+    A SQLite database shared by the threads of a process behind a lock.
+
+    A store sent to a worker process is pickled without its connection and lock, and the worker opens the
+    database again, so processes share the file through WAL rather than a connection.
+    """
+
+    """
+    Tables and indexes created when the database is opened
+    """
+    schema: str = ""
+
+    def __init__(self, path: str, timeout: float = 30):
+        """
+        :param path: Database file, its directory is created if missing
+        :param timeout: Seconds to wait for another process's write to finish
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._connection = connect_sqlite(self.path, self.schema, timeout=self.timeout)
+        self.opened()
+
+    def opened(self):
+        """
+        Called once the database is opened, in this process or a worker
+        """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_connection"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._connect()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
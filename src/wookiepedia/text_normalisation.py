@@ -0,0 +1,48 @@
+import re
+from typing import Iterable
+
+from wookiepedia import html_fragment
+
+"""
+Characters replaced by '_' in the template and title parts of a file name
+"""
+_unsafe_file_name_pattern = re.compile(r'[^\w\s-]')
+
+"""
+An escaped backslash left in the text of a section by the wiki markup, removed from the text
+"""
+ESCAPED_BACKSLASH = "[\\]"
+
+
+def html_to_text(html: str, skip: frozenset[str] = frozenset()) -> str:
+    """
+    The text of an HTML fragment, its text nodes stripped and joined by single spaces, without building a tree.
+
+    The same text as BeautifulSoup(html, "html.parser").get_text(strip=True, separator=" ") with every
+    escaped backslash removed and whitespace collapsed. 'str.split' splits on exactly the characters the
+    '\\s' of a regular expression matches, so collapsing the whitespace takes no regular expression.
+    """
+    text = " ".join(html_fragment.strings(html, skip=skip))
+    if ESCAPED_BACKSLASH in text:
+        text = text.replace(ESCAPED_BACKSLASH, "")
+    return " ".join(text.split())
+
+
+def safe_file_name_part(text: str) -> str:
+    """
+    The text with every character other than a word character, whitespace or '-' replaced by '_'
+    """
+    return _unsafe_file_name_pattern.sub("_", text)
+
+
+def infobox_text(strings: Iterable[str], trim: str) -> str:
+    """
+    The text nodes of an infobox label or value joined by ', ', without double spaces or backslashes
+    and trimmed of 'trim', copying the text only for the replacements it needs
+    """
+    text = ", ".join(strings)
+    if "  " in text:
+        text = text.replace("  ", " ")
+    if "\\" in text:
+        text = text.replace("\\", "")
+    return text.strip(trim)
@@ -0,0 +1,191 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import Counters, metrics
+from wookiepedia.response_cache import ResponseCache
+from wookiepedia.types import JSON
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that limits how many requests are started per second
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        """
+        :param rate: Tokens added to the bucket per second
+        :param capacity: Maximum tokens the bucket holds, i.e. the largest burst allowed
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class TransportStats(Counters):
+    """
+    Counters for the requests made through a transport
+    """
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    bytes_received: int = 0
+    bytes_decoded: int = 0
+
+
+class HttpTransport:
+    """
+    A pooled, rate-limited HTTP transport that retries throttled and failed requests with jittered exponential backoff
+    """
+
+    user_agent: str = "StarWarsData/1.0 (https://github.com/pjmagee/StarWarsData)"
+
+    """
+    Status codes and API error codes that are worth retrying
+    """
+    retry_statuses = {429, 500, 502, 503, 504}
+    retry_api_errors = {"maxlag", "ratelimited", "readonly", "internal_api_error_DBQueryError"}
+
+    def __init__(self,
+                 pool_size: int = 8,
+                 rate_limit: float | None = 10.0,
+                 burst: float | None = None,
+                 max_retries: int = 5,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 timeout: float = 30.0,
+                 gzip: bool = True,
+                 cache: ResponseCache | None = None):
+        """
+        :param pool_size: Keep-alive connections kept per host, normally the number of crawl workers
+        :param rate_limit: Requests per second allowed across all workers, or None for no limit
+        :param burst: Requests that may be started at once before the rate limit applies
+        :param max_retries: Retries for connection errors, throttling and 5xx responses
+        :param backoff_base: Seconds of the first backoff, doubled on every retry
+        :param backoff_max: Upper bound of a single backoff
+        :param timeout: Seconds to wait for a response
+        :param gzip: Ask the server for compressed responses
+        :param cache: Opt-in cache that 'get_json' answers from before going to the network
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = TokenBucket(rate=rate_limit, capacity=burst) if rate_limit else None
+        self.stats = TransportStats()
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip, deflate" if gzip else "identity"
+        })
+
+    def backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return min(self.backoff_max, float(retry_after))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, params: dict, headers: dict | None = None) -> requests.Response:
+        attempt = 0
+
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            retry_after = None
+            try:
+                with metrics.call_seconds("http").time():
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.stats.add(requests=1)
+                if attempt >= self.max_retries:
+                    self.stats.add(failures=1)
+                    raise
+                logging.warning(f"Request to {url} failed ({e}), retrying")
+            else:
+                self.stats.add(
+                    requests=1,
+                    bytes_received=int(response.headers.get("Content-Length", len(response.content))),
+                    bytes_decoded=len(response.content))
+
+                if response.status_code not in self.retry_statuses:
+                    response.raise_for_status()
+                    return response
+
+                if attempt >= self.max_retries:
+                    self.stats.add(failures=1)
+                    response.raise_for_status()
+
+                retry_after = response.headers.get("Retry-After")
+                logging.warning(f"Request to {url} returned {response.status_code}, retrying")
+
+            self.stats.add(retries=1)
+            time.sleep(self.backoff(attempt, retry_after))
+            attempt += 1
+
+    def get_json(self, url: str, params: dict, changed_at: float | None = None) -> JSON:
+        """
+        :param changed_at: Time the requested page last changed, a cached response stored before it is revalidated
+        """
+        entry = self.cache.get(params, changed_at=changed_at) if self.cache is not None else None
+
+        if entry is not None and entry.fresh:
+            return entry.json()
+
+        attempt = 0
+
+        while True:
+            response = self.get(url, params=params, headers=entry.conditional_headers() if entry else None)
+
+            if response.status_code == 304 and entry is not None:
+                self.cache.revalidated(entry)
+                return entry.json()
+
+            data = response.json()
+            error = data.get("error") if isinstance(data, dict) else None
+
+            if error is None:
+                if self.cache is not None:
+                    self.cache.put(
+                        params,
+                        body=response.content,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"))
+                return data
+
+            if error.get("code") not in self.retry_api_errors or attempt >= self.max_retries:
+                return data
+
+            logging.warning(f"Request to {url} returned API error {error.get('code')}, retrying")
+            self.stats.add(retries=1)
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def close(self):
+        self.session.close()